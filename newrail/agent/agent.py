@@ -1,3 +1,8 @@
+import asyncio
+from functools import partial
+from threading import RLock
+from typing import Callable, List
+
 from newrail.agent.config.config import AgentConfig
 from newrail.agent.config.status import Status
 from newrail.agent.behavior.task_manager import TaskManager
@@ -8,8 +13,10 @@ from newrail.agent.communication.requests.request_manager import RequestManager
 from newrail.config.config import Config
 from newrail.memory.long_term_memory.weaviate import WeaviateMemory
 from newrail.memory.short_term_memory.episodic_memory import EpisodicMemory
+from newrail.memory.utils.episodes.episode_store import EpisodeStore
 from newrail.memory.utils.task.task import Task
 from newrail.organization.utils.logger.agent_logger import AgentLogger
+from newrail.utils.unit_of_work import UnitOfWork
 
 
 class Agent:
@@ -25,13 +32,6 @@ class Agent:
             agent_folder=self.cfg.folder,
             process_name="main",
         )
-        self.long_term_memory = WeaviateMemory()
-        self.short_term_memory = EpisodicMemory(
-            agent_id=self.cfg.id,
-            team_id=self.cfg.team_id,
-            folder=self.cfg.folder,
-            logger=self.logger,
-        )
         self.broker = Broker(agent_config=self.cfg, agent_logger=self.logger)
         self.event_manager = EventManager(
             agent_config=self.cfg,
@@ -39,6 +39,24 @@ class Agent:
             supervisor_name=self.cfg.supervisor_name,
         )
         self.request_manager = RequestManager(agent_config=self.cfg, broker=self.broker)
+        # Memories, capabilities and clients, released while the agent hibernates.
+        self.hibernated = False
+        self.hibernated_task = None
+        # Events and tasks received while hibernated, added when the next step rehydrates.
+        self.hibernated_updates: List[Callable[[], None]] = []
+        self._resources_lock = RLock()
+        self.load_resources()
+
+    def load_resources(self):
+        """Construct the memories and the task manager, loading the persisted state."""
+
+        self.long_term_memory = WeaviateMemory()
+        self.short_term_memory = EpisodicMemory(
+            agent_id=self.cfg.id,
+            team_id=self.cfg.team_id,
+            folder=self.cfg.folder,
+            logger=self.logger,
+        )
         self.task_manager = TaskManager(
             agent_config=self.cfg,
             agent_name=self.cfg.name,
@@ -48,22 +66,99 @@ class Agent:
             memory=self.short_term_memory,
         )
 
+    def hibernate(self) -> bool:
+        """
+        Release the memories, capabilities and clients of an idle agent, keeping only
+        the event manager to be woken up. Returns False if it was already hibernated.
+        """
+
+        with self._resources_lock:
+            if self.hibernated:
+                return False
+            self.hibernated_task = self.task_manager.task
+            self.task_manager.close()
+            # Persist the whole episodic state, it is loaded again on rehydrate.
+            self.short_term_memory.snapshot()
+            EpisodeStore.remove_store(agent_id=self.cfg.id)
+            self.long_term_memory = None
+            self.short_term_memory = None
+            self.task_manager = None
+            self.hibernated = True
+        self.logger.log("Agent hibernated.")
+        return True
+
+    def rehydrate(self) -> None:
+        """Load the resources of a hibernated agent again."""
+
+        with self._resources_lock:
+            if not self.hibernated:
+                return
+            self.load_resources()
+            self.task_manager.task = self.hibernated_task
+            self.hibernated_task = None
+            self.hibernated = False
+            updates = self.hibernated_updates
+            self.hibernated_updates = []
+            for update in updates:
+                update()
+        self.logger.log("Agent rehydrated.")
+
+    def defer_update(self, update: Callable[[], None]) -> bool:
+        """
+        Keep an update of a hibernated agent until its next step rehydrates it, instead of
+        loading its resources in the caller, e.g: the dispatcher of the orchestrator.
+        Returns False if the agent is not hibernated and the caller should update it now.
+        """
+
+        with self._resources_lock:
+            if not self.hibernated:
+                return False
+            self.hibernated_updates.append(update)
+        # Activated now to be scheduled, as the task manager does for awake agents.
+        if self.cfg.get_status() == Status.WAITING:
+            self.cfg.set_status(Status.ACTIVE)
+            self.request_manager.update_agent(self.cfg)
+        return True
+
     def add_event(self, event: Event):
+        if self.defer_update(partial(self.add_event, event=event)):
+            return
         self.task_manager.add_event(event=event)
 
     def add_task(self, task: Task):
+        if self.defer_update(partial(self.add_task, task=task)):
+            return
         self.task_manager.add_task(task=task)
 
+    def add_wakeup_listener(self, listener: Callable[[], None]) -> None:
+        """Call the listener when an event or a task is received for the agent."""
+
+        self.event_manager.add_listener(listener)
+
+    def remove_wakeup_listener(self, listener: Callable[[], None]) -> None:
+        self.event_manager.remove_listener(listener)
+
     # TODO: Implement as needed to ensure clean-up after agent is deleted.
     def delete(self):
         """Called by org if the agent should be deleted."""
 
+        self.broker.unsubscribe_from_channels()
         self.cfg.remove()
         return True
 
     def step(self):
-        self.task_manager.step()  # Main flow of the agent at one iteration.
-        self.cfg.save()  # Update the config file.
+        self.rehydrate()
+        # Coalesce the writes of the step, they are flushed once when it finishes.
+        with UnitOfWork(logger=self.logger):
+            self.task_manager.step()  # Main flow of the agent at one iteration.
+            self.cfg.save()  # Update the config file.
+
+    async def astep(self):
+        await asyncio.to_thread(self.rehydrate)
+        # Same as step, but the LLM requests don't block a thread.
+        async with UnitOfWork(logger=self.logger):
+            await self.task_manager.astep()
+            self.cfg.save()
 
     def update(self) -> None:
         """Update agent events and tasks."""
@@ -75,7 +170,15 @@ class Agent:
         if task:
             self.add_task(task=task)
 
+    def update_and_step(self) -> None:
+        """Update the agent and step it if it is not waiting, in a single call."""
+
+        self.update()
+        if self.cfg.get_status() != Status.WAITING:
+            self.step()
+
     def update_status(self, status: Status):
         """Update the status of the agent."""
 
+        self.rehydrate()
         self.task_manager.update_status(status=status)
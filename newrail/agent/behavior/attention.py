@@ -91,6 +91,10 @@ Use this with caution, you should only iterate if you are sure that you don't ha
 {format_instructions}
 """
 
+ATTENTION_USER_PROMPT = (
+    "Remember to answer using the output format to provide a Attention!"
+)
+
 
 class Attention(LoggableBaseModel):
     relevant_information: str = Field(
@@ -115,8 +119,7 @@ class Attention(LoggableBaseModel):
         most_similar_episodes: str,
         logger: AgentLogger,
     ) -> "Attention":
-        attention_prompt = ATTENTION_INITIAL_PROMPT.format(
-            time=datetime.now().isoformat(),
+        attention_prompt = cls.get_relevant_memory_prompt(
             goal=goal,
             capability=capability,
             action=action,
@@ -124,12 +127,41 @@ class Attention(LoggableBaseModel):
             recent_episodes=recent_episodes,
             most_recent_episode=most_recent_episode,
             most_similar_episodes=most_similar_episodes,
-            format_instructions=get_format_instructions([Attention]),
         )
         logger.log(attention_prompt, should_print=False)
         attention_response = ChatParser(logger=logger).get_parsed_response(
             system=attention_prompt,
-            user="Remember to answer using the output format to provide a Attention!",
+            user=ATTENTION_USER_PROMPT,
+            containers=[Attention],
+            smart_llm=True,
+        )
+        return attention_response[0]
+
+    @classmethod
+    async def aget_relevant_memory(
+        cls,
+        goal: str,
+        capability: str,
+        action: str,
+        thought: str,
+        recent_episodes: str,
+        most_recent_episode: str,
+        most_similar_episodes: str,
+        logger: AgentLogger,
+    ) -> "Attention":
+        attention_prompt = cls.get_relevant_memory_prompt(
+            goal=goal,
+            capability=capability,
+            action=action,
+            thought=thought,
+            recent_episodes=recent_episodes,
+            most_recent_episode=most_recent_episode,
+            most_similar_episodes=most_similar_episodes,
+        )
+        logger.log(attention_prompt, should_print=False)
+        attention_response = await ChatParser(logger=logger).aget_parsed_response(
+            system=attention_prompt,
+            user=ATTENTION_USER_PROMPT,
             containers=[Attention],
             smart_llm=True,
         )
@@ -147,8 +179,7 @@ class Attention(LoggableBaseModel):
         relevant_information: str,
         logger: AgentLogger,
     ) -> "Attention":
-        attention_prompt = ATTENTION_ITERATION_PROMPT.format(
-            time=datetime.now().isoformat(),
+        attention_prompt = cls.get_relevant_memory_iterative_prompt(
             goal=goal,
             capability=capability,
             action=action,
@@ -156,13 +187,88 @@ class Attention(LoggableBaseModel):
             remembered_episode=remembered_episode,
             most_similar_episodes=most_similar_episodes,
             relevant_information=relevant_information,
-            format_instructions=get_format_instructions([Attention]),
         )
         logger.log(attention_prompt, should_print=False)
         attention_response = ChatParser(logger=logger).get_parsed_response(
             system=attention_prompt,
-            user="Remember to answer using the output format to provide a Attention!",
+            user=ATTENTION_USER_PROMPT,
+            containers=[Attention],
+            smart_llm=True,
+        )
+        return attention_response[0]
+
+    @classmethod
+    async def aget_relevant_memory_iterative(
+        cls,
+        goal: str,
+        capability: str,
+        action: str,
+        thought: str,
+        remembered_episode: str,
+        most_similar_episodes: str,
+        relevant_information: str,
+        logger: AgentLogger,
+    ) -> "Attention":
+        attention_prompt = cls.get_relevant_memory_iterative_prompt(
+            goal=goal,
+            capability=capability,
+            action=action,
+            thought=thought,
+            remembered_episode=remembered_episode,
+            most_similar_episodes=most_similar_episodes,
+            relevant_information=relevant_information,
+        )
+        logger.log(attention_prompt, should_print=False)
+        attention_response = await ChatParser(logger=logger).aget_parsed_response(
+            system=attention_prompt,
+            user=ATTENTION_USER_PROMPT,
             containers=[Attention],
             smart_llm=True,
         )
         return attention_response[0]
+
+    @classmethod
+    def get_relevant_memory_prompt(
+        cls,
+        goal: str,
+        capability: str,
+        action: str,
+        thought: str,
+        recent_episodes: str,
+        most_recent_episode: str,
+        most_similar_episodes: str,
+    ) -> str:
+        return ATTENTION_INITIAL_PROMPT.format(
+            time=datetime.now().isoformat(),
+            goal=goal,
+            capability=capability,
+            action=action,
+            thought=thought,
+            recent_episodes=recent_episodes,
+            most_recent_episode=most_recent_episode,
+            most_similar_episodes=most_similar_episodes,
+            format_instructions=get_format_instructions([Attention]),
+        )
+
+    @classmethod
+    def get_relevant_memory_iterative_prompt(
+        cls,
+        goal: str,
+        capability: str,
+        action: str,
+        thought: str,
+        remembered_episode: str,
+        most_similar_episodes: str,
+        relevant_information: str,
+    ) -> str:
+        return ATTENTION_ITERATION_PROMPT.format(
+            time=datetime.now().isoformat(),
+            goal=goal,
+            capability=capability,
+            action=action,
+            thought=thought,
+            remembered_episode=remembered_episode,
+            most_similar_episodes=most_similar_episodes,
+            relevant_information=relevant_information,
+            format_instructions=get_format_instructions([Attention]),
+        )
@@ -39,6 +39,8 @@ Here is relevant information extracted from your memory:
 {format_instructions}
 """
 
+ACTION_USER_PROMPT = "Remember to answer using the output format to provide a Thought and an Execution!"
+
 
 class Execution(LoggableBaseModel):
     action: str = Field(
@@ -83,25 +85,72 @@ class Execution(LoggableBaseModel):
         relevant_information: str,
         logger: AgentLogger,
     ) -> Tuple[Thought, "Execution"]:
-        action_prompt = ACTION_PROMPT.format(
-            time=datetime.now().isoformat(),
+        action_prompt = cls.get_execution_prompt(
             agent_name=agent_name,
             task=task,
             goal=goal,
             previous_thought=previous_thought,
             action_description=action_description,
             relevant_information=relevant_information,
-            format_instructions=get_format_instructions([Thought, Execution]),
         )
         logger.log(action_prompt, should_print=False)
         action_response = ChatParser(logger=logger).get_parsed_response(
             system=action_prompt,
-            user="Remember to answer using the output format to provide a Thought and an Execution!",
+            user=ACTION_USER_PROMPT,
             containers=[Thought, Execution],
             smart_llm=True,
         )
         return action_response[0], action_response[1]
 
+    @classmethod
+    async def aget_execution(
+        cls,
+        agent_name: str,
+        task: str,
+        goal: str,
+        previous_thought: str,
+        action_description: str,
+        relevant_information: str,
+        logger: AgentLogger,
+    ) -> Tuple[Thought, "Execution"]:
+        action_prompt = cls.get_execution_prompt(
+            agent_name=agent_name,
+            task=task,
+            goal=goal,
+            previous_thought=previous_thought,
+            action_description=action_description,
+            relevant_information=relevant_information,
+        )
+        logger.log(action_prompt, should_print=False)
+        action_response = await ChatParser(logger=logger).aget_parsed_response(
+            system=action_prompt,
+            user=ACTION_USER_PROMPT,
+            containers=[Thought, Execution],
+            smart_llm=True,
+        )
+        return action_response[0], action_response[1]
+
+    @classmethod
+    def get_execution_prompt(
+        cls,
+        agent_name: str,
+        task: str,
+        goal: str,
+        previous_thought: str,
+        action_description: str,
+        relevant_information: str,
+    ) -> str:
+        return ACTION_PROMPT.format(
+            time=datetime.now().isoformat(),
+            agent_name=agent_name,
+            task=task,
+            goal=goal,
+            previous_thought=previous_thought,
+            action_description=action_description,
+            relevant_information=relevant_information,
+            format_instructions=get_format_instructions([Thought, Execution]),
+        )
+
     def to_dict(self):
         return {
             "action": self.action,
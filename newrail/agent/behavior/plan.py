@@ -56,6 +56,8 @@ Is very important that you verify that the capability selected for each goal can
 {format_instructions}
 """
 
+PLAN_USER_PROMPT = "Remember to answer using the output format to provide a Plan!"
+
 
 class Plan(LoggableBaseModel):
     goals: list[Goal] = Field(
@@ -80,8 +82,7 @@ class Plan(LoggableBaseModel):
         capabilities_description,
         logger: AgentLogger,
     ) -> Tuple[Thought, "Plan"]:
-        plan = PLAN_PROMPT.format(
-            time=datetime.now().time(),
+        plan = cls.get_plan_prompt(
             agent_name=agent_name,
             agent_mission=agent_mission,
             task=task,
@@ -92,17 +93,81 @@ class Plan(LoggableBaseModel):
             events=events,
             relevant_information=relevant_information,
             capabilities_description=capabilities_description,
-            format_instructions=get_format_instructions([Thought, Plan]),
         )
         logger.log(plan, should_print=False)
         plan_response = ChatParser(logger=logger).get_parsed_response(
             system=plan,
-            user="Remember to answer using the output format to provide a Plan!",
+            user=PLAN_USER_PROMPT,
             containers=[Thought, Plan],
             smart_llm=True,
         )
         return plan_response[0], plan_response[1]
 
+    @classmethod
+    async def aget_plan(
+        cls,
+        agent_name,
+        agent_mission,
+        task,
+        goals,
+        previous_thought,
+        summary,
+        last_episode,
+        events,
+        relevant_information,
+        capabilities_description,
+        logger: AgentLogger,
+    ) -> Tuple[Thought, "Plan"]:
+        plan = cls.get_plan_prompt(
+            agent_name=agent_name,
+            agent_mission=agent_mission,
+            task=task,
+            goals=goals,
+            previous_thought=previous_thought,
+            summary=summary,
+            last_episode=last_episode,
+            events=events,
+            relevant_information=relevant_information,
+            capabilities_description=capabilities_description,
+        )
+        logger.log(plan, should_print=False)
+        plan_response = await ChatParser(logger=logger).aget_parsed_response(
+            system=plan,
+            user=PLAN_USER_PROMPT,
+            containers=[Thought, Plan],
+            smart_llm=True,
+        )
+        return plan_response[0], plan_response[1]
+
+    @classmethod
+    def get_plan_prompt(
+        cls,
+        agent_name,
+        agent_mission,
+        task,
+        goals,
+        previous_thought,
+        summary,
+        last_episode,
+        events,
+        relevant_information,
+        capabilities_description,
+    ) -> str:
+        return PLAN_PROMPT.format(
+            time=datetime.now().time(),
+            agent_name=agent_name,
+            agent_mission=agent_mission,
+            task=task,
+            goals=goals,
+            previous_thought=previous_thought,
+            summary=summary,
+            last_episode=last_episode,
+            events=events,
+            relevant_information=relevant_information,
+            capabilities_description=capabilities_description,
+            format_instructions=get_format_instructions([Thought, Plan]),
+        )
+
     def finished(self):
         """Check if all the goals have been accomplished."""
 
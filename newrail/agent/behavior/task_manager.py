@@ -1,5 +1,7 @@
 import ast
-from typing import Any, Dict, List, Tuple
+import asyncio
+from threading import RLock
+from typing import Any, Dict, List, Optional, Tuple
 import uuid
 
 from newrail.agent.behavior.attention import Attention
@@ -13,7 +15,9 @@ from newrail.agent.config.status import Status
 from newrail.agent.config.config import AgentConfig
 from newrail.capabilities.utils.builder import CapabilityBuilder
 from newrail.capabilities.capability import Capability
+from newrail.capabilities.utils.helper import Helper
 from newrail.memory.utils.episodes.episode import Episode
+from newrail.memory.utils.goals.goal import Goal
 from newrail.memory.utils.goals.goal_status import GoalStatus
 from newrail.memory.utils.thought.thought import Thought
 from newrail.memory.utils.task.task import Task
@@ -21,6 +25,7 @@ from newrail.memory.utils.task.task_status import TaskStatus
 from newrail.memory.short_term_memory.episodic_memory import EpisodicMemory
 from newrail.memory.long_term_memory.weaviate import WeaviateMemory
 from newrail.organization.utils.logger.agent_logger import AgentLogger
+from newrail.utils.deadline import Deadline
 from newrail.utils.storage import get_org_folder
 
 
@@ -41,21 +46,74 @@ class TaskManager:
         self.logger = agent_logger.create_logger("task_manager")
         self.memory = memory
         self.long_term_memory = WeaviateMemory()
-        self.capabilities: dict[str, "Capability"] = {}
-        self.get_capabilities(self.agent_config.capabilities)
+        # Heavy capabilities are instantiated on first use, they start browsers or containers.
+        self.capabilities: Dict[str, Optional["Capability"]] = {
+            capability: None for capability in self.agent_config.capabilities
+        }
+        self._capabilities_lock = RLock()
         self.task = None
         self.logger.log("Task Manager started.")
 
-    def get_capabilities(self, capabilities: List[str]) -> None:
-        for capability in capabilities:
-            self.capabilities[capability] = CapabilityBuilder.get_capability(
-                name=capability,
-                agent_config=self.agent_config,
-                event_manager=self.event_manager,
-                request_manager=self.request_manager,
-                org_folder=get_org_folder(self.agent_config.organization_name),
-                agent_logger=self.logger,
-            )
+    def get_capability(self, capability_name: str) -> Optional["Capability"]:
+        """Get the capability, instantiating it on first use"""
+
+        with self._capabilities_lock:
+            if capability_name not in self.capabilities:
+                return None
+            capability = self.capabilities[capability_name]
+            if capability is None:
+                capability = CapabilityBuilder.get_capability(
+                    name=capability_name,
+                    agent_config=self.agent_config,
+                    event_manager=self.event_manager,
+                    request_manager=self.request_manager,
+                    org_folder=get_org_folder(self.agent_config.organization_name),
+                    agent_logger=self.logger,
+                )
+                self.capabilities[capability_name] = capability
+            return capability
+
+    def close(self):
+        """Release the instantiated capabilities, they are instantiated again on next use"""
+
+        with self._capabilities_lock:
+            for capability_name, capability in self.capabilities.items():
+                if capability is None:
+                    continue
+                try:
+                    capability.close()
+                except Exception as e:
+                    self.logger.log_error(
+                        f"Error closing capability: {capability_name}, exception: {e}"
+                    )
+                self.capabilities[capability_name] = None
+
+    def get_capability_info(self, capability_name: str) -> Optional[Helper]:
+        """Get the info of the capability without instantiating it"""
+
+        if capability_name not in self.capabilities:
+            return None
+        capability = self.capabilities[capability_name]
+        if capability is not None:
+            return capability.info
+        capability_cls = CapabilityBuilder.CAPABILITIES.get(capability_name)
+        if capability_cls is None:
+            return None
+        return capability_cls.get_info()
+
+    def get_capability_context(self, capability_name: str) -> str:
+        """Get the context of the capability, lazy ones only have it once instantiated"""
+
+        capability = self.capabilities.get(capability_name)
+        if capability is None:
+            capability_cls = CapabilityBuilder.CAPABILITIES.get(capability_name)
+            if capability_cls is None or capability_cls.lazy:
+                return ""
+            if not capability_cls.get_context():
+                return ""
+            # Cheap capabilities, e.g: coordination, provide their context from the start.
+            capability = self.get_capability(capability_name)
+        return capability.info.get_context()
 
     def step(self):
         stage = self.agent_config.get_stage()
@@ -69,6 +127,18 @@ class TaskManager:
         # elif stage == Stage.INTEGRATION:
         #    self.integrate_stage()
 
+    async def astep(self):
+        """Coroutine version of step, awaiting the LLM and running the rest in threads"""
+
+        stage = self.agent_config.get_stage()
+        self.logger.log(f"Starting: {stage.name}")
+        if stage == Stage.PLANNING:
+            await self.aplan_stage()
+        elif stage == Stage.ATTENTION:
+            await self.aattention_stage()
+        elif stage == Stage.EXECUTION:
+            await self.aexecute_stage()
+
     def add_event(self, event: Event):
         if not self.task:
             self.create_task(
@@ -116,20 +186,50 @@ class TaskManager:
     def execute_stage(self):
         """Execution stage, execute the action and move to validation"""
 
+        inputs = self.get_execution_inputs()
+        if not inputs:
+            return
+        goal, capability, kwargs = inputs
+        thought, execution = Execution.get_execution(**kwargs, logger=self.logger)
+        self.apply_execution(
+            goal=goal, capability=capability, thought=thought, execution=execution
+        )
+
+    async def aexecute_stage(self):
+        inputs = await asyncio.to_thread(self.get_execution_inputs)
+        if not inputs:
+            return
+        goal, capability, kwargs = inputs
+        thought, execution = await Execution.aget_execution(
+            **kwargs, logger=self.logger
+        )
+        await asyncio.to_thread(
+            self.apply_execution,
+            goal=goal,
+            capability=capability,
+            thought=thought,
+            execution=execution,
+        )
+
+    def get_execution_inputs(
+        self,
+    ) -> Optional[Tuple[Goal, Capability, Dict[str, str]]]:
+        """Get the goal, its capability and the arguments to request the execution"""
+
         goal = self.memory.get_current_goal()
         if not goal:
             raise Exception("No goal to execute")
         if goal.get_status() == GoalStatus.NOT_STARTED:
-            goal.update_status(status=GoalStatus.IN_PROGRESS)
+            self.memory.update_goal_status(goal=goal, status=GoalStatus.IN_PROGRESS)
         capability_name = goal.capability
-        capability = self.capabilities.get(capability_name)
+        capability = self.get_capability(capability_name)
         if not capability:
             error_msg = f"Capability {capability_name} is not supported by the agent, planning a new step"
             self.logger.log(error_msg)
             # TODO: Add a way to notify planning
             # self.memory.update_evaluation(evaluation=error_msg)
             self.update_stage(Stage.PLANNING)
-            return
+            return None
         try:
             action_description = self.get_action_description(
                 capability_name=capability_name, action=goal.action
@@ -140,19 +240,29 @@ class TaskManager:
             # TODO: Add a way to notify planning
             # self.memory.update_evaluation(evaluation=error_msg)
             self.update_stage(Stage.PLANNING)
-            return
+            return None
 
-        thought, execution = Execution.get_execution(
+        kwargs = dict(
             agent_name=self.agent_config.name,
             task=self.task.get_description(),
             goal=goal.get_description(),
             previous_thought=self.memory.get_thought().get_description(),
             action_description=action_description,
             relevant_information=self.memory.get_relevant_information(),
-            logger=self.logger,
         )
+        return goal, capability, kwargs
+
+    def apply_execution(
+        self,
+        goal: Goal,
+        capability: Capability,
+        thought: Optional[Thought],
+        execution: Optional[Execution],
+    ):
+        """Execute the action requested by the LLM and store its episode"""
+
         if thought and execution:
-            execution.set_capability(capability=capability_name)
+            execution.set_capability(capability=goal.capability)
             self.update_thought(thought=thought)
             success, observation = self.execute_action(
                 execution=execution, capability=capability
@@ -163,6 +273,9 @@ class TaskManager:
                 self.logger.log(
                     f"Observation with error: {observation}", should_print=True
                 )
+            capability.episode_manager.set_current_goal(
+                current_goal=goal.description
+            )
             try:
                 episode = capability.get_episode(
                     execution=execution, observation=observation
@@ -185,6 +298,47 @@ class TaskManager:
     def attention_stage(self):
         """Attention stage, gather information before execution"""
 
+        inputs = self.get_attention_inputs()
+        iterate = True
+        episode = None
+        while iterate:
+            # Each iteration requests the LLM again, it could loop until the deadline.
+            Deadline.check_current()
+            kwargs = self.get_attention_request(inputs=inputs, episode=episode)
+            if episode:
+                attention = Attention.get_relevant_memory_iterative(
+                    **kwargs, logger=self.logger
+                )
+            else:
+                attention = Attention.get_relevant_memory(**kwargs, logger=self.logger)
+            iterate, episode = self.apply_attention(attention=attention)
+        self.update_stage(Stage.EXECUTION)
+
+    async def aattention_stage(self):
+        inputs = await asyncio.to_thread(self.get_attention_inputs)
+        iterate = True
+        episode = None
+        while iterate:
+            Deadline.check_current()
+            kwargs = await asyncio.to_thread(
+                self.get_attention_request, inputs=inputs, episode=episode
+            )
+            if episode:
+                attention = await Attention.aget_relevant_memory_iterative(
+                    **kwargs, logger=self.logger
+                )
+            else:
+                attention = await Attention.aget_relevant_memory(
+                    **kwargs, logger=self.logger
+                )
+            iterate, episode = await asyncio.to_thread(
+                self.apply_attention, attention=attention
+            )
+        await asyncio.to_thread(self.update_stage, Stage.EXECUTION)
+
+    def get_attention_inputs(self) -> Dict[str, Any]:
+        """Get the memory shared by all the iterations of the attention stage"""
+
         goal = self.memory.get_current_goal()
         if not goal:
             raise Exception("No goal to execute")
@@ -194,72 +348,99 @@ class TaskManager:
                 for episode in self.memory.get_goal_episodes()
             ]
         )
-        iterate = True
-        episode = None
-        thought = self.memory.get_thought().get_description()
-        relevant_information = self.memory.get_relevant_information()
         last_episode = self.memory.get_last_episode()
         if last_episode:
             last_episode_str = last_episode.get_description(include_child_episodes=True)
         else:
             last_episode_str = ""
-        while iterate:
-            iterate = False
-            most_similar_episodes = self.memory.get_similar_episodes()
-            most_similar_episodes_str = ""
-            for question, answer in most_similar_episodes.items():
-                most_similar_episodes_str += f"\nQuestion: {question}\nEpisode: {answer.get_description(include_child_episodes=True)}\n"
-            if episode:
-                attention = Attention.get_relevant_memory_iterative(
-                    goal=goal.get_description(),
-                    capability=goal.capability,
-                    action=goal.action,
-                    thought=thought,
-                    remembered_episode=episode.get_description(),
-                    most_similar_episodes=most_similar_episodes_str,
-                    relevant_information=relevant_information,
-                    logger=self.logger,
-                )
-            else:
-                attention = Attention.get_relevant_memory(
-                    goal=goal.get_description(),
-                    capability=goal.capability,
-                    action=goal.action,
-                    thought=thought,
-                    recent_episodes=goal_episodes_str,
-                    most_recent_episode=last_episode_str,
-                    most_similar_episodes=most_similar_episodes_str,
-                    logger=self.logger,
-                )
+        return dict(
+            goal=goal,
+            goal_episodes=goal_episodes_str,
+            thought=self.memory.get_thought().get_description(),
+            relevant_information=self.memory.get_relevant_information(),
+            last_episode=last_episode_str,
+        )
 
-            if not attention:
-                self.logger.log(
-                    "Failed to get relevant information from attention, trying again..",
-                    should_print=True,
-                )
-                continue
-            # TODO: RETHINK THIS. IT DOESN'T WORK AS EXPECTED AS WE ONLY CALL IT IN CASE OF EPISODE.
-            # if attention.search_query:
-            # self.update_similar_episodes(queries=attention.search_query)
-            if attention.remember_episode_uuid:
-                episode = self.long_term_memory.get_episode(
-                    agent_uuid=self.agent_config.id,
-                    episode_uuid=attention.remember_episode_uuid,
-                )
-                iterate = True
-            # TODO: Update to context.
-            self.memory.update_relevant_information(
-                relevant_information=attention.relevant_information
+    def get_attention_request(
+        self, inputs: Dict[str, Any], episode: Optional[Episode]
+    ) -> Dict[str, str]:
+        """Get the arguments to request the attention, iterating over the remembered episode"""
+
+        goal = inputs["goal"]
+        most_similar_episodes = self.memory.get_similar_episodes()
+        most_similar_episodes_str = ""
+        for question, answer in most_similar_episodes.items():
+            most_similar_episodes_str += f"\nQuestion: {question}\nEpisode: {answer.get_description(include_child_episodes=True)}\n"
+        kwargs = dict(
+            goal=goal.get_description(),
+            capability=goal.capability,
+            action=goal.action,
+            thought=inputs["thought"],
+            most_similar_episodes=most_similar_episodes_str,
+        )
+        if episode:
+            kwargs.update(
+                remembered_episode=episode.get_description(),
+                relevant_information=inputs["relevant_information"],
             )
-        self.update_stage(Stage.EXECUTION)
+        else:
+            kwargs.update(
+                recent_episodes=inputs["goal_episodes"],
+                most_recent_episode=inputs["last_episode"],
+            )
+        return kwargs
+
+    def apply_attention(
+        self, attention: Optional[Attention]
+    ) -> Tuple[bool, Optional[Episode]]:
+        """Store the relevant information, returns if it should iterate and the episode to remember"""
+
+        if not attention:
+            self.logger.log(
+                "Failed to get relevant information from attention, trying again..",
+                should_print=True,
+            )
+            return False, None
+        iterate = False
+        episode = None
+        # TODO: RETHINK THIS. IT DOESN'T WORK AS EXPECTED AS WE ONLY CALL IT IN CASE OF EPISODE.
+        # if attention.search_query:
+        # self.update_similar_episodes(queries=attention.search_query)
+        if attention.remember_episode_uuid:
+            episode = self.long_term_memory.get_episode(
+                agent_uuid=self.agent_config.id,
+                episode_uuid=attention.remember_episode_uuid,
+            )
+            iterate = True
+        # TODO: Update to context.
+        self.memory.update_relevant_information(
+            relevant_information=attention.relevant_information
+        )
+        return iterate, episode
 
     def plan_stage(self):
+        inputs = self.get_plan_inputs()
+        if not inputs:
+            return
+        thought, plan = Plan.get_plan(**inputs, logger=self.logger)
+        self.apply_plan(thought=thought, plan=plan)
+
+    async def aplan_stage(self):
+        inputs = await asyncio.to_thread(self.get_plan_inputs)
+        if not inputs:
+            return
+        thought, plan = await Plan.aget_plan(**inputs, logger=self.logger)
+        await asyncio.to_thread(self.apply_plan, thought=thought, plan=plan)
+
+    def get_plan_inputs(self) -> Optional[Dict[str, str]]:
+        """Get the arguments to request the plan, None if there is no task to plan"""
+
         self.task = self.memory.get_task()
         if not self.task:
             if self.agent_config.get_status() == Status.ACTIVE:
                 self.logger.log("No task, waiting for new task..", should_print=True)
                 self.agent_config.set_status(Status.WAITING)
-            return
+            return None
 
         if self.task.status == TaskStatus.NOT_STARTED:
             self.update_task(status=TaskStatus.IN_PROGRESS)
@@ -292,7 +473,7 @@ class TaskManager:
         # 1. Consider removing relevant information from plan.
         # 2. Change summary.
         # 3. Remove evaluation.
-        thought, plan = Plan.get_plan(
+        return dict(
             agent_name=self.agent_config.name,
             agent_mission=self.agent_config.mission,
             task=self.task.get_description(),
@@ -303,8 +484,11 @@ class TaskManager:
             events=events_str,
             relevant_information=self.memory.get_relevant_information(),
             capabilities_description=self.get_capabilities_description(),
-            logger=self.logger,
         )
+
+    def apply_plan(self, thought: Optional[Thought], plan: Optional[Plan]):
+        """Update the thought and the goals with the plan of the LLM"""
+
         if thought and plan:
             self.update_thought(thought=thought)
             if plan.search_queries:
@@ -333,16 +517,16 @@ class TaskManager:
         capability_name: str,
         detailed: bool = False,
     ) -> str:
-        capability = self.capabilities.get(capability_name)
-        if capability is None:
+        capability_info = self.get_capability_info(capability_name)
+        if capability_info is None:
             self.logger.log("Critical error! Wrong capability.")
             raise ValueError(f"Unknown capability: {capability_name}")
 
         capability_description = f"\n=== CAPABILITY: {capability_name} ===\n"
-        capability_description += capability.info.get_capabilitiy_description(
+        capability_description += capability_info.get_capabilitiy_description(
             detailed=detailed
         )
-        context = capability.info.get_context()
+        context = self.get_capability_context(capability_name)
         if context:
             capability_description += f"\n=== CONTEXT ===\n{context}\n"
         return capability_description
@@ -352,16 +536,16 @@ class TaskManager:
         capability_name: str,
         action: str,
     ) -> str:
-        capability = self.capabilities.get(capability_name)
-        if capability is None:
+        capability_info = self.get_capability_info(capability_name)
+        if capability_info is None:
             self.logger.log("Critical error! Wrong capability.")
             raise ValueError(f"Unknown capability: {capability_name}")
 
         action_description = f"\n=== ACTION: {action} ===\n"
-        action_description += capability.get_action_doc(action=action)
+        action_description += capability_info.get_action_doc(action=action)
 
         # TODO: Rethink this.
-        context = capability.info.get_context()
+        context = self.get_capability_context(capability_name)
         if context:
             action_description += f"\n=== CONTEXT ===\n{context}\n"
         return action_description
@@ -480,8 +664,7 @@ class TaskManager:
         self.request_manager.send_notification(event_type=stage.name, data=data)
 
     def verify_action(self, capability_name: str, action: str):
-        capability = self.capabilities.get(capability_name)
-        if not capability:
+        if capability_name not in self.capabilities:
             return False
         try:
             self.get_action_description(capability_name=capability_name, action=action)
@@ -0,0 +1,101 @@
+import atexit
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from newrail.agent.config.config import AgentConfig
+from newrail.agent.communication.database_handler.database_handler import (
+    DatabaseHandler,
+    create_database_handler,
+)
+from newrail.config.config import Config
+
+
+class AgentStateSync:
+    """
+    Batches the state changes of the agents of the process before sending them to the database.
+
+    Only the changed columns of each agent are sent, and agents sharing the same changes
+    are updated with a single request on every flush.
+    """
+
+    _instance: Optional["AgentStateSync"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        database_handler: DatabaseHandler,
+        flush_interval: float = Config().agent_state_sync_interval,
+    ):
+        self.database_handler = database_handler
+        self.flush_interval = flush_interval
+        self.condition = threading.Condition()
+        self.pending: Dict[str, AgentConfig] = {}
+        self.flusher: Optional[threading.Thread] = None
+
+    @classmethod
+    def get_instance(cls) -> "AgentStateSync":
+        """Get the sync shared by all the agents of the process"""
+
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(database_handler=create_database_handler())
+            return cls._instance
+
+    def put(self, agent_config: AgentConfig) -> None:
+        """Schedule the sync of the agent changes"""
+
+        with self.condition:
+            self.pending[agent_config.id] = agent_config
+            if not self.flusher:
+                self.flusher = threading.Thread(target=self.run, daemon=True)
+                self.flusher.start()
+                atexit.register(self.flush)
+            self.condition.notify_all()
+
+    def run(self) -> None:
+        retry_interval = self.flush_interval
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: len(self.pending) > 0)
+            # Give time to other agents to batch their changes.
+            time.sleep(self.flush_interval)
+            if self.flush():
+                retry_interval = self.flush_interval
+            else:
+                time.sleep(retry_interval)
+                retry_interval = min(retry_interval * 2, 60)
+
+    def flush(self) -> bool:
+        """Send the pending changes grouped by their values.
+
+        Returns:
+            bool: True if every change was sent.
+        """
+
+        with self.condition:
+            agent_configs = self.pending
+            self.pending = {}
+        groups: Dict[Tuple[Tuple[str, Any], ...], List[str]] = {}
+        for agent_config in agent_configs.values():
+            changes = agent_config.pop_changes()
+            if changes:
+                groups.setdefault(tuple(sorted(changes.items())), []).append(
+                    agent_config.id
+                )
+        sent = True
+        for changes, agent_ids in groups.items():
+            try:
+                self.database_handler.update_agents(
+                    changes=dict(changes), agent_ids=agent_ids
+                )
+            except Exception as e:
+                print(f"Failed to sync the state of agents {agent_ids}: {e}")
+                # Retry on next flush with the latest values.
+                for agent_id in agent_ids:
+                    agent_config = agent_configs[agent_id]
+                    agent_config.mark_changed(*[field for field, _ in changes])
+                    with self.condition:
+                        self.pending[agent_id] = agent_config
+                sent = False
+        return sent
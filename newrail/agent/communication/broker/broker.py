@@ -1,21 +1,36 @@
 from datetime import datetime
+from functools import partial
 from realtime.types import Callback
 import uuid
 
 from newrail.agent.config.config import AgentConfig
-from newrail.agent.communication.database_handler.supabase_handler import (
-    SupabaseHandler,
+from newrail.agent.communication.broker.agent_state_sync import AgentStateSync
+from newrail.agent.communication.broker.outbox import Outbox
+from newrail.agent.communication.broker.realtime_dispatcher import RealtimeDispatcher
+from newrail.agent.communication.broker.topology_cache import TopologyCache
+from newrail.agent.communication.database_handler.database_handler import (
+    create_database_handler,
 )
 from newrail.config.config import Config
 from newrail.organization.utils.logger.agent_logger import AgentLogger
+from newrail.utils.unit_of_work import UnitOfWork
 
 
 class Broker:
     def __init__(self, agent_config: AgentConfig, agent_logger: AgentLogger):
         self.organization_id = Config().organization_id
         self.agent_config = agent_config
-        self.database_handler = SupabaseHandler()
+        self.database_handler = create_database_handler()
+        self.state_sync = None
+        if Config().agent_state_sync_interval > 0:
+            self.state_sync = AgentStateSync.get_instance()
+        self.outbox = None
+        if Config().outbox_flush_interval > 0:
+            self.outbox = Outbox.get_instance()
+            self.outbox.start(insert_rows=self.database_handler.insert_rows)
         self.agent_logger = agent_logger.create_logger("broker")
+        # Lookups of other agents are served from memory.
+        self.topology = TopologyCache.get_instance(organization_id=self.organization_id)
 
     def create_task(self, id: str, title: str, description: str, status: str):
         self.database_handler.create_task(
@@ -30,20 +45,14 @@ class Broker:
     def get_agent_info(self, agent_name: str):
         """Get agent info"""
 
-        agent = self.database_handler.get_agent(
-            organization_id=self.organization_id,
-            agent_name=agent_name,
-        )
+        agent = self.topology.get_agent(agent_name=agent_name)
         if len(agent) > 1:
             self.agent_logger.log_critical("Agent exists twice in database!!")
 
         return agent[0]
 
     def get_agent_info_from_id(self, agent_id: str):
-        agent = self.database_handler.get_agent_from_id(
-            organization_id=self.organization_id,
-            agent_id=agent_id,
-        )
+        agent = self.topology.get_agent_from_id(agent_id=agent_id)
         if len(agent) > 1:
             self.agent_logger.log_critical("Agent exists twice in database!!")
 
@@ -59,9 +68,8 @@ class Broker:
         return user[0]
 
     def get_supervised_agents_info_str(self):
-        supervised_agents = self.database_handler.get_supervised_agent(
-            organization_id=self.organization_id,
-            supervisor_name=self.agent_config.name,
+        supervised_agents = self.topology.get_supervised_agent(
+            supervisor_name=self.agent_config.name
         )
         return [
             self._get_agent_info(supervised_agent)
@@ -71,9 +79,8 @@ class Broker:
     def get_sibling_agents_info_str(self):
         supervisor_name = self.agent_config.supervisor_name
         if supervisor_name:
-            sibling_agents = self.database_handler.get_supervised_agent(
-                organization_id=self.organization_id,
-                supervisor_name=self.agent_config.supervisor_name,
+            sibling_agents = self.topology.get_supervised_agent(
+                supervisor_name=self.agent_config.supervisor_name
             )
             siblings_info = []
             for sibling_agent in sibling_agents:
@@ -90,8 +97,18 @@ class Broker:
 
     def update_agent(self, agent_config: AgentConfig):
         self.agent_config = agent_config
-        agent_data = agent_config.to_dict()
-        self.database_handler.update_agent(**agent_data)
+        if UnitOfWork.defer(
+            key=(self, "update_agent"),
+            write=partial(self.update_agent, agent_config=agent_config),
+        ):
+            return
+        if self.state_sync:
+            self.state_sync.put(agent_config=agent_config)
+            return
+        # Send only the changed columns.
+        changes = agent_config.pop_changes()
+        if changes:
+            self.database_handler.update_agent(id=agent_config.id, **changes)
 
     def update_task(self, task_id: str, status: str):
         """Update task status in database"""
@@ -109,11 +126,16 @@ class Broker:
             "agent_id": agent_id,
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "data": message_data,
+            # Identifies the message, a batch sent again doesn't deliver it twice.
+            "id": str(uuid.uuid4()),
             "request_type": "message_from_agent",
             "organization_id": organization_id,
             "team_id": team_id,
         }
-        self.database_handler.send_event(**data)
+        if self.outbox:
+            self.outbox.put(table_name="agent_incoming_events", row=data)
+        else:
+            self.database_handler.send_event(**data)
 
     def send_notification(
         self,
@@ -129,17 +151,26 @@ class Broker:
             "organization_id": self.agent_config.organization_id,
             "team_id": self.agent_config.team_id,
         }
-        self.database_handler.send_notification(**data)
+        if self.outbox:
+            self.outbox.put(table_name="agent_notifications", row=data)
+        else:
+            self.database_handler.send_notification(**data)
 
     def subscribe_to_channel(
         self, schema: str, table_name: str, event_type: str, callback: Callback
     ):
-        self.database_handler.subscribe_to_channel(
+        """Receive the rows of the agent, through the realtime subscription of the process"""
+
+        RealtimeDispatcher.get_instance().subscribe(
             schema=schema,
             table_name=table_name,
             event_type=event_type,
+            agent_id=self.agent_config.id,
             callback=callback,
         )
 
+    def unsubscribe_from_channels(self):
+        RealtimeDispatcher.get_instance().unsubscribe(agent_id=self.agent_config.id)
+
     def start_realtime_listener(self):
-        self.database_handler.start_realtime_listener()
+        RealtimeDispatcher.get_instance().start()
@@ -0,0 +1,73 @@
+import atexit
+from collections import OrderedDict
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+import uuid
+
+from newrail.config.config import Config
+from newrail.utils.journal import WriteBehindQueue
+
+
+class Outbox(WriteBehindQueue):
+    """
+    Buffered outbox for the rows inserted by the agents, e.g: notifications and events.
+
+    Rows are sent as bulk inserts, one per table, see WriteBehindQueue.
+    """
+
+    JOURNAL_NAME = "outbox_journal"
+    KEY = "id"
+
+    _instance: Optional["Outbox"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        journal_path: str,
+        batch_size: int = Config().outbox_batch_size,
+        flush_interval: float = Config().outbox_flush_interval,
+    ):
+        super().__init__(
+            journal_path=journal_path,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+        )
+        self.insert_rows: Optional[Callable[[str, List[Dict[str, Any]]], None]] = None
+
+    @staticmethod
+    def get_journal_folder() -> str:
+        return os.path.join(Config().permanent_storage, "outbox")
+
+    def start(self, insert_rows: Callable[[str, List[Dict[str, Any]]], None]) -> None:
+        """Start the background flusher, only the first call has effect"""
+
+        with self.condition:
+            if self.flusher:
+                return
+            self.insert_rows = insert_rows
+        if self.start_flusher():
+            atexit.register(self.flush)
+
+    def put(self, table_name: str, row: Dict[str, Any]) -> None:
+        """Queue a row, it is durable once this method returns"""
+
+        self.put_record({"id": str(uuid.uuid4()), "table": table_name, "row": row})
+
+    def write(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Insert a batch, one request per table"""
+
+        if not self.insert_rows:
+            return []
+        tables: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        for record in batch:
+            tables.setdefault(record["table"], []).append(record)
+        sent = []
+        for table_name, records in tables.items():
+            try:
+                self.insert_rows(table_name, [record["row"] for record in records])
+            except Exception as e:
+                print(f"Failed to insert {len(records)} rows into {table_name}: {e}")
+                continue
+            sent.extend(records)
+        return sent
@@ -0,0 +1,94 @@
+from functools import partial
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from realtime.types import Callback
+
+from newrail.agent.communication.database_handler.database_handler import (
+    DatabaseHandler,
+    create_database_handler,
+)
+from newrail.config.config import Config
+
+
+class RealtimeDispatcher:
+    """
+    Realtime subscription shared by all the agents of the process.
+
+    A single listener of the database receives the inserts of the subscribed tables and
+    routes each row to the callbacks of the agent in its agent_id column. With server
+    filters each agent subscribes to its own rows (agent_id=eq.<id>) on the shared
+    listener, so the process only receives the rows of its agents. Otherwise each table is
+    subscribed once and the rows of other agents are dropped here.
+    """
+
+    _instance: Optional["RealtimeDispatcher"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        database_handler: DatabaseHandler,
+        server_filters: bool = Config().realtime_server_filters,
+    ):
+        self.database_handler = database_handler
+        self.server_filters = server_filters
+        self.lock = threading.RLock()
+        # (schema:table, agent id) -> callbacks of the agent.
+        self.handlers: Dict[Tuple[str, str], List[Callback]] = {}
+        # (schema:table, event type, agent id if filtered) -> topic at the database.
+        self.topics: Dict[Tuple[str, str, Optional[str]], str] = {}
+
+    @classmethod
+    def get_instance(cls) -> "RealtimeDispatcher":
+        """Get the dispatcher shared by all the agents of the process"""
+
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(database_handler=create_database_handler())
+            return cls._instance
+
+    def subscribe(
+        self,
+        schema: str,
+        table_name: str,
+        event_type: str,
+        agent_id: str,
+        callback: Callback,
+    ) -> None:
+        """Call the callback with the rows of the agent inserted at the table"""
+
+        table = f"{schema}:{table_name}"
+        with self.lock:
+            self.handlers.setdefault((table, agent_id), []).append(callback)
+            key = (table, event_type, agent_id if self.server_filters else None)
+            if key in self.topics:
+                return
+            self.topics[key] = self.database_handler.subscribe_to_channel(
+                schema=schema,
+                table_name=table_name,
+                event_type=event_type,
+                callback=partial(self.route, table),
+                filter=f"agent_id=eq.{agent_id}" if self.server_filters else None,
+            )
+
+    def unsubscribe(self, agent_id: str) -> None:
+        """Stop routing the rows of the agent, leaving its topics if filtered"""
+
+        with self.lock:
+            for key in [key for key in self.handlers if key[1] == agent_id]:
+                del self.handlers[key]
+            for key in [key for key in self.topics if key[2] == agent_id]:
+                self.database_handler.unsubscribe_from_channel(self.topics.pop(key))
+
+    def start(self) -> None:
+        self.database_handler.start_realtime_listener()
+
+    def route(self, table: str, payload: Dict[str, Any]) -> None:
+        record = payload.get("record") or {}
+        with self.lock:
+            callbacks = list(self.handlers.get((table, record.get("agent_id")), []))
+        for callback in callbacks:
+            try:
+                callback(payload)
+            except Exception as e:
+                print(f"Failed to handle the realtime change of {table}: {e}")
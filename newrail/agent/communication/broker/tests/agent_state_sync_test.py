@@ -0,0 +1,89 @@
+import shutil
+import unittest
+
+from newrail.agent.communication.broker.agent_state_sync import AgentStateSync
+from newrail.agent.config.config import AgentConfig
+from newrail.agent.config.stage import Stage
+from newrail.agent.config.status import Status
+from newrail.utils.storage import get_org_folder
+
+
+ORGANIZATION_NAME = "test_agent_state_sync"
+
+
+class FakeDatabaseHandler:
+    def __init__(self):
+        self.updates = []
+        self.fail = False
+
+    def update_agents(self, changes, agent_ids):
+        if self.fail:
+            raise Exception("Database is down")
+        self.updates.append((changes, sorted(agent_ids)))
+
+
+def get_agent_config(name):
+    return AgentConfig(
+        created_by_user_id="user",
+        id=f"{name}_id",
+        name=name,
+        organization_id="organization",
+        organization_name=ORGANIZATION_NAME,
+        mission="Test the agent state sync",
+        capabilities=[],
+        team_id="team",
+        team_name="team",
+        is_lead=False,
+        supervisor_id=None,
+        supervisor_name=None,
+    )
+
+
+class TestAgentStateSync(unittest.TestCase):
+    def setUp(self):
+        self.database_handler = FakeDatabaseHandler()
+        self.state_sync = AgentStateSync(
+            database_handler=self.database_handler, flush_interval=0
+        )
+        self.agent_configs = [get_agent_config(f"agent_{idx}") for idx in range(3)]
+
+    def tearDown(self):
+        shutil.rmtree(get_org_folder(ORGANIZATION_NAME), ignore_errors=True)
+
+    def test_sends_only_changes(self):
+        agent_config = self.agent_configs[0]
+        agent_config.set_stage(Stage.EXECUTION)
+        agent_config.set_status(Status.WAITING)  # Unchanged
+        self.assertEqual(agent_config.pop_changes(), {"stage": "EXECUTION"})
+        self.assertEqual(agent_config.pop_changes(), {})
+
+    def test_groups_agents_with_same_changes(self):
+        for agent_config in self.agent_configs:
+            agent_config.set_stage(Stage.EXECUTION)
+            self.state_sync.pending[agent_config.id] = agent_config
+        self.agent_configs[2].set_status(Status.ACTIVE)
+        self.state_sync.flush()
+        self.assertEqual(
+            sorted(self.database_handler.updates, key=lambda update: len(update[0])),
+            [
+                ({"stage": "EXECUTION"}, ["agent_0_id", "agent_1_id"]),
+                ({"stage": "EXECUTION", "status": "ACTIVE"}, ["agent_2_id"]),
+            ],
+        )
+
+    def test_retries_failed_changes(self):
+        agent_config = self.agent_configs[0]
+        agent_config.set_stage(Stage.EXECUTION)
+        self.state_sync.pending[agent_config.id] = agent_config
+        self.database_handler.fail = True
+        self.assertFalse(self.state_sync.flush())
+        self.database_handler.fail = False
+        agent_config.set_stage(Stage.PLANNING)
+        self.assertTrue(self.state_sync.flush())
+        self.assertEqual(
+            self.database_handler.updates, [({"stage": "PLANNING"}, ["agent_0_id"])]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
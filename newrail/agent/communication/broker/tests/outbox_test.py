@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+import unittest
+
+from newrail.agent.communication.broker.outbox import Outbox
+
+
+def get_notification(idx):
+    return {"id": f"notification-{idx}", "event_type": "thought", "data": {}}
+
+
+class TestOutbox(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.journal_path = os.path.join(self.tmp_dir.name, "outbox.jsonl")
+        self.inserts = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def insert_rows(self, table_name, rows):
+        self.inserts.append((table_name, [row["id"] for row in rows]))
+
+    def test_flush_inserts_each_table_in_bulk(self):
+        outbox = Outbox(self.journal_path, batch_size=10, flush_interval=60)
+        outbox.insert_rows = self.insert_rows
+        outbox.put("agent_notifications", get_notification(0))
+        outbox.put("agent_incoming_events", {"id": "event-0"})
+        outbox.put("agent_notifications", get_notification(1))
+        self.assertTrue(outbox.flush())
+        self.assertEqual(
+            self.inserts,
+            [
+                ("agent_notifications", ["notification-0", "notification-1"]),
+                ("agent_incoming_events", ["event-0"]),
+            ],
+        )
+        self.assertEqual(outbox.qsize(), 0)
+
+    def test_flusher_sends_full_batches(self):
+        outbox = Outbox(self.journal_path, batch_size=2, flush_interval=60)
+        outbox.start(insert_rows=self.insert_rows)
+        for idx in range(2):
+            outbox.put("agent_notifications", get_notification(idx))
+        deadline = time.time() + 5
+        while outbox.qsize() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(
+            self.inserts,
+            [("agent_notifications", ["notification-0", "notification-1"])],
+        )
+
+    def test_failed_tables_survive_restart(self):
+        def insert_rows(table_name, rows):
+            if table_name == "agent_incoming_events":
+                raise Exception("Database is down")
+            self.insert_rows(table_name, rows)
+
+        outbox = Outbox(self.journal_path, batch_size=10, flush_interval=60)
+        outbox.insert_rows = insert_rows
+        outbox.put("agent_notifications", get_notification(0))
+        outbox.put("agent_incoming_events", {"id": "event-0"})
+        self.assertFalse(outbox.flush())
+        self.assertEqual(self.inserts, [("agent_notifications", ["notification-0"])])
+
+        recovered_outbox = Outbox(self.journal_path, batch_size=10, flush_interval=60)
+        self.assertEqual(recovered_outbox.qsize(), 1)
+        recovered_outbox.insert_rows = self.insert_rows
+        self.assertTrue(recovered_outbox.flush())
+        self.assertEqual(self.inserts[-1], ("agent_incoming_events", ["event-0"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
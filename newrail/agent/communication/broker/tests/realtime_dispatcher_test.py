@@ -0,0 +1,71 @@
+import unittest
+
+from newrail.agent.communication.broker.realtime_dispatcher import RealtimeDispatcher
+
+
+class FakeDatabaseHandler:
+    def __init__(self):
+        self.channels = {}
+        self.listening = False
+
+    def subscribe_to_channel(self, schema, table_name, event_type, callback, filter):
+        topic = f"realtime:{schema}:{table_name}"
+        if filter:
+            topic = f"{topic}:{filter}"
+        self.channels[topic] = callback
+        return topic
+
+    def unsubscribe_from_channel(self, topic):
+        del self.channels[topic]
+
+    def start_realtime_listener(self):
+        self.listening = True
+
+    def insert(self, topic, agent_id):
+        self.channels[topic]({"record": {"agent_id": agent_id}})
+
+
+class TestRealtimeDispatcher(unittest.TestCase):
+    def subscribe(self, dispatcher, agent_id):
+        received = []
+        for table_name in ["agent_incoming_events", "tasks"]:
+            dispatcher.subscribe(
+                schema="public",
+                table_name=table_name,
+                event_type="INSERT",
+                agent_id=agent_id,
+                callback=received.append,
+            )
+        return received
+
+    def test_tables_are_subscribed_once_without_server_filters(self):
+        database_handler = FakeDatabaseHandler()
+        dispatcher = RealtimeDispatcher(database_handler, server_filters=False)
+        received = [self.subscribe(dispatcher, f"agent_{idx}") for idx in range(3)]
+        dispatcher.start()
+        self.assertTrue(database_handler.listening)
+        self.assertEqual(
+            sorted(database_handler.channels),
+            ["realtime:public:agent_incoming_events", "realtime:public:tasks"],
+        )
+        database_handler.insert("realtime:public:tasks", "agent_1")
+        database_handler.insert("realtime:public:tasks", "other_agent")
+        self.assertEqual([len(rows) for rows in received], [0, 1, 0])
+
+    def test_agents_subscribe_to_their_rows_with_server_filters(self):
+        database_handler = FakeDatabaseHandler()
+        dispatcher = RealtimeDispatcher(database_handler, server_filters=True)
+        received = [self.subscribe(dispatcher, f"agent_{idx}") for idx in range(2)]
+        self.assertIn(
+            "realtime:public:tasks:agent_id=eq.agent_0", database_handler.channels
+        )
+        self.assertEqual(len(database_handler.channels), 4)
+        database_handler.insert(
+            "realtime:public:agent_incoming_events:agent_id=eq.agent_0", "agent_0"
+        )
+        self.assertEqual([len(rows) for rows in received], [1, 0])
+
+        dispatcher.unsubscribe("agent_0")
+        self.assertEqual(len(database_handler.channels), 2)
+        database_handler.insert("realtime:public:tasks:agent_id=eq.agent_1", "agent_1")
+        self.assertEqual([len(rows) for rows in received], [1, 1])
@@ -0,0 +1,90 @@
+import time
+import unittest
+
+from newrail.agent.communication.broker.topology_cache import TopologyCache
+
+
+def get_agent(idx, supervisor_name=None):
+    return {
+        "id": f"agent_{idx}_id",
+        "name": f"agent_{idx}",
+        "organization_id": "organization",
+        "supervisor_name": supervisor_name,
+    }
+
+
+class FakeDatabaseHandler:
+    def __init__(self, agents):
+        self.agents = agents
+        self.queries = 0
+        self.callback = None
+
+    def subscribe_to_channel(self, schema, table_name, event_type, callback, filter):
+        self.callback = callback
+
+    def start_realtime_listener(self):
+        pass
+
+    def get_all_agents(self, organization_id):
+        self.queries += 1
+        return list(self.agents)
+
+    def get_agent(self, organization_id, agent_name):
+        self.queries += 1
+        return [agent for agent in self.agents if agent["name"] == agent_name]
+
+    def get_agent_from_id(self, organization_id, agent_id):
+        self.queries += 1
+        return [agent for agent in self.agents if agent["id"] == agent_id]
+
+    def get_supervised_agent(self, organization_id, supervisor_name):
+        self.queries += 1
+        return [
+            agent for agent in self.agents if agent["supervisor_name"] == supervisor_name
+        ]
+
+
+class TestTopologyCache(unittest.TestCase):
+    def setUp(self):
+        self.database_handler = FakeDatabaseHandler(
+            agents=[get_agent(0), get_agent(1, "agent_0"), get_agent(2, "agent_0")]
+        )
+
+    def test_lookups_are_served_from_memory(self):
+        cache = TopologyCache(self.database_handler, "organization", ttl=60)
+        self.assertEqual(cache.get_agent("agent_1"), [get_agent(1, "agent_0")])
+        self.assertEqual(cache.get_agent_from_id("agent_0_id"), [get_agent(0)])
+        self.assertEqual(len(cache.get_supervised_agent("agent_0")), 2)
+        self.assertEqual(self.database_handler.queries, 1)
+
+    def test_realtime_changes_update_the_cache(self):
+        cache = TopologyCache(self.database_handler, "organization", ttl=60)
+        cache.get_agent("agent_0")
+        self.database_handler.callback(
+            {"type": "INSERT", "record": get_agent(3, "agent_0")}
+        )
+        self.database_handler.callback(
+            {"type": "DELETE", "old_record": {"id": "agent_1_id"}}
+        )
+        supervised_agents = cache.get_supervised_agent("agent_0")
+        self.assertEqual(
+            sorted(agent["name"] for agent in supervised_agents),
+            ["agent_2", "agent_3"],
+        )
+        self.assertEqual(self.database_handler.queries, 1)
+
+    def test_missing_and_expired_agents_are_queried(self):
+        cache = TopologyCache(self.database_handler, "organization", ttl=0.1)
+        cache.get_agent("agent_0")
+        self.database_handler.agents.append(get_agent(3))
+        self.assertEqual(cache.get_agent("agent_3"), [get_agent(3)])
+        self.assertEqual(self.database_handler.queries, 2)
+        time.sleep(0.1)
+        cache.get_agent("agent_3")
+        self.assertEqual(self.database_handler.queries, 3)
+
+    def test_disabled_cache_queries_the_database(self):
+        cache = TopologyCache(self.database_handler, "organization", ttl=0)
+        cache.get_agent("agent_0")
+        cache.get_agent("agent_0")
+        self.assertEqual(self.database_handler.queries, 2)
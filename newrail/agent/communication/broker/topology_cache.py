@@ -0,0 +1,139 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from newrail.agent.communication.broker.realtime_dispatcher import RealtimeDispatcher
+from newrail.agent.communication.database_handler.database_handler import (
+    DatabaseHandler,
+)
+from newrail.config.config import Config
+
+
+class TopologyCache:
+    """
+    In-memory copy of the agents of an organization, shared by the agents of the process.
+
+    The agents are loaded with a single query and kept fresh by the realtime changes of
+    the agents table, the whole copy is reloaded when it is older than the TTL in case a
+    change was missed. Agents not found in the copy are queried and added to it. A TTL of
+    0 disables the cache, every lookup is sent to the database.
+    """
+
+    _instances: Dict[str, "TopologyCache"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(
+        self,
+        database_handler: DatabaseHandler,
+        organization_id: str,
+        ttl: float = Config().topology_cache_ttl,
+    ):
+        self.database_handler = database_handler
+        self.organization_id = organization_id
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.agents: Dict[str, Dict[str, Any]] = {}
+        self.loaded_time: Optional[float] = None
+        self.subscribed = False
+
+    @classmethod
+    def get_instance(cls, organization_id: str) -> "TopologyCache":
+        """Get the cache of the organization, using the realtime listener of the process"""
+
+        with cls._instances_lock:
+            cache = cls._instances.get(organization_id)
+            if cache is None:
+                cache = cls(
+                    database_handler=RealtimeDispatcher.get_instance().database_handler,
+                    organization_id=organization_id,
+                )
+                cls._instances[organization_id] = cache
+            return cache
+
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get_agent(self, agent_name: str) -> List[Dict[str, Any]]:
+        if not self.enabled():
+            return self.database_handler.get_agent(
+                organization_id=self.organization_id, agent_name=agent_name
+            )
+        with self.lock:
+            self.refresh()
+            agents = [
+                agent for agent in self.agents.values() if agent["name"] == agent_name
+            ]
+        if not agents:
+            agents = self.database_handler.get_agent(
+                organization_id=self.organization_id, agent_name=agent_name
+            )
+            self.add_agents(agents)
+        return agents
+
+    def get_agent_from_id(self, agent_id: str) -> List[Dict[str, Any]]:
+        if not self.enabled():
+            return self.database_handler.get_agent_from_id(
+                organization_id=self.organization_id, agent_id=agent_id
+            )
+        with self.lock:
+            self.refresh()
+            agent = self.agents.get(agent_id)
+        if agent:
+            return [agent]
+        agents = self.database_handler.get_agent_from_id(
+            organization_id=self.organization_id, agent_id=agent_id
+        )
+        self.add_agents(agents)
+        return agents
+
+    def get_supervised_agent(self, supervisor_name: str) -> List[Dict[str, Any]]:
+        if not self.enabled():
+            return self.database_handler.get_supervised_agent(
+                organization_id=self.organization_id, supervisor_name=supervisor_name
+            )
+        with self.lock:
+            self.refresh()
+            return [
+                agent
+                for agent in self.agents.values()
+                if agent.get("supervisor_name") == supervisor_name
+            ]
+
+    def refresh(self) -> None:
+        """Reload the agents if the copy expired, must be called with the lock"""
+
+        if not self.subscribed:
+            self.database_handler.subscribe_to_channel(
+                schema="public",
+                table_name="agents",
+                event_type="*",
+                callback=self.apply_change,
+                filter=f"organization_id=eq.{self.organization_id}",
+            )
+            self.database_handler.start_realtime_listener()
+            self.subscribed = True
+        now = time.time()
+        if self.loaded_time is not None and now - self.loaded_time < self.ttl:
+            return
+        agents = self.database_handler.get_all_agents(
+            organization_id=self.organization_id
+        )
+        self.agents = {agent["id"]: agent for agent in agents}
+        self.loaded_time = now
+
+    def add_agents(self, agents: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            for agent in agents:
+                self.agents[agent["id"]] = agent
+
+    def apply_change(self, payload: Dict[str, Any]) -> None:
+        """Apply a realtime change of the agents table"""
+
+        if payload.get("type") == "DELETE":
+            old_record = payload.get("old_record") or {}
+            with self.lock:
+                self.agents.pop(old_record.get("id"), None)
+            return
+        record = payload.get("record") or {}
+        if record.get("organization_id") == self.organization_id:
+            self.add_agents([record])
@@ -0,0 +1,211 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+from realtime.types import Callback
+
+from newrail.config.config import Config
+
+
+class DatabaseHandler(ABC):
+    """
+    Database of the organizations, their teams, agents and capabilities, and of the
+    tasks, events and notifications exchanged by the agents.
+
+    Besides the queries, a handler delivers the changes of the tables to the subscribed
+    callbacks with the payloads of Supabase realtime, e.g: {"type": "INSERT", "record"}.
+    """
+
+    @abstractmethod
+    def subscribe_to_channel(
+        self,
+        schema: str,
+        table_name: str,
+        event_type: str,
+        callback: Callback,
+        filter: Optional[str] = None,
+    ) -> str:
+        """Subscribe to the changes of a table, filtered if given, e.g: agent_id=eq.1234"""
+
+    @abstractmethod
+    def unsubscribe_from_channel(self, topic: str):
+        pass
+
+    @abstractmethod
+    def start_realtime_listener(self):
+        pass
+
+    @abstractmethod
+    def upsert_rows(
+        self,
+        table_name: str,
+        rows: List[Dict[str, Any]],
+        on_conflict: str,
+        ignore_duplicates: bool = False,
+    ):
+        """Insert the rows or update the ones that conflict, with a single request.
+
+        Args:
+            table_name (str): The table to write.
+            rows (List[Dict[str, Any]]): The rows, all of them with the same columns.
+            on_conflict (str): Columns of the unique constraint, e.g: organization_id,name.
+            ignore_duplicates (bool): Keep the existing rows instead of updating them.
+        """
+
+    @abstractmethod
+    def insert_rows(self, table_name: str, rows: List[Dict[str, Any]]):
+        """Insert several rows with a single request.
+
+        Rows with their own id are upserted ignoring duplicates, so a batch sent again
+        after a failure doesn't conflict with the rows that were already inserted.
+        """
+
+    def create_agent(self, **data):
+        self.create_agents(rows=[data])
+
+    def create_agents(self, rows: List[Dict[str, Any]]):
+        self.upsert_rows("agents", rows, on_conflict="organization_id,name")
+
+    def create_team(self, **data):
+        self.create_teams(rows=[data])
+
+    def create_teams(self, rows: List[Dict[str, Any]]):
+        self.upsert_rows("teams", rows, on_conflict="id")
+
+    def create_organization(self, **data):
+        self.upsert_rows("organizations", [data], on_conflict="id")
+
+    def create_user(self, **data):
+        self.upsert_rows("users", [data], on_conflict="id")
+
+    def create_capability(self, **data):
+        self.create_capabilities(rows=[data])
+
+    def create_capabilities(self, rows: List[Dict[str, Any]]):
+        """Create the capabilities, keeping the id of the ones that already exist"""
+
+        self.upsert_rows(
+            "capabilities",
+            rows,
+            on_conflict="organization_id,name",
+            ignore_duplicates=True,
+        )
+
+    def link_capability(self, **data):
+        self.link_capabilities(rows=[data])
+
+    def link_capabilities(self, rows: List[Dict[str, Any]]):
+        self.upsert_rows(
+            "agent_capabilities",
+            rows,
+            on_conflict="agent_id,capability_id",
+            ignore_duplicates=True,
+        )
+
+    @abstractmethod
+    def create_task(self, **data):
+        pass
+
+    @abstractmethod
+    def create_team_invocations(self, **data):
+        pass
+
+    @abstractmethod
+    def delete_team_invocations(self, team_invocations_id: str):
+        pass
+
+    @abstractmethod
+    def get_capabilities(self, organization_id) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_all_agents(self, organization_id) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_agent(self, organization_id, agent_name) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_agent_from_id(self, organization_id, agent_id) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_agent_capabilities(
+        self, organization_id, agent_name, team_name
+    ) -> List[Dict[str, Any]]:
+        """Get the agents with their capabilities, e.g: {"capabilities": [{"name": ""}]}"""
+
+    @abstractmethod
+    def get_supervised_agent(
+        self, organization_id, supervisor_name
+    ) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_team(self, organization_id, team_name) -> List[Dict[str, Any]]:
+        """Get the teams with their invocations, e.g: {"team_invocations": [{}]}"""
+
+    @abstractmethod
+    def get_team_from_id(self, organization_id, team_id) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_team_invocations(
+        self, organization_id, team_name
+    ) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_organization(self, organization_id) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_tasks(self, organization_id, agent_id) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_user_from_id(self, user_id) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def send_notification(self, **data):
+        pass
+
+    @abstractmethod
+    def send_event(self, **data):
+        pass
+
+    @abstractmethod
+    def update_agent(self, **agent_data):
+        pass
+
+    @abstractmethod
+    def update_agents(self, changes: Dict[str, Any], agent_ids: List[str]):
+        """Apply the same changes to several agents with a single request"""
+
+    @abstractmethod
+    def update_team_invocations(self, team_invocations_id: str, status: str):
+        pass
+
+    @abstractmethod
+    def update_task(self, task_id: str, status: str):
+        pass
+
+
+def create_database_handler() -> DatabaseHandler:
+    """Create the handler of the configured database backend"""
+
+    backend = Config().database_backend
+    if backend == "supabase":
+        from newrail.agent.communication.database_handler.supabase_handler import (
+            SupabaseHandler,
+        )
+
+        return SupabaseHandler()
+    if backend == "sqlite":
+        from newrail.agent.communication.database_handler.sqlite_handler import (
+            SQLiteHandler,
+        )
+
+        return SQLiteHandler(file_path=Config().sqlite_database_path)
+    raise ValueError(f"Unknown database backend: {backend}")
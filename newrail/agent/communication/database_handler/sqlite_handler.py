@@ -0,0 +1,547 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import uuid
+
+from realtime.types import Callback
+
+from newrail.agent.communication.database_handler.database_handler import (
+    DatabaseHandler,
+)
+from newrail.config.config import Config
+
+
+# Columns of each table, the missing ones are read as None like in the remote database.
+TABLE_COLUMNS: Dict[str, List[str]] = {
+    "agents": [
+        "id",
+        "name",
+        "organization_id",
+        "created_by_user_id",
+        "mission",
+        "stage",
+        "status",
+        "team_id",
+        "team_name",
+        "is_lead",
+        "supervisor_id",
+        "supervisor_name",
+    ],
+    "teams": [
+        "id",
+        "name",
+        "created_by_user_id",
+        "mission",
+        "organization_id",
+        "organization_name",
+        "lead_agent_id",
+        "lead_agent_name",
+        "supervisor_id",
+        "supervisor_name",
+        "status",
+    ],
+    "organizations": ["id", "name"],
+    "users": ["id"],
+    "capabilities": ["id", "name", "organization_id"],
+    "agent_capabilities": ["id", "agent_id", "capability_id", "organization_id"],
+    "team_invocations": [
+        "id",
+        "invoked_at",
+        "invoked_by_user_id",
+        "team_id",
+        "team_name",
+        "num_iterations",
+        "organization_id",
+        "organization_name",
+        "status",
+    ],
+    "tasks": [
+        "id",
+        "organization_id",
+        "agent_id",
+        "title",
+        "description",
+        "status",
+    ],
+    "agent_incoming_events": [
+        "id",
+        "agent_id",
+        "created_at",
+        "data",
+        "request_type",
+        "organization_id",
+        "team_id",
+    ],
+    "agent_notifications": [
+        "id",
+        "agent_id",
+        "created_at",
+        "data",
+        "event_type",
+        "organization_id",
+        "team_id",
+    ],
+}
+
+
+def connect(file_path: str) -> sqlite3.Connection:
+    """Open the database, creating its tables and the change log if needed"""
+
+    os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+    # Transactions are explicit, see SQLiteHandler.transaction.
+    connection = sqlite3.connect(
+        file_path, timeout=30, isolation_level=None, check_same_thread=False
+    )
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    for table_name in TABLE_COLUMNS:
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS "{table_name}" '
+            "(id TEXT PRIMARY KEY, data TEXT NOT NULL)"
+        )
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS realtime_changes (seq INTEGER PRIMARY KEY "
+        "AUTOINCREMENT, created_at REAL NOT NULL, table_name TEXT NOT NULL, "
+        "type TEXT NOT NULL, record TEXT, old_record TEXT)"
+    )
+    return connection
+
+
+def to_row(table_name: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    return {**dict.fromkeys(TABLE_COLUMNS[table_name]), **data}
+
+
+class Subscription:
+    def __init__(
+        self,
+        topic: str,
+        table_name: str,
+        event_type: str,
+        callback: Callback,
+        filter: Optional[Tuple[str, str]],
+    ):
+        self.topic = topic
+        self.table_name = table_name
+        self.event_type = event_type
+        self.callback = callback
+        self.filter = filter
+
+    def matches(self, table_name: str, event_type: str, row: Dict[str, Any]) -> bool:
+        if table_name != self.table_name:
+            return False
+        if self.event_type not in ("*", event_type):
+            return False
+        if self.filter:
+            column, value = self.filter
+            return str(row.get(column)) == value
+        return True
+
+
+class SQLiteChangeFeed:
+    """
+    Emulates Supabase realtime for a sqlite database.
+
+    A background thread reads the change log of the database and calls the callbacks
+    subscribed to the table, event type and filter of each change. Writes of this
+    process wake it up immediately, the ones of other processes are read every poll
+    interval.
+    """
+
+    CHANGES_RETENTION = 3600.0
+    PRUNE_INTERVAL = 60.0
+
+    _instances: Dict[str, "SQLiteChangeFeed"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, file_path: str, poll_interval: float):
+        self.connection = connect(file_path)
+        self.poll_interval = poll_interval
+        self.lock = threading.RLock()
+        self.subscriptions: List[Subscription] = []
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.last_prune_time = 0.0
+        # Only the changes after the creation of the feed are delivered.
+        self.last_seq = self.connection.execute(
+            "SELECT COALESCE(MAX(seq), 0) FROM realtime_changes"
+        ).fetchone()[0]
+
+    @classmethod
+    def get_instance(
+        cls, file_path: str, poll_interval: float = Config().sqlite_poll_interval
+    ) -> "SQLiteChangeFeed":
+        """Get the feed of the database shared by all the handlers of the process"""
+
+        file_path = os.path.abspath(file_path)
+        with cls._instances_lock:
+            if file_path not in cls._instances:
+                cls._instances[file_path] = cls(
+                    file_path=file_path, poll_interval=poll_interval
+                )
+            return cls._instances[file_path]
+
+    def subscribe(
+        self,
+        topic: str,
+        table_name: str,
+        event_type: str,
+        callback: Callback,
+        filter: Optional[str] = None,
+    ) -> None:
+        parsed_filter = None
+        if filter:
+            column, condition = filter.split("=", 1)
+            operator, value = condition.split(".", 1)
+            if operator != "eq":
+                raise ValueError(f"Only eq filters are supported: {filter}")
+            parsed_filter = (column, value)
+        with self.lock:
+            self.subscriptions.append(
+                Subscription(
+                    topic=topic,
+                    table_name=table_name,
+                    event_type=event_type,
+                    callback=callback,
+                    filter=parsed_filter,
+                )
+            )
+
+    def unsubscribe(self, topic: str) -> None:
+        with self.lock:
+            self.subscriptions = [
+                subscription
+                for subscription in self.subscriptions
+                if subscription.topic != topic
+            ]
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread:
+                return
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def notify(self) -> None:
+        self.wakeup.set()
+
+    def run(self) -> None:
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            try:
+                self.poll()
+            except sqlite3.Error as e:
+                print(f"Failed to read the changes of the database: {e}")
+
+    def poll(self) -> None:
+        """Deliver the changes written since the last poll"""
+
+        with self.lock:
+            changes = self.connection.execute(
+                "SELECT seq, created_at, table_name, type, record, old_record "
+                "FROM realtime_changes WHERE seq > ? ORDER BY seq",
+                (self.last_seq,),
+            ).fetchall()
+            if changes:
+                self.last_seq = changes[-1][0]
+            self.prune()
+        for _, created_at, table_name, event_type, record, old_record in changes:
+            payload = {
+                "schema": "public",
+                "table": table_name,
+                "type": event_type,
+                "commit_timestamp": datetime.fromtimestamp(
+                    created_at, tz=timezone.utc
+                ).isoformat(),
+            }
+            if record:
+                payload["record"] = to_row(table_name, json.loads(record))
+            if old_record:
+                payload["old_record"] = to_row(table_name, json.loads(old_record))
+            self.dispatch(payload=payload)
+
+    def dispatch(self, payload: Dict[str, Any]) -> None:
+        row = payload.get("record") or payload.get("old_record") or {}
+        with self.lock:
+            subscriptions = [
+                subscription
+                for subscription in self.subscriptions
+                if subscription.matches(payload["table"], payload["type"], row)
+            ]
+        for subscription in subscriptions:
+            try:
+                subscription.callback(payload)
+            except Exception as e:
+                print(f"Failed to handle the change of {payload['table']}: {e}")
+
+    def prune(self) -> None:
+        now = time.time()
+        if now - self.last_prune_time < self.PRUNE_INTERVAL:
+            return
+        self.last_prune_time = now
+        self.connection.execute(
+            "DELETE FROM realtime_changes WHERE created_at < ?",
+            (now - self.CHANGES_RETENTION,),
+        )
+
+
+class SQLiteHandler(DatabaseHandler):
+    """
+    Local database in a sqlite file, to run the organizations offline.
+
+    Rows are stored by id as JSON documents. Each write is appended to a change log in
+    the same transaction, SQLiteChangeFeed reads it to call the subscribed callbacks,
+    also for the writes of other processes using the same file.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        poll_interval: float = Config().sqlite_poll_interval,
+    ):
+        self.file_path = file_path
+        self.connection = connect(file_path)
+        self.lock = threading.RLock()
+        self.feed = SQLiteChangeFeed.get_instance(
+            file_path=file_path, poll_interval=poll_interval
+        )
+
+    def subscribe_to_channel(
+        self,
+        schema: str,
+        table_name: str,
+        event_type: str,
+        callback: Callback,
+        filter: Optional[str] = None,
+    ) -> str:
+        topic = f"realtime:{schema}:{table_name}"
+        if filter:
+            topic = f"{topic}:{filter}"
+        self.feed.subscribe(
+            topic=topic,
+            table_name=table_name,
+            event_type=event_type,
+            callback=callback,
+            filter=filter,
+        )
+        return topic
+
+    def unsubscribe_from_channel(self, topic: str):
+        self.feed.unsubscribe(topic=topic)
+
+    def start_realtime_listener(self):
+        self.feed.start()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+        self.feed.notify()
+
+    def select(self, table_name: str, **filters) -> List[Dict[str, Any]]:
+        """Get the rows whose columns are equal to the filters, in insertion order"""
+
+        conditions = []
+        values = []
+        for column, value in filters.items():
+            if column not in TABLE_COLUMNS[table_name]:
+                raise ValueError(f"Unknown column of {table_name}: {column}")
+            if column == "id":
+                conditions.append("id = ?")
+            else:
+                conditions.append(f"json_extract(data, '$.{column}') = ?")
+            values.append(value)
+        query = f'SELECT data FROM "{table_name}"'
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self.lock:
+            rows = self.connection.execute(f"{query} ORDER BY rowid", values)
+            return [to_row(table_name, json.loads(data)) for (data,) in rows]
+
+    def insert(self, table_name: str, row: Dict[str, Any]) -> None:
+        """Insert a row, within a transaction"""
+
+        row = dict(row)
+        row.setdefault("id", str(uuid.uuid4()))
+        self.connection.execute(
+            f'INSERT INTO "{table_name}" (id, data) VALUES (?, ?)',
+            (row["id"], json.dumps(row)),
+        )
+        self.log_change(table_name=table_name, event_type="INSERT", record=row)
+
+    def update(self, table_name: str, changes: Dict[str, Any], **filters) -> None:
+        """Update the rows that match the filters, within a transaction"""
+
+        for old_row in self.select(table_name, **filters):
+            row = {
+                key: value for key, value in old_row.items() if value is not None
+            }
+            row.update(changes)
+            self.connection.execute(
+                f'UPDATE "{table_name}" SET id = ?, data = ? WHERE id = ?',
+                (row["id"], json.dumps(row), old_row["id"]),
+            )
+            self.log_change(
+                table_name=table_name,
+                event_type="UPDATE",
+                record=row,
+                old_record=old_row,
+            )
+
+    def delete(self, table_name: str, **filters) -> None:
+        """Delete the rows that match the filters, within a transaction"""
+
+        for old_row in self.select(table_name, **filters):
+            self.connection.execute(
+                f'DELETE FROM "{table_name}" WHERE id = ?', (old_row["id"],)
+            )
+            self.log_change(
+                table_name=table_name, event_type="DELETE", old_record=old_row
+            )
+
+    def log_change(
+        self,
+        table_name: str,
+        event_type: str,
+        record: Optional[Dict[str, Any]] = None,
+        old_record: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.connection.execute(
+            "INSERT INTO realtime_changes (created_at, table_name, type, record, "
+            "old_record) VALUES (?, ?, ?, ?, ?)",
+            (
+                time.time(),
+                table_name,
+                event_type,
+                json.dumps(record) if record else None,
+                json.dumps(old_record) if old_record else None,
+            ),
+        )
+
+    def upsert_rows(
+        self,
+        table_name: str,
+        rows: List[Dict[str, Any]],
+        on_conflict: str,
+        ignore_duplicates: bool = False,
+    ):
+        columns = on_conflict.split(",")
+        with self.transaction():
+            for row in rows:
+                key = {column: row.get(column) for column in columns}
+                if not self.select(table_name, **key):
+                    self.insert(table_name=table_name, row=row)
+                elif not ignore_duplicates:
+                    self.update(table_name, row, **key)
+
+    def insert_rows(self, table_name: str, rows: List[Dict[str, Any]]):
+        with self.transaction():
+            for row in rows:
+                if "id" in row and self.select(table_name, id=row["id"]):
+                    continue
+                self.insert(table_name=table_name, row=row)
+
+    def create_task(self, **data):
+        self.insert_rows("tasks", [data])
+
+    def create_team_invocations(self, **data):
+        self.insert_rows("team_invocations", [data])
+
+    def delete_team_invocations(self, team_invocations_id: str):
+        with self.transaction():
+            self.delete("team_invocations", id=team_invocations_id)
+
+    def get_capabilities(self, organization_id):
+        return self.select("capabilities", organization_id=organization_id)
+
+    def get_all_agents(self, organization_id):
+        return self.select("agents", organization_id=organization_id)
+
+    def get_agent(self, organization_id, agent_name):
+        return self.select("agents", organization_id=organization_id, name=agent_name)
+
+    def get_agent_from_id(self, organization_id, agent_id):
+        return self.select("agents", organization_id=organization_id, id=agent_id)
+
+    def get_agent_capabilities(self, organization_id, agent_name, team_name):
+        agents = self.select(
+            "agents",
+            organization_id=organization_id,
+            name=agent_name,
+            team_name=team_name,
+        )
+        for agent in agents:
+            agent["capabilities"] = [
+                {"name": capability["name"]}
+                for link in self.select("agent_capabilities", agent_id=agent["id"])
+                for capability in self.select("capabilities", id=link["capability_id"])
+            ]
+        return agents
+
+    def get_supervised_agent(
+        self,
+        organization_id,
+        supervisor_name,
+    ):
+        return self.select(
+            "agents", organization_id=organization_id, supervisor_name=supervisor_name
+        )
+
+    def get_team(self, organization_id, team_name):
+        teams = self.select("teams", organization_id=organization_id, name=team_name)
+        for team in teams:
+            team["team_invocations"] = self.select(
+                "team_invocations", team_id=team["id"]
+            )
+        return teams
+
+    def get_team_from_id(self, organization_id, team_id):
+        return self.select("teams", organization_id=organization_id, id=team_id)
+
+    def get_team_invocations(self, organization_id, team_name):
+        return self.select(
+            "team_invocations", organization_id=organization_id, team_name=team_name
+        )
+
+    def get_organization(self, organization_id):
+        return self.select("organizations", id=organization_id)
+
+    def get_tasks(self, organization_id, agent_id):
+        return self.select("tasks", organization_id=organization_id, agent_id=agent_id)
+
+    def get_user_from_id(self, user_id):
+        return self.select("users", id=user_id)
+
+    def send_notification(self, **data):
+        self.insert_rows("agent_notifications", [data])
+
+    def send_event(self, **data):
+        self.insert_rows("agent_incoming_events", [data])
+
+    def update_agent(self, **agent_data):
+        with self.transaction():
+            self.update("agents", agent_data, id=agent_data["id"])
+
+    def update_agents(self, changes: Dict[str, Any], agent_ids: List[str]):
+        with self.transaction():
+            for agent_id in agent_ids:
+                self.update("agents", changes, id=agent_id)
+
+    def update_team_invocations(self, team_invocations_id: str, status: str):
+        with self.transaction():
+            self.update("team_invocations", {"status": status}, id=team_invocations_id)
+
+    def update_task(self, task_id: str, status: str):
+        with self.transaction():
+            self.update("tasks", {"status": status}, id=task_id)
@@ -1,6 +1,7 @@
 import asyncio
+import json
 import threading
-from typing import Optional
+from typing import Any, Dict, Optional
 from typing import List
 
 from supabase.client import create_client
@@ -8,6 +9,9 @@ from supabase.lib.client_options import ClientOptions
 from realtime.connection import Socket
 from realtime.types import Callback
 
+from newrail.agent.communication.database_handler.database_handler import (
+    DatabaseHandler,
+)
 from newrail.config.config import Config
 
 
@@ -18,7 +22,7 @@ class Channel:
         self.callback = callback
 
 
-class SupabaseHandler:
+class SupabaseHandler(DatabaseHandler):
     def __init__(self):
         self.supabase_url = Config().supabase_url
         self.supabase_key = Config().supabase_key
@@ -31,102 +35,91 @@ class SupabaseHandler:
         )
         self.channels: List[Channel] = []
         self.listen_task: Optional[threading.Thread] = None
+        # Channels can be joined and left while listening, from the listener loop.
+        self.socket: Optional[Socket] = None
+        self.listen_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.realtime_lock = threading.RLock()
 
     def subscribe_to_channel(
-        self, schema: str, table_name: str, event_type: str, callback: Callback
-    ):
-        self.channels.append(
-            Channel(
-                topic=f"realtime:{schema}:{table_name}",
-                event_type=event_type,
-                callback=callback,
-            )
+        self,
+        schema: str,
+        table_name: str,
+        event_type: str,
+        callback: Callback,
+        filter: Optional[str] = None,
+    ) -> str:
+        topic = f"realtime:{schema}:{table_name}"
+        if filter:
+            topic = f"{topic}:{filter}"
+        channel = Channel(topic=topic, event_type=event_type, callback=callback)
+        with self.realtime_lock:
+            self.channels.append(channel)
+            loop = self.listen_loop
+        if loop:
+            asyncio.run_coroutine_threadsafe(self.join_channel(channel), loop)
+        return topic
+
+    def unsubscribe_from_channel(self, topic: str):
+        with self.realtime_lock:
+            self.channels = [
+                channel for channel in self.channels if channel.topic != topic
+            ]
+            loop = self.listen_loop
+        if loop:
+            asyncio.run_coroutine_threadsafe(self.leave_channel(topic), loop)
+
+    async def join_channel(self, channel: Channel):
+        self.socket.set_channel(topic=channel.topic).on(
+            channel.event_type, channel.callback
+        )
+        await self.socket.channels[channel.topic][-1]._join()
+
+    async def leave_channel(self, topic: str):
+        self.socket.channels.pop(topic, None)
+        await self.socket.ws_connection.send(
+            json.dumps(dict(topic=topic, event="phx_leave", payload={}, ref=None))
         )
 
     def start_listen_task(self):
         new_loop = asyncio.new_event_loop()
         asyncio.set_event_loop(new_loop)
-        self.socket = Socket(url=self.realtime_url)
-        self.socket.connect()
-        for channel in self.channels:
-            self.socket.set_channel(topic=channel.topic).join().on(
-                channel.event_type, channel.callback
-            )
-        new_loop.run_until_complete(self.socket.listen())
+        socket = Socket(url=self.realtime_url, auto_reconnect=True)
+        socket.connect()
+        with self.realtime_lock:
+            self.socket = socket
+            self.listen_loop = new_loop
+            channels = list(self.channels)
+        for channel in channels:
+            new_loop.run_until_complete(self.join_channel(channel))
+        new_loop.run_until_complete(
+            asyncio.gather(socket._listen(), socket._keep_alive())
+        )
         new_loop.close()
 
     def start_realtime_listener(self):
-        if not self.listen_task:
-            self.listen_task = threading.Thread(target=self.start_listen_task)
-            self.listen_task.start()
-
-    def create_agent(self, **data):
-        existing_agent = (
-            self.public_client.table("agents")
-            .select("*")
-            .eq("name", data["name"])
-            .eq("organization_id", data["organization_id"])
-            .execute()
-        )
-        if existing_agent:
-            self.update_agent(**data)
-        else:
-            self.public_client.table("agents").insert([data]).execute()
-
-    def create_team(self, **data):
-        existing_team = (
-            self.public_client.table("teams").select("*").eq("id", data["id"]).execute()
-        )
-        if existing_team:
-            self.public_client.table("teams").update(data).eq(
-                "id", data["id"]
-            ).execute()
-        else:
-            self.public_client.table("teams").insert([data]).execute()
-
-    def create_organization(self, **data):
-        existing_org = (
-            self.public_client.table("organizations")
-            .select("*")
-            .eq("id", data["id"])
-            .execute()
-        )
-        if existing_org:
-            self.public_client.table("organizations").update(data).eq(
-                "id", data["id"]
-            ).execute()
-        else:
-            self.public_client.table("organizations").insert([data]).execute()
-
-    def create_user(self, **data):
-        existing_user = (
-            self.public_client.table("users").select("*").eq("id", data["id"]).execute()
-        )
-        if existing_user:
-            self.public_client.table("users").update(data).eq(
-                "id", data["id"]
-            ).execute()
-        else:
-            self.public_client.table("users").insert([data]).execute()
+        with self.realtime_lock:
+            if not self.listen_task:
+                self.listen_task = threading.Thread(
+                    target=self.start_listen_task, daemon=True
+                )
+                self.listen_task.start()
+
+    def upsert_rows(
+        self,
+        table_name: str,
+        rows: List[Dict[str, Any]],
+        on_conflict: str,
+        ignore_duplicates: bool = False,
+    ):
+        if not rows:
+            return
+        self.public_client.table(table_name).upsert(
+            rows, on_conflict=on_conflict, ignore_duplicates=ignore_duplicates
+        ).execute()
 
     def create_task(self, **data):
         self.public_client.table("tasks").insert([data]).execute()
 
-    def create_capability(self, **data):
-        existing_capability = (
-            self.public_client.table("capabilities")
-            .select("*")
-            .eq("id", data["id"])
-            .eq("organization_id", data["organization_id"])
-            .execute()
-        )
-        if existing_capability:
-            self.public_client.table("capabilities").update(data).eq(
-                "id", data["id"]
-            ).execute()
-        else:
-            self.public_client.table("capabilities").insert([data]).execute()
-
     def create_team_invocations(self, **data):
         self.public_client.table("team_invocations").insert([data]).execute()
 
@@ -135,26 +128,13 @@ class SupabaseHandler:
             "id", team_invocations_id
         ).execute()
 
-    def link_capability(self, **data):
-        same_capability = (
-            self.public_client.table("agent_capabilities")
-            .select("*")
-            .eq("agent_id", data["agent_id"])
-            .eq("capability_id", data["capability_id"])
-            .eq("organization_id", data["organization_id"])
-            .execute()
-        )
-        if same_capability:
-            print("Capability already linked")
-        else:
-            self.public_client.table("agent_capabilities").insert([data]).execute()
-
     def get_capabilities(self, organization_id):
         return (
             self.public_client.table("capabilities")
             .select("*")
             .eq("organization_id", organization_id)
             .execute()
+            .data
         )
 
     def get_all_agents(self, organization_id):
@@ -163,6 +143,7 @@ class SupabaseHandler:
             .select("*")
             .eq("organization_id", organization_id)
             .execute()
+            .data
         )
 
     def get_agent(self, organization_id, agent_name):
@@ -271,11 +252,23 @@ class SupabaseHandler:
     def send_event(self, **data):
         self.public_client.table("agent_incoming_events").insert([data]).execute()
 
+    def insert_rows(self, table_name: str, rows: List[Dict[str, Any]]):
+        table = self.public_client.table(table_name)
+        if all("id" in row for row in rows):
+            table.upsert(rows, ignore_duplicates=True).execute()
+        else:
+            table.insert(rows).execute()
+
     def update_agent(self, **agent_data):
         self.public_client.table("agents").update(agent_data).eq(
             "id", agent_data["id"]
         ).execute()
 
+    def update_agents(self, changes: Dict[str, Any], agent_ids: List[str]):
+        self.public_client.table("agents").update(changes).in_(
+            "id", agent_ids
+        ).execute()
+
     def update_team_invocations(self, team_invocations_id: str, status: str):
         self.public_client.table("team_invocations").update({"status": status}).eq(
             "id", team_invocations_id
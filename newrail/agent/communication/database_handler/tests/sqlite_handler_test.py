@@ -0,0 +1,92 @@
+import os
+import tempfile
+import time
+import unittest
+
+from newrail.agent.communication.database_handler.sqlite_handler import (
+    SQLiteChangeFeed,
+    SQLiteHandler,
+)
+
+
+class TestSQLiteHandler(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.tmp_dir.name, "newrail.db")
+        self.handler = SQLiteHandler(file_path=self.file_path, poll_interval=60)
+
+    def tearDown(self):
+        SQLiteChangeFeed._instances.clear()
+        self.tmp_dir.cleanup()
+
+    def test_upserts_and_joins(self):
+        self.handler.create_capabilities(
+            rows=[
+                {"id": "capability-1", "name": "coordination", "organization_id": "o"},
+                {"id": "capability-2", "name": "edit_file", "organization_id": "o"},
+            ]
+        )
+        # Existing capabilities keep their id.
+        self.handler.create_capability(
+            id="capability-3", name="coordination", organization_id="o"
+        )
+        capabilities = self.handler.get_capabilities(organization_id="o")
+        self.assertEqual(
+            [capability["id"] for capability in capabilities],
+            ["capability-1", "capability-2"],
+        )
+
+        self.handler.create_agents(
+            rows=[
+                {"id": "agent-1", "name": "lead", "organization_id": "o"},
+                {"id": "agent-2", "name": "worker", "organization_id": "o"},
+            ]
+        )
+        self.handler.create_agent(
+            id="agent-2", name="worker", organization_id="o", team_name="team"
+        )
+        self.handler.link_capabilities(
+            rows=[
+                {"agent_id": "agent-2", "capability_id": "capability-2"},
+                {"agent_id": "agent-2", "capability_id": "capability-2"},
+            ]
+        )
+        agents = self.handler.get_agent_capabilities(
+            organization_id="o", agent_name="worker", team_name="team"
+        )
+        self.assertEqual(len(agents), 1)
+        self.assertEqual(agents[0]["capabilities"], [{"name": "edit_file"}])
+        self.assertIsNone(agents[0]["supervisor_name"])
+
+        self.handler.update_agents(changes={"status": "ACTIVE"}, agent_ids=["agent-1"])
+        self.assertEqual(
+            self.handler.get_agent(organization_id="o", agent_name="lead")[0]["status"],
+            "ACTIVE",
+        )
+
+    def test_change_feed_delivers_filtered_inserts(self):
+        received = []
+        self.handler.subscribe_to_channel(
+            schema="public",
+            table_name="tasks",
+            event_type="INSERT",
+            callback=received.append,
+            filter="agent_id=eq.agent-1",
+        )
+        self.handler.start_realtime_listener()
+        # Writes of another handler of the same database.
+        other_handler = SQLiteHandler(file_path=self.file_path, poll_interval=60)
+        other_handler.create_task(id="task-1", agent_id="agent-2", title="Other")
+        other_handler.create_task(id="task-2", agent_id="agent-1", title="Mine")
+        other_handler.update_task(task_id="task-2", status="DONE")
+        deadline = time.time() + 5
+        while not received and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(received), 1)
+        self.assertEqual(received[0]["type"], "INSERT")
+        self.assertEqual(received[0]["record"]["id"], "task-2")
+        self.assertIsNone(received[0]["record"]["status"])
+
+
+if __name__ == "__main__":
+    unittest.main()
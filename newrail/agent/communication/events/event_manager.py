@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
 from queue import Queue
 
 from newrail.agent.communication.broker.broker import Broker
@@ -20,12 +20,15 @@ class EventManager(object):
         self.supervisor_name = supervisor_name
         self.received_events: Queue[Event] = Queue()
         self.received_tasks: Queue[Task] = Queue()
+        # Called every time an event or a task is received.
+        self.listeners: List[Callable[[], None]] = []
         # Connect to channel agent_incoming_events to get the events for the agent.
         self.subscribe_to_channels()
 
     def add_event(self, event_type: str, event_content: str) -> None:
         event = Event(type=event_type, content=event_content)
         self.received_events.put(event)
+        self.notify_listeners()
 
     def add_task(self, id: str, title: str, description: str, status: str) -> None:
         self.received_tasks.put(
@@ -36,6 +39,20 @@ class EventManager(object):
                 status=status,
             )
         )
+        self.notify_listeners()
+
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def notify_listeners(self) -> None:
+        """Notify that an event or a task was received"""
+
+        for listener in list(self.listeners):
+            listener()
 
     def get_supervisor_name(self) -> Optional[str]:
         """Return supervisor name"""
@@ -81,6 +98,7 @@ class EventManager(object):
                     content=f"Agent name: {sender_name}. Message: {message}",
                 )
                 self.received_events.put(new_event)
+                self.notify_listeners()
             # TODO: Finish the implementation when adding user table.
             elif data["request_type"] == "message_from_user":
                 # TODO: Enable this when user table is added.
@@ -94,6 +112,7 @@ class EventManager(object):
                     content=f"User with email: {fake_user_email}. Message: {message}",
                 )
                 self.received_events.put(new_event)
+                self.notify_listeners()
 
     def subscribe_to_channels(self):
         self.broker.subscribe_to_channel(
@@ -2,11 +2,12 @@ import json
 import os
 import shutil
 from threading import RLock
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set
 
 from newrail.agent.config.stage import Stage
 from newrail.agent.config.status import Status
 from newrail.utils.storage import get_org_folder
+from newrail.utils.unit_of_work import UnitOfWork
 
 
 class AgentConfig(object):
@@ -43,6 +44,11 @@ class AgentConfig(object):
         self.status = status
         self._stage_lock = RLock()
         self._status_lock = RLock()
+        # Fields changed since they were synced to the database.
+        self._changes_lock = RLock()
+        self._changed_fields: Set[str] = set()
+        # Called with the new status every time it changes.
+        self._status_listeners: List[Callable[[Status], None]] = []
         self.save()
 
     def get_stage(self) -> Stage:
@@ -51,6 +57,8 @@ class AgentConfig(object):
 
     def set_stage(self, stage: Stage) -> None:
         with self._stage_lock:
+            if stage != self.stage:
+                self.mark_changed("stage")
             self.stage = stage
             self.save()
 
@@ -60,8 +68,48 @@ class AgentConfig(object):
 
     def set_status(self, status: Status) -> None:
         with self._status_lock:
+            changed = status != self.status
+            if changed:
+                self.mark_changed("status")
             self.status = status
             self.save()
+        if changed:
+            for listener in list(self._status_listeners):
+                listener(status)
+
+    def apply_state(self, stage: Stage, status: Status) -> None:
+        """Apply the state of the agent running in another process, which already saved and synced it"""
+
+        with self._stage_lock:
+            self.stage = stage
+        with self._status_lock:
+            changed = status != self.status
+            self.status = status
+        if changed:
+            for listener in list(self._status_listeners):
+                listener(status)
+
+    def add_status_listener(self, listener: Callable[[Status], None]) -> None:
+        with self._status_lock:
+            self._status_listeners.append(listener)
+
+    def remove_status_listener(self, listener: Callable[[Status], None]) -> None:
+        with self._status_lock:
+            if listener in self._status_listeners:
+                self._status_listeners.remove(listener)
+
+    def mark_changed(self, *fields: str) -> None:
+        with self._changes_lock:
+            self._changed_fields.update(fields)
+
+    def pop_changes(self) -> Dict[str, Any]:
+        """Get the changed fields with their current value and clear them"""
+
+        with self._changes_lock:
+            data = self.to_dict()
+            changes = {field: data[field] for field in self._changed_fields}
+            self._changed_fields.clear()
+            return changes
 
     @classmethod
     def get_config_file_path(cls, agent_folder: str) -> str:
@@ -86,6 +134,8 @@ class AgentConfig(object):
             return None
 
     def save(self) -> None:
+        if UnitOfWork.defer(key=self, write=self.save):
+            return
         config_file = self.get_config_file_path(self.folder)
         os.makedirs(os.path.dirname(config_file), exist_ok=True)
         with open(config_file, "w") as f:
@@ -105,7 +155,9 @@ class AgentConfig(object):
             "is_lead": self.is_lead,
             "name": self.name,
             "mission": self.mission,
+            "capabilities": self.capabilities,
             "organization_id": self.organization_id,
+            "organization_name": self.organization_name,
             "supervisor_id": self.supervisor_id,
             "supervisor_name": self.supervisor_name,
             "team_id": self.team_id,
@@ -28,6 +28,8 @@ class Programmer(Capability):
     Create, improve or execute code and create test. Useful when you need to create or improve code.
     """
 
+    lazy = True
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.docker = DockerRun("python:3-alpine", self.logger)
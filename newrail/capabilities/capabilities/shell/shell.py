@@ -18,6 +18,8 @@ class Shell(Capability):
     Manage the execution of shell commands in the current workspace.
     """
 
+    lazy = True
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.workspace_root = Path(os.path.join(self.org_folder, WORKSPACE))
@@ -27,6 +29,9 @@ class Shell(Capability):
         self.shell.sendline(f"export PWD={self.workspace}")
         self.shell.sendline(f"cd {self.workspace}")
 
+    def close(self):
+        self.shell.close(force=True)
+
     def _update_workspace(self):
         self.shell.sendline("pwd")
         current_path = self.shell.before.strip().splitlines()[-1]
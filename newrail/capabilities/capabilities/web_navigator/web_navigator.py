@@ -15,6 +15,7 @@ from newrail.capabilities.utils.decorators import (
     context_decorator,
 )
 from newrail.config.config import Config
+from newrail.utils.deadline import Deadline
 
 
 import difflib
@@ -44,10 +45,13 @@ class WebNavigator(Capability):
     Web scrape the web, performing actions such as: search relevant links on google, navigating to urls, click buttons or fill forms.
     """
 
+    lazy = True
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.current_text = ""
-        self.loop = asyncio.get_event_loop()
+        # Own loop, the capability can be used from threads without one or from the agents loop.
+        self.loop = asyncio.new_event_loop()
         self.loop.run_until_complete(self.start_browser())
         self.last_buttons: Dict[str, ElementHandle] = {}
         self.last_forms: List[
@@ -150,7 +154,11 @@ class WebNavigator(Capability):
             url (str): The url to navigate to.
         """
 
-        result = await self.page.goto(url, wait_until="load")
+        # A timeout of 0 disables it in playwright, so it is never below 1 ms.
+        Deadline.check_current()
+        result = await self.page.goto(
+            url, wait_until="load", timeout=max(Deadline.get_timeout(30.0) * 1000, 1)
+        )
         if not result:
             return f"Failed to navigate to {url}"
 
@@ -354,6 +362,7 @@ class WebNavigator(Capability):
     def close(self):
         self.loop.run_until_complete(self.browser.close())
         self.loop.run_until_complete(self.playwright.stop())
+        self.loop.close()
 
 
 def main():
@@ -25,6 +25,10 @@ def snake_case(name: str) -> str:
 
 
 class Capability(ABC):
+    # Heavy capabilities, e.g: browsers or containers, are only instantiated when used.
+    # The rest are instantiated to provide their context before they are used.
+    lazy = False
+
     def __init__(
         self,
         name: str,
@@ -139,6 +143,11 @@ class Capability(ABC):
     def set_question(self, question: str) -> None:
         self.last_question = question
 
+    def close(self) -> None:
+        """Release the resources of the capability, e.g: browsers or processes"""
+
+        pass
+
     def get_episode(
         self,
         execution: "Execution",
@@ -153,6 +162,7 @@ class Capability(ABC):
             execution=execution,
             observation=observation,
             should_summarize=should_summarize,
+            question=question,
         )
         # Create meta episode from all the previous episodes.
         meta_episode = self.episode_manager.create_meta_episode(
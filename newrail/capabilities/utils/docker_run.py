@@ -1,7 +1,10 @@
 import docker
 from docker.errors import ImageNotFound
+from requests.exceptions import RequestException
 from typing import TYPE_CHECKING
 
+from newrail.utils.deadline import Deadline
+
 if TYPE_CHECKING:
     from newrail.organization.utils.logger.agent_logger import AgentLogger
 
@@ -45,11 +48,22 @@ class DockerRun(object):
             detach=True,
         )
 
-        container.wait()
-        logs = container.logs().decode("utf-8")
-        container.stop()
-        container.remove()
-        client.close()
+        try:
+            # Bounded by the deadline of the step, a container could never exit.
+            Deadline.check_current()
+            timeout = Deadline.get_timeout()
+            if timeout is not None:
+                # A timeout of 0 is rejected by urllib3.
+                timeout = max(timeout, 0.001)
+            container.wait(timeout=timeout)
+            logs = container.logs().decode("utf-8")
+        except RequestException:
+            Deadline.check_current()
+            raise
+        finally:
+            container.stop()
+            container.remove()
+            client.close()
 
         return logs
 
@@ -53,12 +53,71 @@ class Config(metaclass=Singleton):
         self.team_id = os.getenv("TEAM_ID", "2a560de3-d5c8-4913-8426-28b8b9579d0c")
         self.permanent_storage = get_permanent_storage_path()
         self.organization_data = ""
+        self.process_name = ""  # Set at the worker processes, e.g: worker_0.
         self.organizations_folder = os.path.join(
             self.permanent_storage, "organizations"
         )
+        # DATABASE
+        self.database_backend = os.getenv(
+            "DATABASE_BACKEND", "supabase"
+        )  # supabase or sqlite, a local database to run offline.
+        self.sqlite_database_path = os.getenv(
+            "SQLITE_DATABASE_PATH", os.path.join(self.permanent_storage, "newrail.db")
+        )
+        self.sqlite_poll_interval = float(
+            os.getenv("SQLITE_POLL_INTERVAL", 0.2)
+        )  # Seconds between the reads of the changes written by other processes to the sqlite database.
         self.max_concurrent_agents = int(
             os.getenv("MAX_CONCURRENT_AGENTS", "8")
         )  # Maximum number of agents that can be created in an organization, we can do something more complex based on priorities.
+        self.organization_load_workers = int(
+            os.getenv("ORGANIZATION_LOAD_WORKERS", "8")
+        )  # Number of agents constructed in parallel when loading an organization.
+        self.agent_worker_processes = int(
+            os.getenv("AGENT_WORKER_PROCESSES", "0")
+        )  # Number of processes running the agents, 0 to run them in threads of the main process.
+        self.async_agent_steps = (
+            os.getenv("ASYNC_AGENT_STEPS", "False") == "True"
+        )  # Run the steps of the agents as coroutines on an event loop instead of threads.
+        self.llm_tokens_per_minute = int(
+            os.getenv("LLM_TOKENS_PER_MINUTE", "0")
+        )  # Tokens per minute allowed by the LLM provider, the orchestrator only starts steps that fit in it. 0 to disable.
+        self.fair_team_scheduling = (
+            os.getenv("FAIR_TEAM_SCHEDULING", "False") == "True"
+        )  # Share the execution slots and tokens between teams according to their weights.
+        self.step_timeout = float(
+            os.getenv("STEP_TIMEOUT", "0")
+        )  # Seconds after which the step of an agent is cancelled, 0 to not limit them.
+        self.step_cancel_grace_period = float(
+            os.getenv("STEP_CANCEL_GRACE_PERIOD", "30")
+        )  # Seconds that a cancelled step has to stop before its execution slot is reclaimed.
+        self.agent_hibernation_idle_time = float(
+            os.getenv("AGENT_HIBERNATION_IDLE_TIME", "0")
+        )  # Seconds that an agent waits for events before its memories, capabilities and clients are released, 0 to keep them.
+        self.metrics_port = int(
+            os.getenv("METRICS_PORT", "0")
+        )  # Local port serving the orchestrator metrics as JSON at /metrics, 0 to disable.
+        self.metrics_dump_interval = float(
+            os.getenv("METRICS_DUMP_INTERVAL", "0")
+        )  # Seconds between the dumps of the metrics to metrics.jsonl at the organization folder, 0 to disable.
+        self.orchestrator_checkpoint_interval = float(
+            os.getenv("ORCHESTRATOR_CHECKPOINT_INTERVAL", "30")
+        )  # Seconds between the checkpoints of the orchestrator at the organization folder, resumed on restart. 0 to disable.
+        self.realtime_server_filters = (
+            os.getenv("REALTIME_SERVER_FILTERS", "True") == "True"
+        )  # Filter the realtime inserts by agent at the database, disable if the server doesn't support filters.
+        self.topology_cache_ttl = float(
+            os.getenv("TOPOLOGY_CACHE_TTL", "300")
+        )  # Seconds after which the cached agents of the organization are reloaded, they are also updated by realtime changes. 0 to disable.
+        self.agent_state_sync_interval = float(
+            os.getenv("AGENT_STATE_SYNC_INTERVAL", 0.5)
+        )  # Seconds to batch the agent state changes before syncing them, 0 to sync them immediately.
+        self.outbox_batch_size = int(
+            os.getenv("OUTBOX_BATCH_SIZE", 50)
+        )  # Notifications and events sent with a single insert.
+        self.outbox_flush_interval = float(
+            os.getenv("OUTBOX_FLUSH_INTERVAL", 0.5)
+        )  # Seconds to buffer the notifications and events before inserting them, 0 to insert them immediately.
         # CONFIG
         self.continuous_mode = os.getenv("CONTINUOUS", "False") == "True"
         self.speak_mode = os.getenv("SPEAK_MODE", "False") == "True"
@@ -107,14 +166,41 @@ class Config(metaclass=Singleton):
         self.long_term_memory_backend = os.getenv(
             "LONG_TERM_MEMORY_BACKEND", "weaviate"
         )
+        # Write-behind persistence of the episodes stored in long term memory.
+        self.long_term_memory_write_behind = (
+            os.getenv("LONG_TERM_MEMORY_WRITE_BEHIND", "True") == "True"
+        )
+        self.long_term_memory_batch_size = int(
+            os.getenv("LONG_TERM_MEMORY_BATCH_SIZE", 20)
+        )
+        self.long_term_memory_flush_interval = float(
+            os.getenv("LONG_TERM_MEMORY_FLUSH_INTERVAL", 2.0)
+        )
 
         # MEMORY MANAGEMENT
 
         self.episodes_overlap_tokens = int(os.getenv("EPISODES_OVERLAP_TOKENS", 100))
+        # Drop near-duplicate chunks (SimHash) before summarizing them.
+        self.episodes_dedup = os.getenv("EPISODES_DEDUP", "True") == "True"
+        self.episodes_dedup_max_distance = int(
+            os.getenv("EPISODES_DEDUP_MAX_DISTANCE", 3)
+        )
+        self.episodes_dedup_history = int(os.getenv("EPISODES_DEDUP_HISTORY", 64))
+        # Keep only the most relevant sentences of an observation before summarizing it.
+        self.episodes_extractive_compression = (
+            os.getenv("EPISODES_EXTRACTIVE_COMPRESSION", "False") == "True"
+        )
+        self.episodes_extractive_max_tokens = int(
+            os.getenv("EPISODES_EXTRACTIVE_MAX_TOKENS", 0)
+        )  # 0 to fit the observation in a single chunk.
 
         self.step_episodes_max_tokens = int(os.getenv("STEP_EPISODES_MAX_TOKENS", 400))
         self.goal_episodes_max_tokens = int(os.getenv("GOAL_EPISODES_MAX_TOKENS", 200))
         self.operations_max_tokens = int(os.getenv("OPERATIONS_MAX_TOKENS", 600))
+        # Number of journal entries of the episodic memory before compacting it into a snapshot.
+        self.episodic_memory_snapshot_interval = int(
+            os.getenv("EPISODIC_MEMORY_SNAPSHOT_INTERVAL", 50)
+        )
         # TODO: Deprecate this as we are not using thought buffer anymore
         self.thoughts_max_tokens = int(os.getenv("THOUGHTS_MAX_TOKENS", 700))
         self.thoughts_min_tokens = int(os.getenv("THOUGHTS_MIN_TOKENS", 300))
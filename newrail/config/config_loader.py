@@ -2,13 +2,13 @@ import yaml
 import os
 import time
 import uuid
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from newrail.organization.organization import Organization
 from newrail.organization.organization_config import OrganizationConfig
 from newrail.config.config import Config
-from newrail.agent.communication.database_handler.supabase_handler import (
-    SupabaseHandler,
+from newrail.agent.communication.database_handler.database_handler import (
+    create_database_handler,
 )
 from newrail.capabilities.utils.builder import CapabilityBuilder
 
@@ -23,7 +23,7 @@ class ConfigLoader:
     ):
         self.organization_id = Config().organization_id
         self.team_id = Config().team_id
-        self.database_handler = SupabaseHandler()
+        self.database_handler = create_database_handler()
         self.team_name = self.get_team_name()
         self.organization_name = self.get_organization_name()
         organization_config = OrganizationConfig(
@@ -52,7 +52,7 @@ class ConfigLoader:
             organization_id=self.organization_id
         )
         capabilities_dict = {}
-        for capability_data in capabilities.data:
+        for capability_data in capabilities:
             capabilities_dict[capability_data["name"]] = capability_data["id"]
         return capabilities_dict
 
@@ -101,18 +101,28 @@ class ConfigLoader:
         executive_director_agent_id = str(uuid.uuid4())
         root_team_id = str(uuid.uuid4())
         root_team_name = self.team_name
-        self.database_handler.create_team(
-            created_by_user_id=Config().user_id,
-            id=root_team_id,
-            name=root_team_name,
-            mission="Global coordination and communication with users",
-            organization_id=organization_id,
-            organization_name=organization_name,
-            lead_agent_id=executive_director_agent_id,
-            lead_agent_name=executive_director_agent_name,
-            status=0,
+        # The rows are collected and created in bulk, the capabilities already exist.
+        capabilities_dict = self.get_capabilities()
+        team_rows = []
+        agent_rows = []
+        capability_links = []
+        team_rows.append(
+            dict(
+                created_by_user_id=Config().user_id,
+                id=root_team_id,
+                name=root_team_name,
+                mission="Global coordination and communication with users",
+                organization_id=organization_id,
+                organization_name=organization_name,
+                lead_agent_id=executive_director_agent_id,
+                lead_agent_name=executive_director_agent_name,
+                status=0,
+            )
         )
         self.load_agent(
+            agent_rows=agent_rows,
+            capability_links=capability_links,
+            capabilities_dict=capabilities_dict,
             created_by_user_id=Config().user_id,
             id=executive_director_agent_id,
             name=executive_director_agent_name,
@@ -128,21 +138,26 @@ class ConfigLoader:
             team_name = list(team.keys())[0]
             lead_agent_id = str(uuid.uuid4())
             lead_agent_name = team_name + "_leader"
-            self.database_handler.create_team(
-                created_by_user_id=Config().user_id,
-                id=team_id,
-                name=team_name,
-                mission=team[team_name]["mission"],
-                organization_id=organization_id,
-                organization_name=organization_name,
-                lead_agent_id=lead_agent_id,
-                lead_agent_name=lead_agent_name,
-                status=0,
+            team_rows.append(
+                dict(
+                    created_by_user_id=Config().user_id,
+                    id=team_id,
+                    name=team_name,
+                    mission=team[team_name]["mission"],
+                    organization_id=organization_id,
+                    organization_name=organization_name,
+                    lead_agent_id=lead_agent_id,
+                    lead_agent_name=lead_agent_name,
+                    status=0,
+                )
             )
             # Create team leader
             team_mission = team[team_name]["mission"]
             team_leader_mission = f"Using effective task delegation and progress monitoring of your agents, ensure the accomplishment of the following mission: {team_mission}"
             self.load_agent(
+                agent_rows=agent_rows,
+                capability_links=capability_links,
+                capabilities_dict=capabilities_dict,
                 created_by_user_id=Config().user_id,
                 id=lead_agent_id,
                 name=lead_agent_name,
@@ -162,6 +177,9 @@ class ConfigLoader:
                     if default_capability not in worker_capabilities:
                         worker_capabilities.append(default_capability)
                 self.load_agent(
+                    agent_rows=agent_rows,
+                    capability_links=capability_links,
+                    capabilities_dict=capabilities_dict,
                     created_by_user_id=Config().user_id,
                     id=str(uuid.uuid4()),
                     name=agent_name,
@@ -175,10 +193,16 @@ class ConfigLoader:
                     is_lead=False,
                 )
             teams.append((team_id, lead_agent_id))
+        self.database_handler.create_teams(rows=team_rows)
+        self.database_handler.create_agents(rows=agent_rows)
+        self.database_handler.link_capabilities(rows=capability_links)
         return teams
 
     def load_agent(
         self,
+        agent_rows: List[Dict[str, Any]],
+        capability_links: List[Dict[str, Any]],
+        capabilities_dict: Dict[str, str],
         created_by_user_id: str,
         id: str,
         name: str,
@@ -191,36 +215,45 @@ class ConfigLoader:
         supervisor_id: Optional[str] = None,
         supervisor_name: Optional[str] = None,
     ):
-        self.database_handler.create_agent(
-            created_by_user_id=created_by_user_id,
-            id=id,
-            name=name,
-            mission=agent_mission,
-            organization_id=organization_id,
-            stage="PLAN_GOAL",
-            status="WAITING",
-            team_id=team_id,
-            team_name=team_name,
-            is_lead=is_lead,
-            supervisor_id=supervisor_id,
-            supervisor_name=supervisor_name,
+        """Add the rows of the agent and of its capabilities to the ones to be created"""
+
+        agent_rows.append(
+            dict(
+                created_by_user_id=created_by_user_id,
+                id=id,
+                name=name,
+                mission=agent_mission,
+                organization_id=organization_id,
+                stage="PLAN_GOAL",
+                status="WAITING",
+                team_id=team_id,
+                team_name=team_name,
+                is_lead=is_lead,
+                supervisor_id=supervisor_id,
+                supervisor_name=supervisor_name,
+            )
         )
-        capabilities_dict = self.get_capabilities()
         for capability in capabilities:
-            self.database_handler.link_capability(
-                agent_id=id,
-                capability_id=capabilities_dict[capability],
-                organization_id=organization_id,
+            capability_links.append(
+                dict(
+                    agent_id=id,
+                    capability_id=capabilities_dict[capability],
+                    organization_id=organization_id,
+                )
             )
 
     def load_capabilities(self):
         capabilities = self._setup_capabilities()
-        for capability in capabilities:
-            self.database_handler.create_capability(
-                id=str(uuid.uuid4()),
-                name=capability,
-                organization_id=Config().organization_id,
-            )
+        self.database_handler.create_capabilities(
+            rows=[
+                dict(
+                    id=str(uuid.uuid4()),
+                    name=capability,
+                    organization_id=Config().organization_id,
+                )
+                for capability in capabilities
+            ]
+        )
 
     def _setup_capabilities(self):
         CapabilityBuilder.load_capabilities()
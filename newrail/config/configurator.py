@@ -1,12 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
 import os
 import uuid
 import shutil
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from newrail.agent.config.stage import Stage
 from newrail.agent.config.status import Status
-from newrail.agent.communication.database_handler.supabase_handler import (
-    SupabaseHandler,
+from newrail.agent.communication.database_handler.database_handler import (
+    create_database_handler,
 )
 from newrail.config.config import Config
 from newrail.capabilities.utils.builder import CapabilityBuilder
@@ -27,7 +28,7 @@ class Configurator:
     ):
         self.organization_id = Config().organization_id
         self.team_id = Config().team_id
-        self.database_handler = SupabaseHandler()
+        self.database_handler = create_database_handler()
         self.organization_name = self.get_organization_name()
         self.team_name = self.get_team_name()
         Logger(protagonist=self.get_lead_agent_name())
@@ -50,6 +51,25 @@ class Configurator:
         shutil.copytree(files_path, Config().organization_data, dirs_exist_ok=True)
 
     def create_agent_tree(self, lead_agent_name: str):
+        """Create the teams supervised by the lead agent and construct their agents in parallel"""
+
+        agents = self.create_team_tree(lead_agent_name=lead_agent_name)
+        with ThreadPoolExecutor(
+            max_workers=Config().organization_load_workers
+        ) as executor:
+            futures = [
+                executor.submit(
+                    self.create_agent, agent_name=agent_name, team_name=team_name
+                )
+                for agent_name, team_name in agents
+            ]
+            for future in futures:
+                future.result()
+
+    def create_team_tree(self, lead_agent_name: str) -> List[Tuple[str, str]]:
+        """Create the teams recursively, returning the name and team of the agents to create"""
+
+        agents = []
         supervised_agents = self.database_handler.get_supervised_agent(
             organization_id=self.organization_id,
             supervisor_name=lead_agent_name,
@@ -57,15 +77,12 @@ class Configurator:
         for agent in supervised_agents:
             if agent["is_lead"]:
                 self.create_team(team_name=agent["team_name"])
-                self.create_agent(
-                    agent_name=agent["name"], team_name=agent["team_name"]
-                )
-                # Create agents recursively
-                self.create_agent_tree(lead_agent_name=agent["name"])
+                agents.append((agent["name"], agent["team_name"]))
+                # Create teams recursively
+                agents.extend(self.create_team_tree(lead_agent_name=agent["name"]))
             else:
-                self.create_agent(
-                    agent_name=agent["name"], team_name=agent["team_name"]
-                )
+                agents.append((agent["name"], agent["team_name"]))
+        return agents
 
     def create_agent(self, agent_name: str, team_name: str):
         agent_capabilities = self.database_handler.get_agent_capabilities(
@@ -157,7 +174,7 @@ class Configurator:
             organization_id=self.organization_id
         )
         capabilities_dict = {}
-        for capability_data in capabilities.data:
+        for capability_data in capabilities:
             capabilities_dict[capability_data["name"]] = capability_data["id"]
         return capabilities_dict
 
@@ -192,12 +209,16 @@ class Configurator:
 
     def load_capabilities(self):
         capabilities = self._setup_capabilities()
-        for capability in capabilities:
-            self.database_handler.create_capability(
-                id=str(uuid.uuid4()),
-                name=capability,
-                organization_id=Config().organization_id,
-            )
+        self.database_handler.create_capabilities(
+            rows=[
+                dict(
+                    id=str(uuid.uuid4()),
+                    name=capability,
+                    organization_id=Config().organization_id,
+                )
+                for capability in capabilities
+            ]
+        )
 
     def update_team_invocations(self, team_invocations_id: str, status: str):
         self.database_handler.update_team_invocations(
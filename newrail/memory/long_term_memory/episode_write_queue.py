@@ -0,0 +1,81 @@
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from newrail.config.config import Config
+from newrail.utils.journal import WriteBehindQueue
+
+
+class EpisodeWriteQueue(WriteBehindQueue):
+    """
+    Write-behind queue for the episodes stored in long term memory.
+
+    Episodes are persisted in batches, see WriteBehindQueue. Pending episodes can be
+    read before they are flushed.
+    """
+
+    JOURNAL_NAME = "episodes_journal"
+    KEY = "uuid"
+
+    _instance: Optional["EpisodeWriteQueue"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        journal_path: str,
+        batch_size: int = Config().long_term_memory_batch_size,
+        flush_interval: float = Config().long_term_memory_flush_interval,
+    ):
+        super().__init__(
+            journal_path=journal_path,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+        )
+        self.store_batch: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+
+    @staticmethod
+    def get_journal_folder() -> str:
+        return os.path.join(Config().permanent_storage, "long_term_memory")
+
+    def start(self, store_batch: Callable[[List[Dict[str, Any]]], None]) -> None:
+        """Start the background flusher, only the first call has effect"""
+
+        with self.condition:
+            if self.flusher:
+                return
+            self.store_batch = store_batch
+        self.start_flusher()
+
+    def put(self, record: Dict[str, Any]) -> None:
+        """Queue an episode, it is durable once this method returns"""
+
+        self.put_record(record)
+
+    def get(self, episode_uuid: str) -> Optional[Dict[str, Any]]:
+        """Get an episode which is waiting to be flushed"""
+
+        with self.condition:
+            record = self.pending.get(episode_uuid)
+            return dict(record) if record else None
+
+    def get_all(self, agent_uuid: str) -> List[Dict[str, Any]]:
+        """Get the episodes of an agent which are waiting to be flushed"""
+
+        with self.condition:
+            return [
+                dict(record)
+                for record in self.pending.values()
+                if record["agent_uuid"] == agent_uuid
+            ]
+
+    def write(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store a batch, all or nothing"""
+
+        if not self.store_batch:
+            return []
+        try:
+            self.store_batch(batch)
+        except Exception as e:
+            print(f"Failed to store {len(batch)} episodes on long term memory: {e}")
+            return []
+        return batch
@@ -1,8 +1,12 @@
-from typing import List, Optional
+import threading
+from typing import Any, Dict, List, Optional
+import numpy as np
 import weaviate
 
+from newrail.memory.long_term_memory.episode_write_queue import EpisodeWriteQueue
 from newrail.memory.utils.episodes.episode import Episode
-from newrail.memory.utils.embeddings import get_ada_embedding
+from newrail.memory.utils.episodes.episode_store import EpisodeStore
+from newrail.memory.utils.embeddings import get_ada_embedding, get_ada_embeddings
 from newrail.config.config import Config
 from weaviate.exceptions import (
     ObjectAlreadyExistsException,
@@ -106,6 +110,9 @@ class WeaviateMemory(object):
             self.client = weaviate.Client(
                 url=f"{Config().local_weaviate_url}:{Config().weaviate_port}"
             )
+        # Vectors of the queued episodes, reused when they are stored.
+        self.pending_vectors: Dict[str, List[float]] = {}
+        self.pending_vectors_lock = threading.Lock()
         # self.client.schema.delete_all()
         self._create_schema()
 
@@ -185,6 +192,11 @@ class WeaviateMemory(object):
             return None
 
     def retrieve_episode(self, agent_uuid, episode_uuid):
+        if Config().long_term_memory_write_behind:
+            # Read your writes: the episode might not be flushed yet.
+            pending_episode = EpisodeWriteQueue.get_instance().get(episode_uuid)
+            if pending_episode and pending_episode["agent_uuid"] == agent_uuid:
+                return pending_episode
         try:
             query = self.client.query.get(
                 "Episode", ["overview", "content", "child_episodes_uuid", "created_at"]
@@ -209,24 +221,27 @@ class WeaviateMemory(object):
             return None
 
     def get_episode(self, agent_uuid, episode_uuid: str) -> Optional[Episode]:
+        episode_store = EpisodeStore.get_store(agent_id=agent_uuid)
+        episode = episode_store.get(key=episode_uuid)
+        if episode:
+            return episode
         stored_episode = self.retrieve_episode(
             agent_uuid=agent_uuid, episode_uuid=episode_uuid
         )
         if stored_episode:
-            child_episodes = []
-            for child_episode_uuid in stored_episode["child_episodes_uuid"]:
-                child_episodes.append(
-                    self.get_episode(
-                        agent_uuid=agent_uuid, episode_uuid=child_episode_uuid
-                    )
-                )
             episode = Episode(
                 overview=stored_episode["overview"], content=stored_episode["content"]
             )
             episode._creation_time = stored_episode["created_at"]
-            episode.add_child_episodes(episodes=child_episodes)
+            # Child episodes are retrieved only when they are needed.
+            episode.add_child_episodes_uuid(
+                episodes_uuid=stored_episode["child_episodes_uuid"] or [],
+                loader=lambda child_episode_uuid: self.get_episode(
+                    agent_uuid=agent_uuid, episode_uuid=child_episode_uuid
+                ),
+            )
             episode.link_to_uuid(uuid=episode_uuid)
-            return episode
+            return episode_store.add(episode=episode)
         return None
 
     def search_episode(
@@ -240,13 +255,61 @@ class WeaviateMemory(object):
             fields=["content", "overview", "child_episodes_uuid", "created_at"],
             num_relevant=num_relevant,
         )
+        episode_uuid, episode_certainty = None, certainty
         if most_similar_contents:
             stored_episode = most_similar_contents[0]
-            return self.get_episode(
-                agent_uuid=agent_uuid, episode_uuid=stored_episode["_additional"]["id"]
+            episode_uuid = stored_episode["_additional"]["id"]
+            episode_certainty = stored_episode["_additional"]["certainty"] or certainty
+        if Config().long_term_memory_write_behind:
+            # Queued episodes are not on Weaviate yet, they are scored locally.
+            pending_uuid = self._search_pending_episodes(
+                vector=vector, agent_uuid=agent_uuid, certainty=episode_certainty
             )
+            if pending_uuid:
+                episode_uuid = pending_uuid
+        if episode_uuid:
+            return self.get_episode(agent_uuid=agent_uuid, episode_uuid=episode_uuid)
         return None
 
+    def _search_pending_episodes(
+        self, vector: List[float], agent_uuid: str, certainty: float
+    ) -> Optional[str]:
+        """Get the most similar episode of the write queue above the certainty"""
+
+        episodes = EpisodeWriteQueue.get_instance().get_all(agent_uuid=agent_uuid)
+        if not episodes:
+            return None
+        episode_vectors = np.asarray(self._get_episode_vectors(episodes=episodes))
+        query_vector = np.asarray(vector)
+        similarities = episode_vectors @ query_vector / (
+            np.linalg.norm(episode_vectors, axis=1) * np.linalg.norm(query_vector)
+        )
+        # Same certainty as Weaviate for the cosine distance.
+        certainties = (1 + similarities) / 2
+        best = int(np.argmax(certainties))
+        if certainties[best] < certainty:
+            return None
+        return episodes[best]["uuid"]
+
+    def _get_episode_vectors(self, episodes: List[Dict[str, Any]]) -> List[List[float]]:
+        """Get the vectors of the episodes, embedding only the ones without a vector"""
+
+        with self.pending_vectors_lock:
+            missing = [
+                episode
+                for episode in episodes
+                if episode["uuid"] not in self.pending_vectors
+            ]
+        if missing:
+            vectors = get_ada_embeddings(
+                [f"{episode['overview']}: {episode['content']}" for episode in missing]
+            )
+            with self.pending_vectors_lock:
+                for episode, vector in zip(missing, vectors):
+                    self.pending_vectors[episode["uuid"]] = vector
+        with self.pending_vectors_lock:
+            return [self.pending_vectors[episode["uuid"]] for episode in episodes]
+
     def create_episode(
         self,
         overview,
@@ -325,6 +388,61 @@ class WeaviateMemory(object):
             )
         return episode_uuid
 
+    def store_episodes(self, episodes: List[Dict[str, Any]]) -> None:
+        """Store a batch of episodes, with their uuids already assigned, and their cross-references"""
+
+        vectors = self._get_episode_vectors(episodes=episodes)
+        for episode, vector in zip(episodes, vectors):
+            self.client.batch.add_data_object(
+                data_object={
+                    "overview": episode["overview"],
+                    "content": episode["content"],
+                    "capability": episode["capability"],
+                    "action": episode["action"],
+                    "created_at": episode["created_at"],
+                    "child_episodes_uuid": episode["child_episodes_uuid"],
+                },
+                class_name="Episode",
+                uuid=episode["uuid"],
+                vector=vector,
+            )
+        self._verify_batch_results(self.client.batch.create_objects())
+        for episode in episodes:
+            # Link agent and team to episode
+            self.client.batch.add_reference(
+                from_object_uuid=episode["uuid"],
+                from_object_class_name="Episode",
+                from_property_name="agent",
+                to_object_uuid=episode["agent_uuid"],
+                to_object_class_name="Agent",
+            )
+            self.client.batch.add_reference(
+                from_object_uuid=episode["uuid"],
+                from_object_class_name="Episode",
+                from_property_name="team",
+                to_object_uuid=episode["team_uuid"],
+                to_object_class_name="Team",
+            )
+            for child_episode_uuid in episode["child_episodes_uuid"]:
+                # Add parent as cross-reference for each child
+                self.client.batch.add_reference(
+                    from_object_uuid=child_episode_uuid,
+                    from_object_class_name="Episode",
+                    from_property_name="meta_episode",
+                    to_object_uuid=episode["uuid"],
+                    to_object_class_name="Episode",
+                )
+        self._verify_batch_results(self.client.batch.create_references())
+        with self.pending_vectors_lock:
+            for episode in episodes:
+                self.pending_vectors.pop(episode["uuid"], None)
+
+    def _verify_batch_results(self, results) -> None:
+        for result in results or []:
+            errors = result.get("result", {}).get("errors")
+            if errors:
+                raise Exception(f"Batch operation failed: {errors}")
+
     def update_cross_reference(
         self,
         uuid: str,
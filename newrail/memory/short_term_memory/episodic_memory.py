@@ -1,19 +1,48 @@
 import json
 import os
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
+
+import msgpack
 
 from newrail.agent.communication.events.event import Event
+from newrail.config.config import Config
 from newrail.memory.utils.goals.goal_memory import GoalMemory
 from newrail.memory.utils.goals.goal import Goal
+from newrail.memory.utils.goals.goal_status import GoalStatus
 from newrail.memory.utils.episodes.episode import Episode
 from newrail.memory.utils.episodes.episode_manager import EpisodeManager
+from newrail.memory.utils.episodes.episode_store import EpisodeStore
+from newrail.memory.utils.episodes.episode_table import EpisodeTable
 from newrail.memory.utils.thought.thought import Thought
 from newrail.memory.utils.task.task import Task
 from newrail.memory.utils.task.task_memory import TaskMemory
 from newrail.organization.utils.logger.agent_logger import AgentLogger
+from newrail.utils.journal import Journal
+from newrail.utils.unit_of_work import UnitOfWork
+
+
+SECTIONS = (
+    "thought",
+    "events",
+    "similar_episodes",
+    "goal_memory",
+    "episode_manager",
+    "task_memory",
+    "relevant_information",
+)
 
 
 class EpisodicMemory:
+    """
+    Short term memory of the agent.
+
+    The memory is persisted as a msgpack snapshot plus an append-only journal. Each save
+    appends the latest state of the sections modified since the previous save, and the
+    journal is compacted into a new snapshot periodically. Loading replays the journal on
+    top of the snapshot, as entries hold the whole section the replay is idempotent.
+    Episodes are stored once in an EpisodeTable and sections reference them by key.
+    """
+
     def __init__(
         self,
         agent_id: str,
@@ -21,52 +50,70 @@ class EpisodicMemory:
         folder: str,
         logger: AgentLogger,
     ):
-        self.file_path = os.path.join(folder, "episodic_memory.json")
+        self.file_path = os.path.join(folder, "episodic_memory.msgpack")
+        self.journal = Journal(
+            os.path.join(folder, "episodic_memory.log"),
+            binary=True,
+        )
+        # Previous JSON format, converted to msgpack on first load.
+        self.legacy_file_path = os.path.join(folder, "episodic_memory.json")
+        self.legacy_journal = Journal(os.path.join(folder, "episodic_memory.journal"))
+        # Episodes are kept once per agent, the memory only holds references to them.
+        self.episode_store = EpisodeStore.get_store(agent_id=agent_id)
+        self.episode_table = EpisodeTable(store=self.episode_store)
+        self.journal_entries = 0
+        self.dirty_sections: Set[str] = set()
         self.agent_id = agent_id
         self.team_id = team_id
         self.folder = folder
         self.logger = logger.create_logger("episodic_memory")
         loaded = False
-        if os.path.exists(self.file_path):
+        if os.path.exists(self.file_path) or os.path.exists(self.legacy_file_path):
             try:
-                with open(self.file_path, "r") as f:
-                    data = json.load(f)
-                    self.load(data=data)
-                    goal = self.goal_memory.get_current_goal()
-                    loaded = True
-                    if goal:
-                        self.logger.log(f"Starting episodic memory on goal: {goal}")
-                    self.logger.log("Starting existing episodic memory without goal.")
+                self.load(data=self.read())
+                goal = self.goal_memory.get_current_goal()
+                loaded = True
+                if goal:
+                    self.logger.log(f"Starting episodic memory on goal: {goal}")
+                self.logger.log("Starting existing episodic memory without goal.")
             except Exception as e:
                 self.logger.log(f"Error loading episodic memory: {e}")
         if not loaded:
             self.start_new_memory()
-        self.save()
+        self.snapshot()
+        for legacy_path in [self.legacy_file_path, self.legacy_journal.file_path]:
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
 
     def add_event(self, event: Event) -> None:
         """Add event to current episode"""
 
         self.events.append(event)
+        self.mark_dirty("events")
 
     def add_episode(self, episode: Episode) -> None:
         """Add episode to current episode"""
 
         self.episode_manager.add_episode(episode=episode)
+        self.mark_dirty("episode_manager")
 
     def add_goal_episode(self, episode: Episode) -> None:
         """Add episode to current episode"""
 
         self.goal_memory.add_episode(episode=episode)
+        self.mark_dirty("goal_memory")
 
     def clear_events(self) -> None:
         """Clear events"""
 
         self.events = []
+        self.mark_dirty("events")
 
     def add_task(self, task: Task):
         """Add a new task"""
 
         self.task_memory.add_task(task=task)
+        self.mark_dirty("task_memory")
         self.save()
 
     def get_current_goal(self) -> Optional[Goal]:
@@ -142,15 +189,22 @@ class EpisodicMemory:
     def get_relevant_information(self) -> str:
         return self.relevant_information
 
+    def mark_dirty(self, *sections: str) -> None:
+        """Mark the sections that should be journaled on next save"""
+
+        self.dirty_sections.update(sections)
+
     def max_iterations_reached(self) -> bool:
         """Return True if max iterations reached."""
 
+        self.mark_dirty("goal_memory")
         return self.goal_memory.max_iterations_reached()
 
     def on_goal_accomplished(self) -> Optional[Episode]:
         """Called when a goal is accomplished"""
 
         self.goal_memory.on_goal_finished()
+        self.mark_dirty("goal_memory")
         episode = self.goal_memory.create_meta_episode()
         if episode:
             self.add_episode(episode=episode)
@@ -159,64 +213,156 @@ class EpisodicMemory:
         if len(goals) > 0:
             self.goal_memory.set_goals(goals=goals)
             self.episode_manager.set_current_goal(current_goal=goals[0].description)
+            self.mark_dirty("goal_memory", "episode_manager")
             self.save()
 
     def update_similar_episodes(self, similar_episodes: Dict[str, Episode]) -> None:
         """Update most similar episode"""
 
         self.similar_episodes = similar_episodes
+        self.mark_dirty("similar_episodes")
         self.save()
 
     def update_relevant_information(self, relevant_information: str) -> None:
         self.relevant_information = relevant_information
+        self.mark_dirty("relevant_information")
         self.save()
 
     def update_thought(self, thought: Thought) -> None:
         """Update last thought"""
 
         self.thought = thought
+        self.mark_dirty("thought")
         self.save()
 
+    def update_goal_status(self, goal: Goal, status: GoalStatus) -> None:
+        """Update the status of a goal"""
+
+        goal.update_status(status=status)
+        self.mark_dirty("goal_memory")
+        self.save()
+
+    def read(self) -> Dict[str, Any]:
+        """Read the snapshot and replay the journal on top of it"""
+
+        if not os.path.exists(self.file_path):
+            with open(self.legacy_file_path, "r") as f:
+                data = json.load(f)
+            for record in self.legacy_journal.read():
+                data[record["section"]] = record["data"]
+            return data
+        with open(self.file_path, "rb") as f:
+            data = msgpack.unpackb(f.read(), raw=False)
+        self.episode_table = EpisodeTable(
+            records=data.pop("episodes"), store=self.episode_store
+        )
+        for record in self.journal.read():
+            self.episode_table.update(records=record["episodes"])
+            data[record["section"]] = record["data"]
+        data["episode_table"] = self.episode_table
+        return data
+
     def load(self, data):
-        """Load the data from a dict"""
+        """Load the data from a dict, episodes are inlined unless an episode table is given"""
 
+        episode_table = data.get("episode_table")
+        if episode_table:
+            get_episode = episode_table.get
+        else:
+            get_episode = Episode.from_dict
         self.thought = Thought.from_dict(data=data["thought"])
         self.events = [Event.from_dict(data=event) for event in data["events"]]
         self.episode_manager = EpisodeManager.from_dict(
-            data=data["episode_manager"], logger=self.logger
+            data=data["episode_manager"],
+            logger=self.logger,
+            episode_table=episode_table,
         )
         self.goal_memory = GoalMemory.from_dict(
-            data=data["goal_memory"], logger=self.logger
+            data=data["goal_memory"],
+            logger=self.logger,
+            episode_table=episode_table,
         )
-        self.similar_episodes = {
-            str(query): Episode.from_dict(data=episode)
-            for query, episode in data["similar_episodes"].items()
-        }
+        self.similar_episodes = {}
+        for query, episode_data in dict(data["similar_episodes"]).items():
+            episode = get_episode(episode_data)
+            if episode:
+                self.similar_episodes[str(query)] = episode
         self.task_memory = TaskMemory.from_dict(data["task_memory"])
         self.relevant_information = data["relevant_information"]
 
     def save(self):
-        episodic_memory_dict = self.to_dict()
-
-        with open(self.file_path, "w") as f:
-            f.write(json.dumps(episodic_memory_dict, indent=2))
+        """Append the modified sections to the journal"""
+
+        if not self.dirty_sections:
+            return
+        if UnitOfWork.defer(key=self, write=self.save):
+            return
+        records = []
+        for section in SECTIONS:
+            if section in self.dirty_sections:
+                section_data = self.get_section(section)
+                records.append(
+                    {
+                        "section": section,
+                        "data": section_data,
+                        # Only the episodes which are not persisted yet.
+                        "episodes": self.episode_table.pop_new_records(),
+                    }
+                )
+        self.journal.append_many(records=records)
+        self.dirty_sections.clear()
+        self.journal_entries += len(records)
+        if self.journal_entries >= Config().episodic_memory_snapshot_interval:
+            self.snapshot()
+
+    def snapshot(self):
+        """Compact the journal into a new snapshot"""
+
+        self.episode_table.roots.clear()
+        data = self.to_dict()
+        # Drop the episodes which are not referenced anymore.
+        self.episode_table.compact()
+        self.episode_store.retain(keys=self.episode_table.keys)
+        data["episodes"] = self.episode_table.records
+        tmp_path = f"{self.file_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(msgpack.packb(data, use_bin_type=True))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.file_path)
+        # A crash before clearing the journal only replays entries already in the snapshot.
+        self.journal.clear()
+        self.dirty_sections.clear()
+        self.journal_entries = 0
+
+    def get_section(self, section: str) -> Any:
+        """Serialize a single section of the memory"""
+
+        if section == "thought":
+            return self.thought.to_dict()
+        if section == "events":
+            return [event.to_dict() for event in self.events]
+        if section == "similar_episodes":
+            return [
+                [query, self.episode_table.add(episode)]
+                for query, episode in self.similar_episodes.items()
+            ]
+        if section == "goal_memory":
+            return self.goal_memory.to_dict(episode_table=self.episode_table)
+        if section == "episode_manager":
+            return self.episode_manager.to_dict(episode_table=self.episode_table)
+        if section == "task_memory":
+            return self.task_memory.to_dict()
+        if section == "relevant_information":
+            return self.relevant_information
+        raise ValueError(f"Unknown episodic memory section: {section}")
 
     def to_dict(self):
-        return {
-            "thought": self.thought.to_dict(),
-            "events": [event.to_dict() for event in self.events],
-            "similar_episodes": [
-                [query, episode.to_dict()]
-                for query, episode in self.similar_episodes.items()
-            ],
-            "goal_memory": self.goal_memory.to_dict(),
-            "episode_manager": self.episode_manager.to_dict(),
-            "task_memory": self.task_memory.to_dict(),
-            "relevant_information": self.relevant_information,
-        }
+        return {section: self.get_section(section) for section in SECTIONS}
 
     def set_task_finished(self):
         self.task_memory.set_task_finished()
+        self.mark_dirty("task_memory")
         self.save()
 
     def start_new_memory(self):
@@ -0,0 +1,64 @@
+import unittest
+
+from newrail.memory.utils.episodes.chunk_deduplicator import ChunkDeduplicator
+
+
+PAGE = (
+    "Weaviate is an open source vector database that stores both objects and vectors, "
+    "allowing for combining vector search with structured filtering with the fault "
+    "tolerance and scalability of a cloud-native database, all accessible through "
+    "GraphQL, REST, and various language clients."
+)
+
+
+class TestChunkDeduplicator(unittest.TestCase):
+    def test_drops_duplicates_within_observation(self):
+        deduplicator = ChunkDeduplicator(max_distance=3, history_size=8)
+        chunks, notes, saved_tokens = deduplicator.deduplicate(
+            [PAGE, PAGE + " ", "A completely different paragraph about football."]
+        )
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(
+            notes, ["Near-duplicate of a previous chunk of this observation."]
+        )
+        self.assertGreater(saved_tokens, 0)
+
+    def test_drops_duplicates_against_recent_chunks(self):
+        deduplicator = ChunkDeduplicator(max_distance=3, history_size=8)
+        deduplicator.set_goal("Research vector databases")
+        deduplicator.deduplicate([PAGE])
+        deduplicator.set_reference(PAGE, "episode 1234 (Weaviate overview)")
+        chunks, notes, _ = deduplicator.deduplicate([PAGE])
+        self.assertEqual(chunks, [])
+        self.assertEqual(notes, ["Near-duplicate of episode 1234 (Weaviate overview)."])
+
+    def test_collapsed_chunks_keep_the_lines_that_differ(self):
+        deduplicator = ChunkDeduplicator(max_distance=3, history_size=8)
+        lines = [f"{PAGE} Section {idx}." for idx in range(20)]
+        deduplicator.deduplicate(["\n".join(lines)])
+        lines[7] = "The port of the server was changed to 8081."
+        chunks, notes, _ = deduplicator.deduplicate(["\n".join(lines)])
+        self.assertEqual(chunks, [])
+        self.assertIn("+ The port of the server was changed to 8081.", notes[0])
+        self.assertIn(f"- {PAGE} Section 7.", notes[0])
+
+    def test_new_goal_resets_history(self):
+        deduplicator = ChunkDeduplicator(max_distance=3, history_size=8)
+        deduplicator.set_goal("Research vector databases")
+        deduplicator.deduplicate([PAGE])
+        deduplicator.set_goal("Write a summary")
+        chunks, notes, _ = deduplicator.deduplicate([PAGE])
+        self.assertEqual(chunks, [PAGE])
+        self.assertEqual(notes, [])
+
+    def test_keeps_different_chunks(self):
+        deduplicator = ChunkDeduplicator(max_distance=3, history_size=8)
+        first = "The tennis player did amazing during the final match of the tournament."
+        second = "The basketball team scored a three-pointer in the last second of the game."
+        chunks, notes, _ = deduplicator.deduplicate([first, second])
+        self.assertEqual(chunks, [first, second])
+        self.assertEqual(notes, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from newrail.memory.utils.episodes.episode import Episode
+from newrail.memory.utils.episodes.episode_store import EpisodeStore
+
+
+def get_episode(idx, child_episodes=[]):
+    episode = Episode(overview=f"Overview {idx}", content=f"Content {idx}")
+    episode.link_to_uuid(uuid=f"episode-{idx}")
+    episode.add_child_episodes(episodes=child_episodes)
+    return episode
+
+
+class TestEpisodeStore(unittest.TestCase):
+    def test_interns_episodes(self):
+        store = EpisodeStore()
+        episode = store.add(get_episode(0))
+        meta_episode = store.add(get_episode(1, child_episodes=[get_episode(0)]))
+        self.assertIs(store.add(get_episode(0)), episode)
+        self.assertIs(meta_episode.get_child_episodes()[0], episode)
+        self.assertIs(store.get("episode-1"), meta_episode)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.get_record("episode-1").child_episodes, ("episode-0",))
+
+    def test_get_by_order(self):
+        store = EpisodeStore()
+        episodes = [store.add(get_episode(idx)) for idx in range(3)]
+        self.assertIs(store.get_by_order(1), episodes[1])
+        self.assertIsNone(store.get_by_order(3))
+
+    def test_retain_keeps_episodes_in_use(self):
+        store = EpisodeStore()
+        meta_episode = store.add(get_episode(1, child_episodes=[get_episode(0)]))
+        store.add(get_episode(2))
+        store.add(get_episode(3))
+        store.retain(keys={"episode-2"})
+        self.assertIn("episode-0", store)
+        self.assertIn("episode-1", store)
+        self.assertIn("episode-2", store)
+        self.assertNotIn("episode-3", store)
+        self.assertIs(store.get("episode-1"), meta_episode)
+
+    def test_get_store_per_agent(self):
+        self.assertIs(EpisodeStore.get_store("agent"), EpisodeStore.get_store("agent"))
+        self.assertIsNot(
+            EpisodeStore.get_store("agent"), EpisodeStore.get_store("other_agent")
+        )
+        EpisodeStore.remove_store("agent")
+        EpisodeStore.remove_store("other_agent")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import msgpack
+
+from newrail.memory.utils.episodes.episode import Episode
+from newrail.memory.utils.episodes.episode_table import EpisodeTable
+
+
+def get_episode(idx, child_episodes=[]):
+    episode = Episode(overview=f"Overview {idx}", content=f"Content {idx}")
+    episode.link_to_uuid(uuid=f"episode-{idx}")
+    episode.add_child_episodes(episodes=child_episodes)
+    return episode
+
+
+class TestEpisodeTable(unittest.TestCase):
+    def test_stores_each_episode_once(self):
+        children = [get_episode(idx) for idx in range(3)]
+        meta_episode = get_episode(3, child_episodes=children)
+        grand_meta_episode = get_episode(4, child_episodes=[meta_episode])
+        table = EpisodeTable()
+        keys = [table.add(episode) for episode in children]
+        keys.append(table.add(meta_episode))
+        keys.append(table.add(grand_meta_episode))
+        self.assertEqual(len(table.records), 5)
+        self.assertEqual(
+            table.records["episode-3"]["child_episodes"],
+            ["episode-0", "episode-1", "episode-2"],
+        )
+        self.assertEqual(table.records["episode-4"]["child_episodes"], ["episode-3"])
+        self.assertEqual(len(table.pop_new_records()), 5)
+        self.assertEqual(table.pop_new_records(), {})
+
+    def test_loads_child_episodes_lazily(self):
+        meta_episode = get_episode(3, child_episodes=[get_episode(0), get_episode(1)])
+        table = EpisodeTable()
+        table.add(meta_episode)
+        records = msgpack.unpackb(msgpack.packb(table.records), raw=False)
+
+        loaded_table = EpisodeTable(records=records)
+        loaded_episode = loaded_table.get("episode-3")
+        self.assertEqual(list(loaded_table.store.episodes.keys()), ["episode-3"])
+        self.assertEqual(loaded_episode.get_description(), meta_episode.get_description())
+        self.assertEqual(list(loaded_table.store.episodes.keys()), ["episode-3"])
+        self.assertEqual(
+            loaded_episode.get_description(include_child_episodes=True),
+            meta_episode.get_description(include_child_episodes=True),
+        )
+        self.assertIn("episode-1", loaded_table.store.episodes)
+
+    def test_compact_drops_unreferenced_episodes(self):
+        table = EpisodeTable()
+        table.add(get_episode(0))
+        table.compact()
+        table.add(get_episode(1, child_episodes=[get_episode(2)]))
+        table.compact()
+        self.assertEqual(sorted(table.records.keys()), ["episode-1", "episode-2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
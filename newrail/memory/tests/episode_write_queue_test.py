@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from newrail.config.config import Config
+from newrail.memory.long_term_memory.episode_write_queue import EpisodeWriteQueue
+from newrail.utils.journal import get_process_journal_path, reassign_journals
+
+
+def get_record(idx):
+    return {
+        "uuid": f"episode-{idx}",
+        "agent_uuid": "agent",
+        "team_uuid": "team",
+        "overview": f"Overview {idx}",
+        "content": f"Content {idx}",
+        "capability": "",
+        "action": "",
+        "created_at": "",
+        "child_episodes_uuid": [],
+    }
+
+
+class TestEpisodeWriteQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.journal_path = os.path.join(self.tmp_dir.name, "journal.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_flush_stores_in_batches(self):
+        batches = []
+        queue = EpisodeWriteQueue(self.journal_path, batch_size=2, flush_interval=60)
+        queue.store_batch = batches.append
+        for idx in range(5):
+            queue.put(get_record(idx))
+        self.assertEqual(queue.get("episode-3")["overview"], "Overview 3")
+        self.assertEqual(len(queue.get_all(agent_uuid="agent")), 5)
+        self.assertEqual(queue.get_all(agent_uuid="other_agent"), [])
+        self.assertTrue(queue.flush())
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(queue.qsize(), 0)
+        self.assertIsNone(queue.get("episode-3"))
+
+    def test_pending_episodes_survive_restart(self):
+        def fail(batch):
+            raise Exception("Long term memory is down")
+
+        queue = EpisodeWriteQueue(self.journal_path, batch_size=2, flush_interval=60)
+        queue.store_batch = fail
+        for idx in range(3):
+            queue.put(get_record(idx))
+        self.assertFalse(queue.flush())
+
+        recovered_queue = EpisodeWriteQueue(
+            self.journal_path, batch_size=2, flush_interval=60
+        )
+        self.assertEqual(recovered_queue.qsize(), 3)
+        batches = []
+        recovered_queue.store_batch = batches.append
+        self.assertTrue(recovered_queue.flush())
+        self.assertEqual(
+            [record["uuid"] for batch in batches for record in batch],
+            ["episode-0", "episode-1", "episode-2"],
+        )
+
+    def test_worker_journals_are_not_shared(self):
+        Config().process_name = "worker_0"
+        try:
+            worker_path = get_process_journal_path(self.tmp_dir.name, "journal")
+        finally:
+            Config().process_name = ""
+        main_path = get_process_journal_path(self.tmp_dir.name, "journal")
+        self.assertNotEqual(worker_path, main_path)
+
+        main_queue = EpisodeWriteQueue(main_path, batch_size=2, flush_interval=60)
+        worker_queue = EpisodeWriteQueue(worker_path, batch_size=2, flush_interval=60)
+        main_queue.put(get_record(0))
+        worker_queue.put(get_record(1))
+        worker_queue.store_batch = lambda batch: None
+        self.assertTrue(worker_queue.flush())
+        self.assertEqual(EpisodeWriteQueue(main_path).qsize(), 1)
+
+        # The journals of the processes that won't run are replayed by the workers.
+        reassign_journals(self.tmp_dir.name, "journal", num_workers=1)
+        self.assertFalse(os.path.exists(main_path))
+        recovered_queue = EpisodeWriteQueue(worker_path)
+        self.assertIsNotNone(recovered_queue.get("episode-0"))
+
+
+if __name__ == "__main__":
+    unittest.main()
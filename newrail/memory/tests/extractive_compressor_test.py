@@ -0,0 +1,57 @@
+import unittest
+
+from newrail.memory.utils.episodes.extractive_compressor import ExtractiveCompressor
+from newrail.utils.token_counter import count_string_tokens
+
+
+SENTENCES = [
+    "The weather in the city was sunny and warm during the whole week.",
+    "Weaviate is an open source vector database that stores objects and vectors.",
+    "The football match ended with a late goal from the visiting team.",
+    "Vector databases index embeddings to run fast similarity search.",
+    "The bakery on the corner sells fresh bread every morning.",
+    "Weaviate combines vector search with structured filtering of the objects.",
+]
+QUERY = "Research vector databases like Weaviate"
+
+
+def count_tokens(sentences):
+    return sum(count_string_tokens(sentence) for sentence in sentences)
+
+
+class TestExtractiveCompressor(unittest.TestCase):
+    def test_text_within_budget_is_kept(self):
+        compressor = ExtractiveCompressor()
+        compressed = compressor.compress(SENTENCES, QUERY, count_tokens(SENTENCES))
+        self.assertEqual(compressed, SENTENCES)
+
+    def test_token_budget_is_respected(self):
+        compressor = ExtractiveCompressor()
+        max_tokens = count_tokens(SENTENCES) // 2
+        compressed = compressor.compress(SENTENCES, QUERY, max_tokens)
+        self.assertTrue(compressed)
+        self.assertLessEqual(count_tokens(compressed), max_tokens)
+
+    def test_sentences_keep_their_original_order(self):
+        compressor = ExtractiveCompressor()
+        compressed = compressor.compress(
+            SENTENCES, QUERY, count_tokens(SENTENCES) // 2
+        )
+        indexes = [SENTENCES.index(sentence) for sentence in compressed]
+        self.assertEqual(indexes, sorted(indexes))
+
+    def test_sentences_relevant_to_the_goal_are_selected(self):
+        compressor = ExtractiveCompressor()
+        relevant = [SENTENCES[1], SENTENCES[3], SENTENCES[5]]
+        compressed = compressor.compress(SENTENCES, QUERY, count_tokens(relevant))
+        self.assertEqual(compressed, relevant)
+
+        query = "Who scored the goal of the football match"
+        compressed = compressor.compress(
+            SENTENCES, query, count_string_tokens(SENTENCES[2])
+        )
+        self.assertEqual(compressed, [SENTENCES[2]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,3 +6,9 @@ def get_ada_embedding(text):
     return openai.Embedding.create(input=[text], model="text-embedding-ada-002")[
         "data"
     ][0]["embedding"]
+
+
+def get_ada_embeddings(texts):
+    texts = [text.replace("\n", " ") for text in texts]
+    data = openai.Embedding.create(input=texts, model="text-embedding-ada-002")["data"]
+    return [item["embedding"] for item in sorted(data, key=lambda item: item["index"])]
@@ -0,0 +1,166 @@
+from collections import deque
+import difflib
+import hashlib
+import re
+from typing import Deque, List, Optional, Tuple
+
+from newrail.config.config import Config
+from newrail.utils.token_counter import count_string_tokens
+
+
+DEF_FINGERPRINT_BITS = 64
+DEF_SHINGLE_SIZE = 3
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class SeenChunk:
+    """A chunk kept to compare the next ones, with the episode that stores it"""
+
+    def __init__(self, fingerprint: int, text: str):
+        self.fingerprint = fingerprint
+        self.text = text
+        self.reference: Optional[str] = None
+
+
+class ChunkDeduplicator:
+    """
+    Collapses near-duplicate chunks using SimHash fingerprints.
+
+    Chunks are compared against the previous chunks of the same observation and against
+    the chunks seen recently while working on the same goal, so repeated page, file or
+    shell reads don't reach the LLM again. Near-duplicates are not identical, each one is
+    collapsed into a note with a reference to the episode of the matched chunk and the
+    lines that differ from it.
+    """
+
+    def __init__(
+        self,
+        max_distance: int = Config().episodes_dedup_max_distance,
+        history_size: int = Config().episodes_dedup_history,
+    ):
+        self.max_distance = max_distance
+        self.recent_chunks: Deque[SeenChunk] = deque(maxlen=history_size)
+        self.goal = ""
+        self.saved_tokens = 0
+
+    def set_goal(self, goal: str) -> None:
+        """Forget the recent fingerprints when moving to a different goal"""
+
+        if goal != self.goal:
+            self.recent_chunks.clear()
+            self.goal = goal
+
+    def deduplicate(self, chunks: List[str]) -> Tuple[List[str], List[str], int]:
+        """Collapse the near-duplicate chunks.
+
+        Returns:
+            Tuple[List[str], List[str], int]: The unique chunks, the notes of the collapsed chunks and the tokens saved.
+        """
+
+        unique_chunks = []
+        notes = []
+        observation_chunks: List[SeenChunk] = []
+        saved_tokens = 0
+        for chunk in chunks:
+            fingerprint = self.get_fingerprint(chunk)
+            if fingerprint is None:
+                unique_chunks.append(chunk)
+                continue
+            note = self.collapse(chunk, fingerprint, observation_chunks)
+            if note is None:
+                observation_chunks.append(SeenChunk(fingerprint, chunk))
+                unique_chunks.append(chunk)
+                continue
+            notes.append(note)
+            saved_tokens += max(
+                count_string_tokens(chunk) - count_string_tokens(note), 0
+            )
+        self.recent_chunks.extend(observation_chunks)
+        self.saved_tokens += saved_tokens
+        return unique_chunks, notes, saved_tokens
+
+    def collapse(
+        self, chunk: str, fingerprint: int, observation_chunks: List[SeenChunk]
+    ) -> Optional[str]:
+        """Get the note of a near-duplicate chunk, None if the chunk is unique"""
+
+        duplicate = self.find_duplicate(fingerprint, observation_chunks)
+        if duplicate:
+            return self.get_note(
+                chunk, duplicate, "a previous chunk of this observation"
+            )
+        duplicate = self.find_duplicate(fingerprint, self.recent_chunks)
+        if duplicate:
+            reference = duplicate.reference or "content seen before"
+            return self.get_note(chunk, duplicate, reference)
+        return None
+
+    def set_reference(self, chunk: str, reference: str) -> None:
+        """Link a unique chunk to its episode, e.g: with the uuid and overview"""
+
+        for seen_chunk in reversed(self.recent_chunks):
+            if seen_chunk.text == chunk and seen_chunk.reference is None:
+                seen_chunk.reference = reference
+                return
+
+    def find_duplicate(self, fingerprint: int, seen_chunks) -> Optional[SeenChunk]:
+        """Return the first chunk within the max hamming distance, if any"""
+
+        for seen_chunk in seen_chunks:
+            distance = self.hamming_distance(fingerprint, seen_chunk.fingerprint)
+            if distance <= self.max_distance:
+                return seen_chunk
+        return None
+
+    @classmethod
+    def get_note(cls, chunk: str, duplicate: SeenChunk, reference: str) -> str:
+        """Describe a near-duplicate by its reference and the lines that changed"""
+
+        changed_lines = [
+            line
+            for line in difflib.ndiff(
+                [line.rstrip() for line in duplicate.text.splitlines()],
+                [line.rstrip() for line in chunk.splitlines()],
+            )
+            if line.startswith(("+ ", "- "))
+        ]
+        note = f"Near-duplicate of {reference}."
+        if changed_lines:
+            note += " Lines that differ (+ added, - removed):\n"
+            note += "\n".join(changed_lines)
+        return note
+
+    @classmethod
+    def get_fingerprint(cls, text: str) -> Optional[int]:
+        """Compute the SimHash of the text using word shingles"""
+
+        words = WORD_PATTERN.findall(text.lower())
+        if not words:
+            return None
+        if len(words) < DEF_SHINGLE_SIZE:
+            shingles = [" ".join(words)]
+        else:
+            shingles = [
+                " ".join(words[idx : idx + DEF_SHINGLE_SIZE])
+                for idx in range(len(words) - DEF_SHINGLE_SIZE + 1)
+            ]
+        weights = [0] * DEF_FINGERPRINT_BITS
+        for shingle in shingles:
+            digest = hashlib.blake2b(
+                shingle.encode("utf-8"), digest_size=DEF_FINGERPRINT_BITS // 8
+            ).digest()
+            shingle_hash = int.from_bytes(digest, "big")
+            for bit in range(DEF_FINGERPRINT_BITS):
+                if shingle_hash >> bit & 1:
+                    weights[bit] += 1
+                else:
+                    weights[bit] -= 1
+        fingerprint = 0
+        for bit, weight in enumerate(weights):
+            if weight > 0:
+                fingerprint |= 1 << bit
+        return fingerprint
+
+    @classmethod
+    def hamming_distance(cls, first: int, second: int) -> int:
+        return (first ^ second).bit_count()
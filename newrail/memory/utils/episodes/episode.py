@@ -1,6 +1,6 @@
 from datetime import datetime
 from pydantic import Field, PrivateAttr
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional
 from newrail.parser.loggable_base_model import LoggableBaseModel
 from newrail.parser.pydantic_parser import (
     get_format_instructions,
@@ -43,6 +43,9 @@ class Overview(LoggableBaseModel):
 
 
 class Episode(LoggableBaseModel):
+    # Allow the episode store to keep weak references to the interned episodes.
+    __slots__ = ("__weakref__",)
+
     content: str = Field(
         description="A summary which incorporate all crucial details including, but not limited to, relevant citations, names, links, and any other pertinent information."
     )
@@ -54,7 +57,14 @@ class Episode(LoggableBaseModel):
     _action: str = PrivateAttr(default="")
     _uuid: Optional[str] = PrivateAttr(default=None)
     _child_episodes: List["Episode"] = PrivateAttr(default=[])
+    # Child episodes which are not loaded yet, resolved by the loader when needed.
+    _child_episodes_uuid: List[str] = PrivateAttr(default=[])
+    _child_loader: Optional[Callable[[str], Optional["Episode"]]] = PrivateAttr(
+        default=None
+    )
     _order: int = PrivateAttr(default=0)
+    # Key used by the episode store when the episode has no uuid.
+    _local_key: Optional[str] = PrivateAttr(default=None)
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -63,6 +73,36 @@ class Episode(LoggableBaseModel):
     def add_child_episodes(self, episodes: List["Episode"]):
         self._child_episodes.extend(episodes)
 
+    def add_child_episodes_uuid(
+        self,
+        episodes_uuid: List[str],
+        loader: Callable[[str], Optional["Episode"]],
+    ):
+        """Reference child episodes which are loaded only when they are needed"""
+
+        self._child_episodes_uuid.extend(episodes_uuid)
+        self._child_loader = loader
+
+    def get_child_episodes(self) -> List["Episode"]:
+        """Get the child episodes, loading them if needed"""
+
+        if self._child_episodes_uuid and self._child_loader:
+            for episode_uuid in self._child_episodes_uuid:
+                episode = self._child_loader(episode_uuid)
+                if episode:
+                    self._child_episodes.append(episode)
+            self._child_episodes_uuid = []
+            self._child_loader = None
+        return self._child_episodes
+
+    def get_loaded_child_episodes(self) -> List["Episode"]:
+        return self._child_episodes
+
+    def get_child_episodes_uuid(self) -> List[str]:
+        """Get the uuid of the child episodes which are not loaded yet"""
+
+        return self._child_episodes_uuid
+
     def link_to_uuid(self, uuid):
         self._uuid = uuid
 
@@ -76,9 +116,15 @@ class Episode(LoggableBaseModel):
     def get_uuid(self):
         return self._uuid
 
+    def get_key(self) -> Optional[str]:
+        return self._uuid or self._local_key
+
+    def set_local_key(self, key: str):
+        self._local_key = key
+
     def get_description(self, include_child_episodes=False):
         description = f"- {self._creation_time}: Overview: {self.overview}\nContent: {self.content}"
-        if self._child_episodes and include_child_episodes:
+        if include_child_episodes and self.get_child_episodes():
             child_episodes_overview = "\n".join(
                 [
                     indent(text=episode.get_overview())
@@ -101,7 +147,24 @@ class Episode(LoggableBaseModel):
             "capability": self._capability,
             "action": self._action,
             "uuid": self._uuid,
-            "child_episodes": [episode.to_dict() for episode in self._child_episodes],
+            "child_episodes": [
+                episode.to_dict() for episode in self.get_child_episodes()
+            ],
+            "order": self._order,
+        }
+
+    def to_record(self, child_episodes_key: List[str]) -> Dict[str, Any]:
+        """Serialize the episode referencing its child episodes by key"""
+
+        return {
+            "key": self.get_key(),
+            "content": self.content,
+            "overview": self.overview,
+            "creation_time": self._creation_time,
+            "capability": self._capability,
+            "action": self._action,
+            "uuid": self._uuid,
+            "child_episodes": child_episodes_key,
             "order": self._order,
         }
 
@@ -110,18 +173,38 @@ class Episode(LoggableBaseModel):
         cls = Episode(
             content=data["content"],
             overview=data["overview"],
-            _creation_time=data["creation_time"],
-            _capability=data["capability"],
-            _action=data["action"],
-            _uuid=data["uuid"],
-            _child_episodes=[
-                Episode.from_dict(episode) for episode in data["child_episodes"]
-            ],
-            _order=data["order"],
         )
+        # Private attributes are not populated by the constructor.
+        cls._creation_time = data["creation_time"]
+        cls.set_tool(capability=data["capability"], action=data["action"])
+        cls.add_child_episodes(
+            [Episode.from_dict(episode) for episode in data["child_episodes"]]
+        )
+        cls.set_order(data["order"])
         cls.link_to_uuid(data["uuid"])
         return cls
 
+    @classmethod
+    def from_record(
+        cls, record: Dict[str, Any], loader: Callable[[str], Optional["Episode"]]
+    ) -> "Episode":
+        """Deserialize an episode whose child episodes are loaded lazily"""
+
+        episode = Episode(
+            content=record["content"],
+            overview=record["overview"],
+        )
+        episode._creation_time = record["creation_time"]
+        episode.set_tool(capability=record["capability"], action=record["action"])
+        episode.add_child_episodes_uuid(
+            episodes_uuid=record["child_episodes"], loader=loader
+        )
+        episode.set_order(record["order"])
+        episode.link_to_uuid(record["uuid"])
+        if not record["uuid"]:
+            episode.set_local_key(record.get("key"))
+        return episode
+
     @classmethod
     def get_summarized_episode_prompt(
         cls,
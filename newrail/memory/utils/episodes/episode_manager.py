@@ -1,12 +1,19 @@
-from typing import Any, List, Optional, cast
+from typing import Any, List, Optional, Tuple, cast
 import spacy
 import subprocess
+import threading
+import uuid
 from spacy.util import get_package_path
 
 from newrail.config.config import Config
 from newrail.agent.behavior.execution import Execution
+from newrail.memory.long_term_memory.episode_write_queue import EpisodeWriteQueue
 from newrail.memory.long_term_memory.weaviate import WeaviateMemory
+from newrail.memory.utils.episodes.chunk_deduplicator import ChunkDeduplicator
 from newrail.memory.utils.episodes.episode import Episode, Overview
+from newrail.memory.utils.episodes.episode_store import EpisodeStore
+from newrail.memory.utils.episodes.episode_table import EpisodeTable
+from newrail.memory.utils.episodes.extractive_compressor import ExtractiveCompressor
 from newrail.memory.utils.tokens_manager import TokensManager
 from newrail.organization.utils.logger.agent_logger import AgentLogger
 from newrail.parser.chat_parser import ChatParser
@@ -15,6 +22,9 @@ from newrail.utils.token_counter import count_string_tokens
 
 # TODO: Compress episodes into meta-episode.
 class EpisodeManager(object):
+    _nlp = None
+    _nlp_lock = threading.Lock()
+
     def __init__(
         self,
         agent_id: str,
@@ -27,6 +37,10 @@ class EpisodeManager(object):
         self.id = agent_id
         self.team_id = team_id
         self.long_term_memory = WeaviateMemory()
+        self.write_queue = None
+        if Config().long_term_memory_write_behind:
+            self.write_queue = EpisodeWriteQueue.get_instance()
+            self.write_queue.start(store_batch=self.long_term_memory.store_episodes)
         self.logger = logger.create_logger("episode_manager")
         self.current_goal = current_goal
         self.last_episode = None
@@ -35,6 +49,12 @@ class EpisodeManager(object):
             model=model, tokens_percentage=tokens_percentage
         )
         self.model = model
+        self.deduplicator = ChunkDeduplicator() if Config().episodes_dedup else None
+        self.compressor = (
+            ExtractiveCompressor()
+            if Config().episodes_extractive_compression
+            else None
+        )
 
     def add_episode(self, episode: Episode) -> None:
         """Add a new episode"""
@@ -53,6 +73,7 @@ class EpisodeManager(object):
         execution: Execution,
         observation: str,
         should_summarize: bool = True,
+        question: Optional[str] = None,
     ) -> None:
         """Create a list of new episode based on the given operations"""
 
@@ -70,6 +91,16 @@ class EpisodeManager(object):
             chunk_max_tokens = (
                 self.get_model_tokens() - max_content_tokens - max_overview_tokens - 100
             )
+            if self.compressor:
+                observation = self.compress_observation(
+                    observation=observation,
+                    question=question,
+                    max_tokens=self.get_compression_max_tokens(
+                        raw_prompt=episode_empty_prompt,
+                        command=execution.get_full_command(),
+                        chunk_max_tokens=chunk_max_tokens,
+                    ),
+                )
         else:
             episode_empty_prompt = Overview.get_raw_episode_prompt(
                 task_description=self.current_goal,
@@ -90,23 +121,31 @@ class EpisodeManager(object):
         )
         if len(chunks) == 0:
             return
+        if self.deduplicator:
+            chunks, notes = self.deduplicate_chunks(chunks=chunks)
+            if notes:
+                # What the near-duplicates changed is kept without calling the LLM.
+                self.create_repeated_episode(execution=execution, notes=notes)
+            if len(chunks) == 0:
+                return
         if len(chunks) == 1:
-            self.create_episode(
+            episode = self.create_episode(
                 execution=execution,
                 content=chunks[0],
                 should_summarize=should_summarize,
             )
+            self.set_chunk_reference(chunk=chunks[0], episode=episode)
             return
         for idx, chunk in enumerate(chunks):
             prefix_formatted = prefix.format(
                 n_episode=idx, total_episodes=len(chunks), action=execution.action
             )
-            chunk = prefix_formatted + chunk
-            self.create_episode(
+            episode = self.create_episode(
                 execution=execution,
-                content=chunk,
+                content=prefix_formatted + chunk,
                 should_summarize=should_summarize,
             )
+            self.set_chunk_reference(chunk=chunk, episode=episode)
 
     def create_episode(
         self,
@@ -175,6 +214,69 @@ class EpisodeManager(object):
         self.add_episode(episode=episode)
         return episode
 
+    def compress_observation(
+        self, observation: str, question: Optional[str], max_tokens: int
+    ) -> str:
+        """Keep the sentences of the observation most relevant to the goal and question"""
+
+        if not self.compressor or max_tokens <= 0:
+            return observation
+        sentences = self.get_sentences(text=observation)
+        query = self.current_goal
+        if question:
+            query += f"\n{question}"
+        selected_sentences = self.compressor.compress(
+            sentences=sentences, query=query, max_tokens=max_tokens
+        )
+        if len(selected_sentences) < len(sentences):
+            self.logger.log(
+                f"Extractive compression kept {len(selected_sentences)} of {len(sentences)} sentences."
+            )
+        return " ".join(selected_sentences)
+
+    def create_repeated_episode(
+        self, execution: Execution, notes: List[str]
+    ) -> Episode:
+        """Create an episode without calling the LLM for the near-duplicate chunks of an observation"""
+
+        episode = Episode(
+            content="\n".join(notes),
+            overview=f"Executed action: {execution.action}, the observation repeated previous content.",
+        )
+        episode.set_tool(capability=execution.get_capability(), action=execution.action)
+        episode.set_order(order=len(self.episodes))
+        self.save_episode(episode=episode)
+        self.add_episode(episode=episode)
+        return episode
+
+    def deduplicate_chunks(self, chunks: List[str]) -> Tuple[List[str], List[str]]:
+        """Collapse the chunks which are near-duplicates of the chunks seen recently for the same goal
+
+        Returns:
+            Tuple[List[str], List[str]]: The unique chunks and the notes of the collapsed ones.
+        """
+
+        if not self.deduplicator:
+            return chunks, []
+        self.deduplicator.set_goal(goal=self.current_goal)
+        unique_chunks, notes, saved_tokens = self.deduplicator.deduplicate(
+            chunks=chunks
+        )
+        if notes:
+            self.logger.log(
+                f"Collapsed {len(notes)} of {len(chunks)} near-duplicate chunks, saved {saved_tokens} tokens ({self.deduplicator.saved_tokens} tokens saved in total)."
+            )
+        return unique_chunks, notes
+
+    def set_chunk_reference(self, chunk: str, episode: Optional[Episode]) -> None:
+        """Refer the later near-duplicates of the chunk to its episode"""
+
+        if self.deduplicator and episode:
+            self.deduplicator.set_reference(
+                chunk=chunk,
+                reference=f"episode {episode.get_uuid()} ({episode.overview})",
+            )
+
     def create_meta_episode(
         self,
         question: Optional[str] = None,
@@ -251,12 +353,12 @@ class EpisodeManager(object):
             if episode_uuid:
                 episodes_uuid.append(episode_uuid)
         if meta_episode:
+            meta_episode.set_order(order=0)
+            meta_episode.add_child_episodes(episodes=self.episodes)
             self.save_episode(
                 episode=meta_episode,
                 child_episodes_uuid=episodes_uuid,
             )
-            meta_episode.set_order(order=0)
-            meta_episode.add_child_episodes(episodes=self.episodes)
             return meta_episode
         return None
 
@@ -305,6 +407,21 @@ class EpisodeManager(object):
             max_tokens=self.max_token_threshold,
         )
 
+    def get_compression_max_tokens(
+        self, raw_prompt: str, command: str, chunk_max_tokens: int
+    ) -> int:
+        """Get the tokens budget of the extractive compression"""
+
+        if Config().episodes_extractive_max_tokens > 0:
+            return Config().episodes_extractive_max_tokens
+        # Fit the observation in a single chunk.
+        return (
+            chunk_max_tokens
+            - count_string_tokens(string=raw_prompt, model_name=self.model)
+            - count_string_tokens(string=command, model_name=self.model)
+            - 10
+        )
+
     def get_model_tokens(self) -> int:
         """Get the tokens count of the model"""
 
@@ -318,16 +435,24 @@ class EpisodeManager(object):
 
         return count_string_tokens(episodes_str)
 
-    def to_dict(self) -> dict[str, Any]:
-        """Buffer to dict"""
+    def to_dict(self, episode_table: Optional[EpisodeTable] = None) -> dict[str, Any]:
+        """Buffer to dict, referencing the episodes by key when a table is provided"""
 
+        if episode_table:
+            last_episode = (
+                episode_table.add(self.last_episode) if self.last_episode else None
+            )
+            episodes = [episode_table.add(episode) for episode in self.episodes]
+        else:
+            last_episode = self.last_episode.to_dict() if self.last_episode else None
+            episodes = [episode.to_dict() for episode in self.episodes]
         return {
             "agent_id": self.id,
             "team_id": self.team_id,
             "model": self.model,
             "current_goal": self.current_goal,
-            "last_episode": self.last_episode.to_dict() if self.last_episode else None,
-            "episodes": [episode.to_dict() for episode in self.episodes],
+            "last_episode": last_episode,
+            "episodes": episodes,
         }
 
     def set_current_goal(self, current_goal: str) -> None:
@@ -336,7 +461,7 @@ class EpisodeManager(object):
         self.current_goal = current_goal
 
     @classmethod
-    def from_dict(cls, data, logger):
+    def from_dict(cls, data, logger, episode_table: Optional[EpisodeTable] = None):
         episode_manager = cls(
             agent_id=data["agent_id"],
             team_id=data["team_id"],
@@ -344,11 +469,16 @@ class EpisodeManager(object):
             model=data["model"],
             current_goal=data["current_goal"],
         )
+        if episode_table:
+            get_episode = episode_table.get
+        else:
+            get_episode = Episode.from_dict
         if data["last_episode"]:
-            episode_manager.last_episode = Episode.from_dict(data=data["last_episode"])
+            episode_manager.last_episode = get_episode(data["last_episode"])
         for episode_data in data["episodes"]:
-            episode = Episode.from_dict(data=episode_data)
-            episode_manager.episodes.append(episode)
+            episode = get_episode(episode_data)
+            if episode:
+                episode_manager.episodes.append(episode)
         return episode_manager
 
     def save_episode(
@@ -359,17 +489,34 @@ class EpisodeManager(object):
         """Add episode to long term memory"""
 
         self.logger.log(f"Adding episode: {episode.get_description()}")
-        episode_uuid = self.long_term_memory.store_episode(
-            agent_uuid=self.id,
-            team_uuid=self.team_id,
-            overview=episode.overview,
-            content=episode.content,
-            capability=episode._capability,
-            action=episode._action,
-            created_at=episode._creation_time,
-            child_episodes_uuid=child_episodes_uuid,
-        )
+        if self.write_queue:
+            episode_uuid = str(uuid.uuid4())
+            self.write_queue.put(
+                record={
+                    "uuid": episode_uuid,
+                    "agent_uuid": self.id,
+                    "team_uuid": self.team_id,
+                    "overview": episode.overview,
+                    "content": episode.content,
+                    "capability": episode._capability,
+                    "action": episode._action,
+                    "created_at": episode._creation_time,
+                    "child_episodes_uuid": list(child_episodes_uuid),
+                }
+            )
+        else:
+            episode_uuid = self.long_term_memory.store_episode(
+                agent_uuid=self.id,
+                team_uuid=self.team_id,
+                overview=episode.overview,
+                content=episode.content,
+                capability=episode._capability,
+                action=episode._action,
+                created_at=episode._creation_time,
+                child_episodes_uuid=child_episodes_uuid,
+            )
         episode.link_to_uuid(uuid=episode_uuid)
+        EpisodeStore.get_store(agent_id=self.id).add(episode=episode)
 
     def preprocess_text(
         self,
@@ -380,23 +527,7 @@ class EpisodeManager(object):
     ) -> List[str]:
         """Preprocess text"""
 
-        model_name = Config().browse_spacy_language_model
-        try:
-            model_path = get_package_path(model_name)
-        except Exception:
-            model_path = None
-
-        if model_path is None:
-            # Install the model if it's not available
-            print(f"{model_name} is not installed. Installing now...")
-            subprocess.check_call(["python", "-m", "spacy", "download", model_name])
-        try:
-            nlp = spacy.load(model_name)
-        except Exception:
-            raise Exception(f"Failed to load the spacy model: {model_name}")
-        nlp.add_pipe("sentencizer")
-        doc = nlp(text)
-        sentences = [sent.text for sent in doc.sents]
+        sentences = self.get_sentences(text=text)
 
         sentences_length = 0
         for sentence in sentences:
@@ -423,6 +554,38 @@ class EpisodeManager(object):
         self.logger.log(f"Number of chunks: {len(chunks)}")
         return chunks
 
+    @classmethod
+    def get_nlp(cls):
+        """Get the spacy pipeline, loading it only once"""
+
+        with cls._nlp_lock:
+            if cls._nlp is None:
+                model_name = Config().browse_spacy_language_model
+                try:
+                    model_path = get_package_path(model_name)
+                except Exception:
+                    model_path = None
+
+                if model_path is None:
+                    # Install the model if it's not available
+                    print(f"{model_name} is not installed. Installing now...")
+                    subprocess.check_call(
+                        ["python", "-m", "spacy", "download", model_name]
+                    )
+                try:
+                    nlp = spacy.load(model_name)
+                except Exception:
+                    raise Exception(f"Failed to load the spacy model: {model_name}")
+                nlp.add_pipe("sentencizer")
+                cls._nlp = nlp
+            return cls._nlp
+
+    def get_sentences(self, text: str) -> List[str]:
+        """Split the text into sentences"""
+
+        doc = self.get_nlp()(text)
+        return [sent.text for sent in doc.sents]
+
     def get_tokens(self, text: str, max_tokens: int):
         """Get words from text"""
         words = text.split()
@@ -0,0 +1,198 @@
+import threading
+from typing import Any, Dict, List, Optional, Set
+import uuid
+from weakref import WeakValueDictionary
+
+from newrail.memory.utils.episodes.episode import Episode
+
+
+class EpisodeRecord:
+    """Data of a single episode, child episodes are referenced by key"""
+
+    __slots__ = (
+        "key",
+        "uuid",
+        "overview",
+        "content",
+        "creation_time",
+        "capability",
+        "action",
+        "child_episodes",
+        "order",
+    )
+
+    def __init__(
+        self,
+        key: str,
+        uuid: Optional[str],
+        overview: str,
+        content: str,
+        creation_time: str,
+        capability: str,
+        action: str,
+        child_episodes: List[str],
+        order: int,
+    ):
+        self.key = key
+        self.uuid = uuid
+        self.overview = overview
+        self.content = content
+        self.creation_time = creation_time
+        self.capability = capability
+        self.action = action
+        self.child_episodes = tuple(child_episodes)
+        self.order = order
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "uuid": self.uuid,
+            "overview": self.overview,
+            "content": self.content,
+            "creation_time": self.creation_time,
+            "capability": self.capability,
+            "action": self.action,
+            "child_episodes": list(self.child_episodes),
+            "order": self.order,
+        }
+
+    @classmethod
+    def from_dict(cls, key: str, data: Dict[str, Any]) -> "EpisodeRecord":
+        return cls(
+            key=key,
+            uuid=data["uuid"],
+            overview=data["overview"],
+            content=data["content"],
+            creation_time=data["creation_time"],
+            capability=data["capability"],
+            action=data["action"],
+            child_episodes=data["child_episodes"],
+            order=data["order"],
+        )
+
+
+class EpisodeStore:
+    """
+    Per-agent registry which keeps each episode once.
+
+    Records are kept in an array indexed by key (the uuid of the episode) and by insertion
+    order. Episode instances are interned, all the structures holding an episode share the
+    same instance, and child episodes are referenced by key and resolved through the store.
+    """
+
+    _stores: Dict[str, "EpisodeStore"] = {}
+    _stores_lock = threading.Lock()
+
+    def __init__(self):
+        self.records: List[EpisodeRecord] = []
+        self.index: Dict[str, int] = {}
+        self.episodes: "WeakValueDictionary[str, Episode]" = WeakValueDictionary()
+        self.lock = threading.RLock()
+
+    @classmethod
+    def get_store(cls, agent_id: str) -> "EpisodeStore":
+        """Get the store of an agent"""
+
+        with cls._stores_lock:
+            store = cls._stores.get(agent_id)
+            if store is None:
+                store = cls()
+                cls._stores[agent_id] = store
+            return store
+
+    @classmethod
+    def remove_store(cls, agent_id: str) -> None:
+        with cls._stores_lock:
+            cls._stores.pop(agent_id, None)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, episode: Episode) -> Episode:
+        """Intern an episode and its child episodes, returning the shared instance"""
+
+        with self.lock:
+            key = self.get_key(episode=episode)
+            interned_episode = self.episodes.get(key)
+            if interned_episode is not None:
+                return interned_episode
+            child_episodes = [
+                self.add(episode=child_episode)
+                for child_episode in episode.get_loaded_child_episodes()
+            ]
+            # Share the interned child episodes.
+            episode.get_loaded_child_episodes()[:] = child_episodes
+            if key not in self.index:
+                child_episodes_key = [
+                    self.get_key(episode=child_episode)
+                    for child_episode in child_episodes
+                ] + list(episode.get_child_episodes_uuid())
+                self.add_record(
+                    record=EpisodeRecord.from_dict(
+                        key=key,
+                        data=episode.to_record(child_episodes_key=child_episodes_key),
+                    )
+                )
+            self.episodes[key] = episode
+            return episode
+
+    def add_record(self, record: EpisodeRecord) -> None:
+        with self.lock:
+            if record.key in self.index:
+                return
+            self.index[record.key] = len(self.records)
+            self.records.append(record)
+
+    def get(self, key: str) -> Optional[Episode]:
+        """Get the shared instance of an episode, child episodes are loaded lazily"""
+
+        with self.lock:
+            episode = self.episodes.get(key)
+            if episode is None:
+                record = self.get_record(key=key)
+                if record is None:
+                    return None
+                episode = Episode.from_record(record=record.to_dict(), loader=self.get)
+                self.episodes[key] = episode
+            return episode
+
+    def get_by_order(self, order: int) -> Optional[Episode]:
+        """Get an episode by insertion order"""
+
+        with self.lock:
+            if order >= len(self.records):
+                return None
+            return self.get(key=self.records[order].key)
+
+    def get_key(self, episode: Episode) -> str:
+        key = episode.get_key()
+        if not key:
+            # Episodes which are not stored on long term memory get a local key.
+            key = f"local-{uuid.uuid4()}"
+            episode.set_local_key(key)
+        return key
+
+    def get_record(self, key: str) -> Optional[EpisodeRecord]:
+        with self.lock:
+            idx = self.index.get(key)
+            if idx is None:
+                return None
+            return self.records[idx]
+
+    def retain(self, keys: Set[str]) -> None:
+        """Drop the records which are not reachable from keys or from an episode in use"""
+
+        with self.lock:
+            pending = list(keys) + list(self.episodes.keys())
+            reachable: Set[str] = set()
+            while pending:
+                key = pending.pop()
+                if key in reachable or key not in self.index:
+                    continue
+                reachable.add(key)
+                pending.extend(self.records[self.index[key]].child_episodes)
+            self.records = [record for record in self.records if record.key in reachable]
+            self.index = {record.key: idx for idx, record in enumerate(self.records)}
@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Optional, Set
+
+from newrail.memory.utils.episodes.episode import Episode
+from newrail.memory.utils.episodes.episode_store import EpisodeRecord, EpisodeStore
+
+
+class EpisodeTable:
+    """
+    Serialized episodes, each one stored once keyed by uuid.
+
+    Episodes reference their child episodes by key instead of inlining them, and episodes
+    loaded from the table resolve their child episodes lazily. The table tracks which
+    episodes of the store are persisted, the records themselves live in the store.
+    Episodes are assumed to be immutable once they are added to the table.
+    """
+
+    def __init__(
+        self,
+        records: Optional[Dict[str, Dict[str, Any]]] = None,
+        store: Optional[EpisodeStore] = None,
+    ):
+        self.store = store if store is not None else EpisodeStore()
+        self.keys: Set[str] = set()
+        self.new_keys: List[str] = []
+        self.roots: Set[str] = set()
+        if records:
+            self.update(records=records)
+
+    @property
+    def records(self) -> Dict[str, Dict[str, Any]]:
+        return self.get_records(keys=self.keys)
+
+    def add(self, episode: Episode) -> str:
+        """Add an episode and its child episodes, returning its key"""
+
+        key = self.store.get_key(episode=episode)
+        if key not in self.keys:
+            if any(
+                episode_uuid not in self.store
+                for episode_uuid in episode.get_child_episodes_uuid()
+            ):
+                # Child episodes from a different source, load them to keep them in the table.
+                episode.get_child_episodes()
+            self.store.add(episode=episode)
+            self.add_key(key=key)
+        self.roots.add(key)
+        return key
+
+    def add_key(self, key: str) -> None:
+        pending = [key]
+        while pending:
+            key = pending.pop()
+            record = self.store.get_record(key=key)
+            if key in self.keys or record is None:
+                continue
+            self.keys.add(key)
+            self.new_keys.append(key)
+            pending.extend(record.child_episodes)
+
+    def get(self, key: str) -> Optional[Episode]:
+        """Get an episode, deserializing it when it is needed for the first time"""
+
+        return self.store.get(key=key)
+
+    def get_records(self, keys) -> Dict[str, Dict[str, Any]]:
+        records = {}
+        for key in keys:
+            record = self.store.get_record(key=key)
+            if record:
+                records[key] = record.to_dict()
+        return records
+
+    def pop_new_records(self) -> Dict[str, Dict[str, Any]]:
+        """Get the records added since the previous call"""
+
+        new_records = self.get_records(keys=self.new_keys)
+        self.new_keys = []
+        return new_records
+
+    def update(self, records: Dict[str, Dict[str, Any]]) -> None:
+        for key, data in records.items():
+            self.store.add_record(record=EpisodeRecord.from_dict(key=key, data=data))
+            self.keys.add(key)
+
+    def compact(self) -> None:
+        """Keep only the roots added since the previous compaction and their descendants"""
+
+        reachable: Set[str] = set()
+        pending = list(self.roots)
+        while pending:
+            key = pending.pop()
+            record = self.store.get_record(key=key)
+            if key in reachable or record is None:
+                continue
+            reachable.add(key)
+            pending.extend(record.child_episodes)
+        self.keys = reachable
+        self.new_keys = []
+        self.roots = set()
@@ -0,0 +1,58 @@
+from typing import List
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from newrail.utils.token_counter import count_string_tokens
+
+
+DEF_CENTRALITY_WEIGHT = 0.3
+
+
+class ExtractiveCompressor:
+    """
+    Keeps the most valuable sentences of a text up to a token budget without calling the LLM.
+
+    Sentences are scored with TF-IDF by their similarity to the query (goal and question)
+    plus their similarity to the whole text, which keeps the central sentences when the
+    query is not informative. Selected sentences keep their original order.
+    """
+
+    def __init__(self, centrality_weight: float = DEF_CENTRALITY_WEIGHT):
+        self.centrality_weight = centrality_weight
+
+    def compress(self, sentences: List[str], query: str, max_tokens: int) -> List[str]:
+        """Select the highest scored sentences that fit in max_tokens"""
+
+        sentences_tokens = [count_string_tokens(sentence) for sentence in sentences]
+        if sum(sentences_tokens) <= max_tokens:
+            return sentences
+        scores = self.score_sentences(sentences=sentences, query=query)
+        ranking = sorted(range(len(sentences)), key=lambda idx: scores[idx], reverse=True)
+        selected = set()
+        used_tokens = 0
+        for idx in ranking:
+            if used_tokens + sentences_tokens[idx] > max_tokens:
+                continue
+            selected.add(idx)
+            used_tokens += sentences_tokens[idx]
+        return [sentence for idx, sentence in enumerate(sentences) if idx in selected]
+
+    def score_sentences(self, sentences: List[str], query: str) -> List[float]:
+        """Score each sentence by relevance to the query and centrality in the text"""
+
+        vectorizer = TfidfVectorizer(stop_words="english")
+        try:
+            matrix = vectorizer.fit_transform(sentences + [query])
+        except ValueError:
+            # Empty vocabulary, nothing to rank.
+            return [0.0] * len(sentences)
+        sentences_matrix = matrix[:-1]
+        relevance = (sentences_matrix @ matrix[-1].T).toarray().ravel()
+        centroid = np.asarray(sentences_matrix.mean(axis=0)).ravel()
+        centroid_norm = np.linalg.norm(centroid)
+        if centroid_norm > 0:
+            centrality = sentences_matrix @ (centroid / centroid_norm)
+        else:
+            centrality = np.zeros(len(sentences))
+        return list(relevance + self.centrality_weight * np.asarray(centrality).ravel())
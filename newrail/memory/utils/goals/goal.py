@@ -52,10 +52,11 @@ class Goal(LoggableBaseModel):
 
     @classmethod
     def from_dict(cls, data):
-        return cls(
+        goal = cls(
             description=data["description"],
             capability=data["capability"],
             action=data["action"],
             validation_condition=data["validation_condition"],
-            _status=data["status"],
         )
+        goal.update_status(status=GoalStatus[data["status"]])
+        return goal
@@ -2,6 +2,7 @@ from typing import Any, List, Optional
 
 from newrail.memory.utils.episodes.episode import Episode
 from newrail.memory.utils.episodes.episode_manager import EpisodeManager
+from newrail.memory.utils.episodes.episode_table import EpisodeTable
 from newrail.memory.utils.goals.goal import Goal
 from newrail.config.config import Config
 from newrail.organization.utils.logger.agent_logger import AgentLogger
@@ -88,20 +89,23 @@ class GoalMemory:
     def on_goal_finished(self) -> None:
         self.goals.pop(0)
 
-    def to_dict(self) -> dict[str, Any]:
+    def to_dict(self, episode_table: Optional[EpisodeTable] = None) -> dict[str, Any]:
         """Goal memory to dict"""
 
         return {
             "agent_id": self.agent_id,
             "team_id": self.team_id,
             "goals": [goal.to_dict() for goal in self.goals],
-            "episode_manager": self.episode_manager.to_dict(),
+            "evaluation": self.evaluation,
+            "episode_manager": self.episode_manager.to_dict(
+                episode_table=episode_table
+            ),
             "max_iterations": self.max_iterations,
             "iterations": self.iterations,
         }
 
     @classmethod
-    def from_dict(cls, data, logger):
+    def from_dict(cls, data, logger, episode_table: Optional[EpisodeTable] = None):
         goal_memory = cls(
             agent_id=data["agent_id"],
             team_id=data["team_id"],
@@ -112,7 +116,7 @@ class GoalMemory:
         for goal in data["goals"]:
             goal_memory.goals.append(Goal.from_dict(data=goal))
         goal_memory.episode_manager = EpisodeManager.from_dict(
-            data=data["episode_manager"], logger=logger
+            data=data["episode_manager"], logger=logger, episode_table=episode_table
         )
         goal_memory.iterations = data["iterations"]
         return goal_memory
@@ -1,4 +1,6 @@
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import Dict, List, Optional, Union
 from threading import RLock
 
 
@@ -7,12 +9,16 @@ from newrail.agent.config.config import AgentConfig
 from newrail.agent.config.stage import Stage
 from newrail.agent.config.status import Status
 from newrail.capabilities.utils.builder import CapabilityBuilder
+from newrail.config.config import Config
 from newrail.memory.long_term_memory.weaviate import WeaviateMemory
 from newrail.organization.utils.logger.org_logger import OrgLogger
 from newrail.organization.organization_config import OrganizationConfig
 from newrail.organization.team.team import Team
 from newrail.organization.team.team_config import TeamConfig
+from newrail.organization.utils.agent_worker_pool import AgentProxy, AgentWorkerPool
+from newrail.organization.utils.metrics import MetricsDumper, MetricsServer
 from newrail.organization.utils.orchestrator import Orchestrator
+from newrail.organization.utils.orchestrator_checkpoint import OrchestratorCheckpoint
 from newrail.utils.storage import get_org_folder
 
 
@@ -24,23 +30,52 @@ class Organization:
             organization_folder=self.organization_config.folder,
             process_name="main",
         )
-        self._agents: Dict[str, Agent] = {}
+        self._agents: Dict[str, Union[Agent, AgentProxy]] = {}
         self._agents_lock = RLock()
         self._teams: Dict[str, Team] = {}
         self._teams_lock = RLock()
         self.long_term_memory = (
             WeaviateMemory()
         )  # Access to long term memory to manage org operations
+        checkpoint = None
+        if Config().orchestrator_checkpoint_interval > 0:
+            checkpoint = OrchestratorCheckpoint(
+                file_path=os.path.join(
+                    self.organization_config.folder, "orchestrator.checkpoint"
+                ),
+                interval=Config().orchestrator_checkpoint_interval,
+            )
         self.orchestator = Orchestrator(
             logger=self.organization_logger,
             max_concurrent_agents=organization_config.max_concurrent_agents,
+            async_steps=Config().async_agent_steps,
+            tokens_per_minute=Config().llm_tokens_per_minute,
+            fair_scheduling=Config().fair_team_scheduling,
+            step_timeout=Config().step_timeout,
+            cancel_grace_period=Config().step_cancel_grace_period,
+            checkpoint=checkpoint,
+            hibernate_after=Config().agent_hibernation_idle_time,
         )
         self._orchestator_lock = RLock()
+        # Run the agents in worker processes if enabled.
+        self.worker_pool = None
+        if Config().agent_worker_processes > 0:
+            self.worker_pool = AgentWorkerPool(logger=self.organization_logger)
+            self.worker_pool.start()
+        self.metrics_server: Optional[MetricsServer] = None
+        self.metrics_dumper: Optional[MetricsDumper] = None
 
         # Load capabilities.
         CapabilityBuilder.load_capabilities()
 
-    def add_agent(self, agent: Agent) -> None:
+    def build_agent(self, agent_config: AgentConfig) -> Union[Agent, AgentProxy]:
+        """Construct the agent, at a worker process if the organization uses them."""
+
+        if self.worker_pool:
+            return self.worker_pool.add_agent(agent_config=agent_config)
+        return Agent(agent_config=agent_config)
+
+    def add_agent(self, agent: Union[Agent, AgentProxy]) -> None:
         """Thread safe method to add an agent. Only entry point."""
 
         with self._agents_lock:
@@ -69,19 +104,44 @@ class Organization:
 
         with self._teams_lock:
             self._teams[team.cfg.name] = team
+        with self._orchestator_lock:
+            self.orchestator.set_team_weight(team.cfg.name, team.cfg.weight)
 
-    def add_existing_agent(self, agent_config: AgentConfig) -> Agent:
+    def add_existing_agent(
+        self, agent_config: AgentConfig
+    ) -> Union[Agent, AgentProxy]:
         """Method to add an existing agent to the organization."""
 
         self.organization_logger.log(
             f"Adding existing agent with name {agent_config.name}"
         )
-        agent = Agent(
-            agent_config=agent_config,
-        )
+        agent = self.build_agent(agent_config=agent_config)
         self.add_agent(agent)
         return agent
 
+    def add_existing_agents(
+        self, agent_configs: List[AgentConfig]
+    ) -> List[Union[Agent, AgentProxy]]:
+        """Method to add existing agents to the organization, constructing them in parallel."""
+
+        for agent_config in agent_configs:
+            self.organization_logger.log(
+                f"Adding existing agent with name {agent_config.name}"
+            )
+        with ThreadPoolExecutor(
+            max_workers=Config().organization_load_workers
+        ) as executor:
+            agents = list(
+                executor.map(
+                    lambda agent_config: self.build_agent(agent_config=agent_config),
+                    agent_configs,
+                )
+            )
+        # Add them in order so the organization doesn't depend on construction times.
+        for agent in agents:
+            self.add_agent(agent)
+        return agents
+
     def add_existing_team(self, team_config: TeamConfig) -> Team:
         """Method to add an existing team to the organization."""
 
@@ -112,7 +172,7 @@ class Organization:
         status: str,
         supervisor_id: Optional[str] = None,
         supervisor_name: Optional[str] = None,
-    ) -> Agent:
+    ) -> Union[Agent, AgentProxy]:
         """Method to create agent an agent from scratch."""
 
         self.long_term_memory.create_agent(agent_name=name, agent_id=id)
@@ -132,9 +192,7 @@ class Organization:
             stage=Stage[stage],
             status=Status[status],
         )
-        new_agent = Agent(
-            agent_config=agent_config,
-        )
+        new_agent = self.build_agent(agent_config=agent_config)
         self.organization_logger.log(
             f"New agent created with name: {new_agent.cfg.name}",
             should_print=True,
@@ -155,6 +213,7 @@ class Organization:
         lead_agent_name: str,
         supervisor_id: str,
         supervisor_name: str,
+        weight: float = 1.0,
     ) -> Team:
         self.long_term_memory.create_team(team_name=name, team_id=id)
         team_config = TeamConfig(
@@ -168,6 +227,7 @@ class Organization:
             lead_agent_name=lead_agent_name,
             supervisor_id=supervisor_id,
             supervisor_name=supervisor_name,
+            weight=weight,
         )
         new_team = Team(
             organization_name=self.organization_config.organization_name,
@@ -197,4 +257,24 @@ class Organization:
 
     def run(self, max_iterations: int) -> None:
         with self._orchestator_lock:
+            self.start_metrics()
             self.orchestator.start(max_iterations=max_iterations)
+
+    def start_metrics(self) -> None:
+        """Serve and dump the metrics of the orchestrator, if enabled."""
+
+        if Config().metrics_port and not self.metrics_server:
+            self.metrics_server = MetricsServer(
+                registry=self.orchestator.metrics, port=Config().metrics_port
+            )
+            self.metrics_server.start()
+            self.organization_logger.log(
+                f"Serving metrics at http://127.0.0.1:{self.metrics_server.port}/metrics"
+            )
+        if Config().metrics_dump_interval > 0 and not self.metrics_dumper:
+            self.metrics_dumper = MetricsDumper(
+                registry=self.orchestator.metrics,
+                path=os.path.join(self.organization_config.folder, "metrics.jsonl"),
+                interval=Config().metrics_dump_interval,
+            )
+            self.metrics_dumper.start()
@@ -5,6 +5,7 @@ from threading import RLock
 from typing import Optional, List
 
 from newrail.utils.storage import get_org_folder
+from newrail.utils.unit_of_work import UnitOfWork
 
 
 class TeamConfig(object):
@@ -20,6 +21,7 @@ class TeamConfig(object):
         lead_agent_name: str,
         supervisor_id: str,
         supervisor_name: str,
+        weight: float = 1.0,
     ):
         self.created_by_user_id = created_by_user_id
         self.id = id
@@ -31,6 +33,8 @@ class TeamConfig(object):
         self.lead_agent_name = lead_agent_name
         self.supervisor_id = supervisor_id
         self.supervisor_name = supervisor_name
+        # Share of the execution of the organization relative to the other teams.
+        self.weight = weight
         self.names = []
         self.save()
 
@@ -71,6 +75,8 @@ class TeamConfig(object):
             return False
 
     def save(self) -> None:
+        if UnitOfWork.defer(key=self, write=self.save):
+            return
         config_file = self.get_config_file_path(self.folder)
         os.makedirs(os.path.dirname(config_file), exist_ok=True)
         with open(config_file, "w") as f:
@@ -88,6 +94,7 @@ class TeamConfig(object):
             "lead_agent_name": self.lead_agent_name,
             "supervisor_id": self.supervisor_id,
             "supervisor_name": self.supervisor_name,
+            "weight": self.weight,
         }
 
     @classmethod
@@ -103,4 +110,5 @@ class TeamConfig(object):
             lead_agent_name=data["lead_agent_name"],
             supervisor_id=data["supervisor_id"],
             supervisor_name=data["supervisor_name"],
+            weight=data.get("weight", 1.0),
         )
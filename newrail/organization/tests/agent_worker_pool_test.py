@@ -0,0 +1,157 @@
+import os
+import shutil
+import threading
+import unittest
+
+from newrail.agent.config.config import AgentConfig
+from newrail.agent.config.status import Status
+from newrail.organization.utils.agent_worker_pool import AgentWorkerPool
+from newrail.organization.utils.logger.logger import Logger
+from newrail.organization.utils.logger.org_logger import OrgLogger
+from newrail.utils.storage import get_org_folder
+
+
+ORGANIZATION_NAME = "test_agent_worker_pool"
+
+
+class FakeAgent:
+    def __init__(self, agent_folder):
+        self.cfg = AgentConfig.load(agent_folder)
+        self.steps = 0
+        self.updates = 0
+        self.wakeup_listeners = []
+
+    def add_wakeup_listener(self, listener):
+        self.wakeup_listeners.append(listener)
+
+    def step(self):
+        self.steps += 1
+        self.cfg.set_status(Status.WAITING)
+
+    def update(self):
+        self.updates += 1
+
+    def update_and_step(self):
+        self.update()
+        self.step()
+
+    def get_updates(self):
+        return self.updates
+
+    def get_steps(self):
+        return self.steps, os.getpid()
+
+    def receive_event(self):
+        self.cfg.set_status(Status.ACTIVE)
+        for listener in self.wakeup_listeners:
+            listener()
+
+    def crash(self):
+        os._exit(1)
+
+    def fail(self):
+        raise ValueError("Failed on purpose")
+
+    def delete(self):
+        return True
+
+
+def get_agent_config(name):
+    return AgentConfig(
+        created_by_user_id="user",
+        id=name,
+        name=name,
+        organization_id=ORGANIZATION_NAME,
+        organization_name=ORGANIZATION_NAME,
+        mission="Test the worker pool",
+        capabilities=[],
+        team_id="team",
+        team_name="team",
+        is_lead=False,
+        supervisor_id=None,
+        supervisor_name=None,
+        status=Status.ACTIVE,
+    )
+
+
+class TestAgentWorkerPool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        Logger(protagonist="TestAgentWorkerPool")
+        logger = OrgLogger(
+            organization_name=ORGANIZATION_NAME,
+            organization_folder=get_org_folder(ORGANIZATION_NAME),
+            process_name="main",
+        )
+        # Workers take a while to start, share them between the tests.
+        cls.pool = AgentWorkerPool(
+            logger=logger, num_workers=2, threads_per_worker=2, agent_builder=FakeAgent
+        )
+        cls.pool.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.stop()
+        shutil.rmtree(get_org_folder(ORGANIZATION_NAME), ignore_errors=True)
+
+    def setUp(self):
+        self.proxies = [
+            self.pool.add_agent(get_agent_config(f"{self._testMethodName}-{i}")) for i in range(4)
+        ]
+
+    def tearDown(self):
+        for proxy in self.proxies:
+            self.pool.remove_agent(proxy.cfg.name)
+
+    def test_agents_are_sharded_across_processes(self):
+        pids = set()
+        for proxy in self.proxies:
+            proxy.step()
+            steps, pid = proxy.call("get_steps")
+            self.assertEqual(steps, 1)
+            pids.add(pid)
+        self.assertEqual(len(pids), 2)
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_state_and_wakeups_are_synced(self):
+        proxy = self.proxies[0]
+        statuses = []
+        proxy.cfg.add_status_listener(statuses.append)
+        proxy.step()
+        self.assertEqual(proxy.cfg.get_status(), Status.WAITING)
+
+        woken_up = threading.Event()
+        proxy.add_wakeup_listener(woken_up.set)
+        proxy.call("receive_event")
+        self.assertTrue(woken_up.wait(timeout=5))
+        self.assertEqual(proxy.cfg.get_status(), Status.ACTIVE)
+        self.assertEqual(statuses, [Status.WAITING, Status.ACTIVE])
+
+    def test_updates_are_applied_by_the_step(self):
+        proxy = self.proxies[0]
+        proxy.step()
+        proxy.call("receive_event")
+        proxy.update()
+        self.assertEqual(proxy.call("get_updates"), 1)
+        proxy.step()
+        self.assertEqual(proxy.call("get_updates"), 2)
+
+    def test_errors_are_raised_at_the_caller(self):
+        with self.assertRaises(RuntimeError):
+            self.proxies[0].call("fail")
+        self.proxies[0].step()
+
+    def test_crashed_worker_is_restarted(self):
+        crashed = self.proxies[0]
+        _, pid = crashed.call("get_steps")
+        with self.assertRaises(RuntimeError):
+            crashed.call("crash")
+        steps, new_pid = crashed.call("get_steps")
+        self.assertEqual(steps, 0)
+        self.assertNotEqual(pid, new_pid)
+        for proxy in self.proxies[1:]:
+            proxy.step()
+
+
+if __name__ == "__main__":
+    unittest.main()
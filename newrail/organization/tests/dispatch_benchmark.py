@@ -0,0 +1,125 @@
+import argparse
+import os
+import tempfile
+import time
+
+from newrail.agent.config.stage import Stage
+from newrail.agent.config.status import Status
+from newrail.organization.utils.logger.logger import Logger
+from newrail.organization.utils.logger.org_logger import OrgLogger
+from newrail.organization.utils.orchestrator import Orchestrator
+
+
+class BenchmarkAgent:
+    def __init__(self, name, status=Status.ACTIVE):
+        self.cfg = self.Config(name, status)
+        self.steps = 0
+
+    class Config:
+        def __init__(self, name, status):
+            self.name = name
+            self.status = status
+            self.listeners = []
+
+        def get_status(self):
+            return self.status
+
+        def get_stage(self):
+            return Stage.PLANNING
+
+        def add_status_listener(self, listener):
+            self.listeners.append(listener)
+
+        def remove_status_listener(self, listener):
+            self.listeners.remove(listener)
+
+    def add_wakeup_listener(self, listener):
+        pass
+
+    def remove_wakeup_listener(self, listener):
+        pass
+
+    def update(self):
+        pass
+
+    def step(self):
+        self.steps += 1
+
+
+def create_orchestrator(folder, num_agents, max_concurrent_agents, status):
+    logger = OrgLogger(
+        organization_name="dispatch_benchmark",
+        organization_folder=folder,
+        process_name="benchmark",
+    )
+    orchestrator = Orchestrator(
+        logger=logger, max_concurrent_agents=max_concurrent_agents
+    )
+    agents = [BenchmarkAgent(f"Agent-{i}", status=status) for i in range(num_agents)]
+    for agent in agents:
+        orchestrator.add_agent(agent)
+        orchestrator.insert_agent(agent.cfg.name)
+    return orchestrator, agents
+
+
+def benchmark_dispatch_latency(folder, num_agents, max_concurrent_agents, duration):
+    """Average time between two dispatches of agents with instant steps"""
+
+    orchestrator, agents = create_orchestrator(
+        folder, num_agents, max_concurrent_agents, Status.ACTIVE
+    )
+    orchestrator.start()
+    time.sleep(duration)
+    orchestrator.stop()
+    steps = sum(agent.steps for agent in agents)
+    return duration / steps if steps else float("inf")
+
+
+def benchmark_idle_cpu(folder, num_agents, max_concurrent_agents, duration):
+    """Fraction of a CPU used by the orchestrator while all the agents are waiting"""
+
+    orchestrator, _ = create_orchestrator(
+        folder, num_agents, max_concurrent_agents, Status.WAITING
+    )
+    orchestrator.start()
+    # Measure once every agent was updated at start and went back to waiting.
+    while (
+        len(orchestrator.waiting_agents) < num_agents
+        or not orchestrator.queue.empty()
+    ):
+        time.sleep(0.01)
+    start_cpu = time.process_time()
+    time.sleep(duration)
+    cpu = time.process_time() - start_cpu
+    orchestrator.stop()
+    return cpu / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the orchestrator dispatch.")
+    parser.add_argument("--agents", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--max_concurrent_agents", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    Logger(protagonist="dispatch_benchmark")
+    with tempfile.TemporaryDirectory() as folder:
+        print("agents | dispatch latency (ms) | idle cpu (%)")
+        for num_agents in args.agents:
+            latency = benchmark_dispatch_latency(
+                os.path.join(folder, f"latency_{num_agents}"),
+                num_agents,
+                args.max_concurrent_agents,
+                args.duration,
+            )
+            idle_cpu = benchmark_idle_cpu(
+                os.path.join(folder, f"idle_{num_agents}"),
+                num_agents,
+                args.max_concurrent_agents,
+                args.duration,
+            )
+            print(f"{num_agents} | {latency * 1000:.3f} | {idle_cpu * 100:.1f}")
+
+
+if __name__ == "__main__":
+    main()
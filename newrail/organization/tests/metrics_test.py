@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+import unittest
+from urllib.request import urlopen
+
+from newrail.organization.utils.metrics import (
+    MetricsDumper,
+    MetricsRegistry,
+    MetricsServer,
+)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_metrics_are_identified_by_name_and_labels(self):
+        registry = MetricsRegistry()
+        registry.counter("iterations").inc()
+        registry.counter("iterations").inc(2)
+        registry.gauge("active_agents").set(3)
+        for value in range(1, 101):
+            registry.histogram("step_duration_seconds", stage="PLANNING").observe(value)
+        registry.histogram("step_duration_seconds", stage="EXECUTION").observe(5)
+
+        snapshot = registry.snapshot()
+        self.assertEqual(snapshot["iterations"]["total"], 3)
+        self.assertGreater(snapshot["iterations"]["rate"], 0)
+        self.assertEqual(snapshot["active_agents"], 3)
+        planning = snapshot["step_duration_seconds{stage=PLANNING}"]
+        self.assertEqual(planning["count"], 100)
+        self.assertEqual(planning["mean"], 50.5)
+        self.assertEqual(planning["p50"], 51)
+        self.assertEqual(planning["p99"], 100)
+        self.assertEqual(snapshot["step_duration_seconds{stage=EXECUTION}"]["count"], 1)
+
+    def test_metric_type_mismatch(self):
+        registry = MetricsRegistry()
+        registry.counter("iterations")
+        with self.assertRaises(ValueError):
+            registry.gauge("iterations")
+
+
+class TestMetricsExport(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.gauge("waiting_agents").set(7)
+
+    def test_server(self):
+        server = MetricsServer(self.registry, port=0)
+        server.start()
+        try:
+            with urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+                self.assertEqual(json.loads(response.read())["waiting_agents"], 7)
+        finally:
+            server.stop()
+
+    def test_dumper(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "metrics.jsonl")
+            dumper = MetricsDumper(self.registry, path=path, interval=0.05)
+            dumper.start()
+            dumper.stop()
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertGreaterEqual(len(lines), 1)
+            self.assertEqual(lines[-1]["metrics"]["waiting_agents"], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,23 @@
+import asyncio
+import math
 import random
 import os
+import shutil
+import threading
 import unittest
 import time
 
+from newrail.agent.config.stage import Stage
+from newrail.agent.config.status import Status
 from newrail.config.config import Config
 from newrail.organization.utils.logger.agent_logger import AgentLogger
+from newrail.organization.utils.logger.logger import Logger
+from newrail.organization.utils.logger.org_logger import OrgLogger
 from newrail.organization.utils.orchestrator import Orchestrator
+from newrail.organization.utils.orchestrator_checkpoint import OrchestratorCheckpoint
 from newrail.organization.utils.priority_queue import AgentPriorityQueue
+from newrail.utils.deadline import Deadline
+from newrail.utils.token_usage import TokenUsage
 
 
 class TestableOrchestrator(Orchestrator):
@@ -112,6 +123,464 @@ class TestOrchestrator(unittest.TestCase):
         self.orchestrator.stop()
 
 
+class StatusAgent:
+    def __init__(self, name, status):
+        self.cfg = self.Config(name, status)
+        self.steps = 0
+        self.updates = 0
+        self.events = 0
+        self.wakeup_listeners = []
+
+    class Config:
+        def __init__(self, name, status):
+            self.name = name
+            self.status = status
+            self.listeners = []
+
+        def get_status(self):
+            return self.status
+
+        def get_stage(self):
+            return Stage.PLANNING
+
+        def set_status(self, status):
+            self.status = status
+            for listener in self.listeners:
+                listener(status)
+
+        def add_status_listener(self, listener):
+            self.listeners.append(listener)
+
+        def remove_status_listener(self, listener):
+            self.listeners.remove(listener)
+
+    def add_wakeup_listener(self, listener):
+        self.wakeup_listeners.append(listener)
+
+    def remove_wakeup_listener(self, listener):
+        self.wakeup_listeners.remove(listener)
+
+    def receive_event(self):
+        self.events += 1
+        for listener in self.wakeup_listeners:
+            listener()
+
+    def update(self):
+        self.updates += 1
+        if self.events:
+            self.events = 0
+            self.cfg.set_status(Status.ACTIVE)
+
+    def step(self):
+        self.steps += 1
+        self.cfg.set_status(Status.WAITING)
+
+
+class OrchestratorTestCase(unittest.TestCase):
+    """Runs orchestrators with a temporary organization folder, stopped at teardown"""
+
+    def setUp(self):
+        name = type(self).__name__
+        Logger(protagonist=name)
+        self.logger = OrgLogger(
+            organization_name=name,
+            organization_folder=os.path.join(os.getcwd(), f"test_{name}"),
+            process_name="main",
+        )
+        self.orchestrators = []
+        self.agents = []
+
+    def tearDown(self):
+        for agent in self.agents:
+            if isinstance(agent, HangingAgent):
+                agent.release.set()
+        for orchestrator in self.orchestrators:
+            if orchestrator.main_thread:
+                orchestrator.stop()
+        shutil.rmtree(self.logger.organization_folder, ignore_errors=True)
+
+    def create_orchestrator(self, agents=(), **kwargs):
+        orchestrator = Orchestrator(self.logger, **kwargs)
+        self.orchestrators.append(orchestrator)
+        self.add_agents(agents, orchestrator=orchestrator)
+        return orchestrator
+
+    def add_agents(self, agents, orchestrator=None, **kwargs):
+        orchestrator = orchestrator or self.orchestrator
+        for agent in agents:
+            self.agents.append(agent)
+            orchestrator.add_agent(agent, **kwargs)
+            orchestrator.insert_agent(agent.cfg.name)
+
+    def wait_until(self, condition, timeout=2.0):
+        start_time = time.time()
+        while not condition() and time.time() - start_time < timeout:
+            time.sleep(0.01)
+        return condition()
+
+
+class TestOrchestratorDispatch(OrchestratorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.agent = StatusAgent("Agent-0", Status.WAITING)
+        self.orchestrator = self.create_orchestrator(
+            [self.agent], max_concurrent_agents=2
+        )
+        self.orchestrator.start()
+        self.wait_until(lambda: self.agent in self.orchestrator.waiting_agents)
+
+    def test_waiting_agent_is_dispatched_on_status_change(self):
+        self.assertEqual(self.agent.steps, 0)
+        self.assertIn(self.agent, self.orchestrator.waiting_agents)
+
+        self.agent.cfg.set_status(Status.ACTIVE)
+        self.assertTrue(self.wait_until(lambda: self.agent.steps == 1))
+
+        self.agent.cfg.set_status(Status.ACTIVE)
+        self.assertTrue(self.wait_until(lambda: self.agent.steps == 2))
+
+    def test_waiting_agent_is_only_updated_on_events(self):
+        updates = self.agent.updates
+        # Nothing to wait for, the agent must stay untouched for a while.
+        time.sleep(0.3)
+        self.assertEqual(self.agent.updates, updates)
+        self.assertEqual(self.agent.steps, 0)
+
+        self.agent.receive_event()
+        self.assertTrue(self.wait_until(lambda: self.agent.steps == 1))
+        self.assertEqual(self.agent.events, 0)
+
+    def test_metrics_are_recorded(self):
+        self.agent.cfg.set_status(Status.ACTIVE)
+        self.assertTrue(
+            self.wait_until(
+                lambda: self.orchestrator.metrics.snapshot().get("waiting_agents") == 1
+                and self.agent.steps == 1
+            )
+        )
+        metrics = self.orchestrator.metrics.snapshot()
+        self.assertEqual(metrics["step_duration_seconds{stage=PLANNING}"]["count"], 1)
+        self.assertGreaterEqual(metrics["queue_wait_seconds"]["count"], 1)
+        self.assertEqual(metrics["iterations"]["total"], 1)
+        self.assertEqual(metrics["active_agents"], 0)
+        self.assertEqual(metrics["waiting_agents"], 1)
+
+
+class AsyncStatusAgent(StatusAgent):
+    def __init__(self, name, status):
+        super().__init__(name, status)
+        self.step_threads = set()
+
+    async def astep(self):
+        self.step_threads.add(threading.get_ident())
+        await asyncio.sleep(0.2)
+        self.step()
+
+
+class TestOrchestratorAsyncSteps(OrchestratorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.async_agents = [
+            AsyncStatusAgent(f"Agent-{i}", Status.ACTIVE) for i in range(4)
+        ]
+        self.sync_agent = StatusAgent("Agent-sync", Status.ACTIVE)
+        self.orchestrator = self.create_orchestrator(
+            self.async_agents + [self.sync_agent],
+            max_concurrent_agents=4,
+            async_steps=True,
+        )
+
+    def test_steps_run_concurrently_on_the_loop(self):
+        start_time = time.time()
+        self.orchestrator.start()
+        self.wait_until(lambda: all(agent.steps for agent in self.agents))
+        # The four steps wait together, a thread per step is not needed.
+        self.assertLess(time.time() - start_time, 0.6)
+        step_threads = set.union(*[agent.step_threads for agent in self.async_agents])
+        self.assertEqual(step_threads, {self.orchestrator.loop_thread.ident})
+        # Agents without a coroutine step are run in a thread.
+        self.assertEqual(self.sync_agent.steps, 1)
+
+    def test_stop_waits_for_the_running_steps(self):
+        self.orchestrator.start()
+        self.wait_until(lambda: all(agent.step_threads for agent in self.async_agents))
+        self.orchestrator.stop()
+        self.assertTrue(all(agent.steps == 1 for agent in self.async_agents))
+        self.assertFalse(self.orchestrator.loop_thread.is_alive())
+
+
+class TokenAgent(StatusAgent):
+    def __init__(self, name, tokens):
+        super().__init__(name, Status.ACTIVE)
+        self.tokens = tokens
+        self.step_times = []
+
+    def step(self):
+        self.step_times.append(time.time())
+        TokenUsage.record(self.tokens)
+        super().step()
+
+
+class TestOrchestratorTokenBudget(OrchestratorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.orchestrator = self.create_orchestrator(
+            max_concurrent_agents=4, tokens_per_minute=1000
+        )
+        self.orchestrator.token_estimator.default_tokens = 600
+
+    def test_steps_wait_for_token_budget(self):
+        self.orchestrator.token_budget.WINDOW = 0.5
+        agents = [TokenAgent(f"Agent-{i}", 600) for i in range(2)]
+        self.add_agents(agents)
+        self.orchestrator.start()
+        self.assertTrue(self.wait_until(lambda: agents[0].steps or agents[1].steps))
+        # Both fit in the slots, but only one in the budget.
+        self.assertEqual(sum(agent.steps for agent in agents), 1)
+        self.assertTrue(self.wait_until(lambda: agents[0].steps and agents[1].steps))
+        step_times = sorted(agents[0].step_times + agents[1].step_times)
+        self.assertGreaterEqual(step_times[1] - step_times[0], 0.45)
+
+    def test_estimations_are_settled_with_the_used_tokens(self):
+        agents = [TokenAgent(f"Agent-{i}", 100) for i in range(3)]
+        self.add_agents(agents)
+        self.orchestrator.start()
+        self.wait_until(lambda: all(agent.steps for agent in agents), timeout=1.0)
+        # The first step used less than estimated, the rest fit in the budget.
+        self.assertTrue(all(agent.steps == 1 for agent in agents))
+        self.assertEqual(self.orchestrator.token_budget.used_tokens, 300)
+        self.assertEqual(
+            self.orchestrator.token_estimator.estimate("Agent-0", Stage.PLANNING), 100
+        )
+
+
+class TestOrchestratorFairScheduling(OrchestratorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.orchestrator = self.create_orchestrator(
+            max_concurrent_agents=1, fair_scheduling=True
+        )
+        self.orchestrator.set_team_weight("busy", 1)
+        self.orchestrator.set_team_weight("small", 1)
+
+    def test_busy_team_does_not_monopolize_the_slots(self):
+        for team_name, num_agents in (("busy", 6), ("small", 2)):
+            agents = [
+                StatusAgent(f"{team_name}-{i}", Status.ACTIVE)
+                for i in range(num_agents)
+            ]
+            for agent in agents:
+                agent.cfg.team_name = team_name
+            self.add_agents(agents, base_priority=1 if team_name == "busy" else 10)
+        self.orchestrator.start(max_iterations=5)
+        self.orchestrator.main_thread.join(timeout=2)
+        steps = {
+            team_name: sum(
+                agent.steps for agent in self.agents if agent.cfg.team_name == team_name
+            )
+            for team_name in ("busy", "small")
+        }
+        # By priority the busy team would take all of them.
+        self.assertEqual(steps["small"], 2)
+
+
+class HangingAgent(StatusAgent):
+    def __init__(self, name, checks_deadline):
+        super().__init__(name, Status.ACTIVE)
+        self.checks_deadline = checks_deadline
+        self.release = threading.Event()
+
+    def step(self):
+        self.steps += 1
+        while not self.release.wait(0.01):
+            if self.checks_deadline:
+                Deadline.check_current()
+
+
+class TestOrchestratorDeadlines(OrchestratorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.orchestrator = self.create_orchestrator(
+            max_concurrent_agents=1,
+            step_timeout=0.2,
+            cancel_grace_period=0.6,
+        )
+
+    def get_metric(self, name):
+        return self.orchestrator.metrics.snapshot().get(name, {}).get("total", 0)
+
+    def test_cancelled_step_is_queued_again(self):
+        agent = HangingAgent("Agent-0", checks_deadline=True)
+        self.add_agents([agent])
+        self.orchestrator.start()
+        self.assertTrue(
+            self.wait_until(
+                lambda: agent.steps >= 2 and self.get_metric("cancelled_steps") >= 1
+            )
+        )
+        self.assertEqual(self.get_metric("abandoned_steps"), 0)
+
+    def test_slot_of_a_hung_step_is_reclaimed(self):
+        hung_agent = HangingAgent("Agent-hung", checks_deadline=False)
+        other_agent = StatusAgent("Agent-other", Status.ACTIVE)
+        self.add_agents([hung_agent], base_priority=0)
+        self.add_agents([other_agent])
+        self.orchestrator.start()
+        self.assertTrue(
+            self.wait_until(
+                lambda: other_agent.steps == 1
+                and "Agent-hung" in self.orchestrator.abandoned_steps
+            )
+        )
+        # The only slot was reclaimed, the hung agent is parked until it returns.
+        self.assertEqual(hung_agent.steps, 1)
+        hung_agent.release.set()
+        self.assertTrue(
+            self.wait_until(
+                lambda: "Agent-hung" not in self.orchestrator.abandoned_steps
+                and hung_agent.steps >= 2
+            )
+        )
+
+
+class TestOrchestratorCheckpoint(OrchestratorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.file_path = os.path.join(
+            self.logger.organization_folder, "orchestrator.checkpoint"
+        )
+
+    def create_checkpointed_orchestrator(self, priorities):
+        checkpoint = OrchestratorCheckpoint(self.file_path, interval=0)
+        orchestrator = self.create_orchestrator(
+            max_concurrent_agents=1, checkpoint=checkpoint
+        )
+        for agent_name, priority in priorities.items():
+            agent = StatusAgent(agent_name, Status.ACTIVE)
+            self.add_agents([agent], orchestrator=orchestrator, base_priority=priority)
+        return orchestrator
+
+    def test_scheduling_is_resumed_from_the_checkpoint(self):
+        orchestrator = self.create_checkpointed_orchestrator(
+            {"Agent-0": 3, "Agent-1": 1, "Agent-2": 2}
+        )
+        orchestrator.iteration_count = 5
+        orchestrator.token_estimator.update("Agent-0", Stage.PLANNING, 100)
+        orchestrator.checkpoint.save(orchestrator.get_checkpoint_state())
+
+        # The agents of the previous run are added again with the default priority.
+        resumed = self.create_checkpointed_orchestrator(
+            {f"Agent-{i}": 1 for i in range(3)}
+        )
+        self.assertEqual(resumed.queue.get_names(), ["Agent-1", "Agent-2", "Agent-0"])
+        self.assertEqual(resumed.queue.get_names(), orchestrator.queue.get_names())
+        self.assertEqual(
+            resumed.last_execution_times, orchestrator.last_execution_times
+        )
+        self.assertEqual(resumed.agents["Agent-0"][0], 3)
+        self.assertEqual(resumed.iteration_count, 5)
+        self.assertEqual(
+            resumed.token_estimator.estimate("Agent-0", Stage.PLANNING), 100
+        )
+        self.assertEqual(resumed.restored_agents, {})
+
+    def test_iteration_count_of_an_interrupted_run_is_kept(self):
+        orchestrator = self.create_checkpointed_orchestrator({})
+        orchestrator.checkpoint.get_state = orchestrator.get_checkpoint_state
+        orchestrator.start(max_iterations=10)
+        orchestrator.iteration_count = 5
+        orchestrator.stop()
+        self.assertEqual(orchestrator.iteration_count, 0)
+
+        resumed = self.create_checkpointed_orchestrator({})
+        resumed.start(max_iterations=10)
+        self.assertEqual(resumed.iteration_count, 5)
+        # A run with another limit belongs to another invocation.
+        other = self.create_checkpointed_orchestrator({})
+        other.start(max_iterations=3)
+        self.assertEqual(other.iteration_count, 0)
+
+    def test_iteration_count_of_a_completed_run_is_not_kept(self):
+        orchestrator = self.create_checkpointed_orchestrator({"Agent-0": 1})
+        orchestrator.checkpoint.get_state = orchestrator.get_checkpoint_state
+        _, agent = orchestrator.agents["Agent-0"]
+        # Stays active, the run ends when its iterations are used.
+        agent.step = lambda: None
+        orchestrator.start(max_iterations=3)
+        orchestrator.main_thread.join(timeout=2)
+        self.assertTrue(orchestrator.run_completed)
+
+        resumed = self.create_checkpointed_orchestrator({"Agent-0": 1})
+        self.assertEqual(resumed.iteration_count, 0)
+
+    def test_invalid_checkpoint_is_ignored(self):
+        os.makedirs(self.logger.organization_folder, exist_ok=True)
+        with open(self.file_path, "wb") as f:
+            f.write(b"not a checkpoint")
+        orchestrator = self.create_checkpointed_orchestrator({"Agent-0": 1})
+        self.assertEqual(orchestrator.iteration_count, 0)
+        self.assertEqual(orchestrator.queue.get_names(), ["Agent-0"])
+
+
+class HibernatingAgent(StatusAgent):
+    def __init__(self, name, status):
+        super().__init__(name, status)
+        self.hibernations = 0
+
+    def hibernate(self):
+        self.hibernations += 1
+        return True
+
+
+class FailingUpdateAgent(HibernatingAgent):
+    def __init__(self, name, status):
+        super().__init__(name, status)
+        self.failed_updates = 0
+
+    def update(self):
+        if not self.failed_updates:
+            self.failed_updates += 1
+            raise ConnectionError("Memory is unreachable")
+        super().update()
+
+
+class TestOrchestratorHibernation(OrchestratorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.agent = HibernatingAgent("Agent-0", Status.WAITING)
+        self.orchestrator = self.create_orchestrator(
+            [self.agent], max_concurrent_agents=1, hibernate_after=0.1
+        )
+        self.orchestrator.start()
+
+    def test_idle_agent_hibernates_until_its_next_step(self):
+        self.assertTrue(
+            self.wait_until(lambda: "Agent-0" in self.orchestrator.hibernated_agents)
+        )
+        self.assertEqual(self.agent.hibernations, 1)
+        self.assertIn(self.agent, self.orchestrator.waiting_agents)
+        self.assertEqual(self.agent.steps, 0)
+
+        self.agent.receive_event()
+        self.assertTrue(self.wait_until(lambda: self.agent.steps == 1))
+        self.assertNotIn("Agent-0", self.orchestrator.hibernated_agents)
+
+    def test_failed_update_does_not_stop_the_dispatcher(self):
+        agent = FailingUpdateAgent("Agent-1", Status.ACTIVE)
+        self.add_agents([agent])
+        self.assertTrue(self.wait_until(lambda: agent.steps == 1))
+        self.assertEqual(agent.failed_updates, 1)
+        self.assertFalse(self.orchestrator.stop_flag)
+
+    def test_deleted_agent_leaves_waiting(self):
+        self.orchestrator.delete_agent("Agent-0")
+        hibernations = self.agent.hibernations
+        self.assertNotIn(self.agent, self.orchestrator.waiting_agents)
+        self.assertEqual(self.agent.wakeup_listeners, [])
+        self.orchestrator.hibernate_idle_agents()
+        self.assertEqual(self.agent.hibernations, hibernations)
+
+
 class TestAgentPriorityQueue(unittest.TestCase):
     def test_put_and_get(self):
         queue = AgentPriorityQueue()
@@ -127,6 +596,39 @@ class TestAgentPriorityQueue(unittest.TestCase):
             actual_order.append(agent_name)
         self.assertEqual(actual_order, expected_order)
 
+    def test_update_and_remove(self):
+        queue = AgentPriorityQueue()
+        queue.set_time_scaling_factor(0)
+        now = time.time()
+        for i in range(5):
+            queue.put((f"Agent-{i}", None), i + 1, now)
+        self.assertTrue(queue.update_priority("Agent-4", 0.5))
+        self.assertTrue(queue.remove("Agent-0"))
+        self.assertFalse(queue.remove("Agent-0"))
+        self.assertFalse(queue.update_priority("Agent-0", 1))
+        queue.put(("Agent-1", None), 10, now)
+        self.assertEqual(queue.qsize(), 4)
+        self.assertEqual(queue.back()[0], 10)
+        actual_order = []
+        while not queue.empty():
+            agent_name, _ = queue.get()
+            actual_order.append(agent_name)
+        self.assertEqual(actual_order, ["Agent-4", "Agent-2", "Agent-3", "Agent-1"])
+
+    def test_priorities_age_with_time(self):
+        queue = AgentPriorityQueue()
+        queue.set_time_scaling_factor(0.1)
+        now = time.time()
+        queue.put(("Recent", None), 1, now)
+        queue.put(("Old", None), 2, now - 10)
+        # 2 * exp(-0.1 * 10) < 1, the old agent goes first even with a worse base priority.
+        self.assertAlmostEqual(
+            queue.get_priority("Old", current_time=now), 2 * math.exp(-1)
+        )
+        self.assertEqual(queue.get()[0], "Old")
+        queue.put(("Old", None), 2, now - 5)
+        self.assertEqual(queue.get()[0], "Recent")
+
 
 if __name__ == "__main__":
     unittest.main()
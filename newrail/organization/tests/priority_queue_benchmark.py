@@ -0,0 +1,56 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from newrail.agent.config.status import Status
+from newrail.organization.tests.dispatch_benchmark import create_orchestrator
+from newrail.organization.utils.logger.logger import Logger
+from newrail.organization.utils.priorities import AgentPriority
+
+
+def benchmark_update_priorities(orchestrator, agents, repetitions):
+    """Average time to update the priorities of all the agents"""
+
+    start_time = time.perf_counter()
+    for _ in range(repetitions):
+        orchestrator.update_priorities(
+            [AgentPriority(agent.cfg.name, random.uniform(1, 5)) for agent in agents]
+        )
+    return (time.perf_counter() - start_time) / repetitions
+
+
+def benchmark_get(orchestrator):
+    """Average time to get the next agent until the queue is empty"""
+
+    num_agents = orchestrator.queue.qsize()
+    start_time = time.perf_counter()
+    while not orchestrator.queue.empty():
+        orchestrator.queue.get()
+    return (time.perf_counter() - start_time) / num_agents
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agent priority queue.")
+    parser.add_argument("--agents", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repetitions", type=int, default=10)
+    args = parser.parse_args()
+
+    Logger(protagonist="priority_queue_benchmark")
+    with tempfile.TemporaryDirectory() as folder:
+        print("agents | update_priorities (ms) | get (us)")
+        for num_agents in args.agents:
+            # Not started, the agents stay in the queue.
+            orchestrator, agents = create_orchestrator(
+                os.path.join(folder, str(num_agents)), num_agents, 1, Status.ACTIVE
+            )
+            update_time = benchmark_update_priorities(
+                orchestrator, agents, args.repetitions
+            )
+            get_time = benchmark_get(orchestrator)
+            print(f"{num_agents} | {update_time * 1000:.3f} | {get_time * 1e6:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import time
+import unittest
+
+from newrail.organization.utils.team_fair_queue import TeamFairQueue
+
+
+class TeamAgent:
+    def __init__(self, name, team_name):
+        self.cfg = self.Config(name, team_name)
+
+    class Config:
+        def __init__(self, name, team_name):
+            self.name = name
+            self.team_name = team_name
+
+
+def put_agents(queue, team_name, num_agents, base_priority=1):
+    now = time.time()
+    for i in range(num_agents):
+        agent = TeamAgent(f"{team_name}-{i}", team_name)
+        queue.put((agent.cfg.name, agent), base_priority + i, now)
+
+
+def get_teams(queue, num_agents):
+    teams = []
+    for _ in range(num_agents):
+        _, agent = queue.get()
+        teams.append(agent.cfg.team_name)
+    return teams
+
+
+class TestTeamFairQueue(unittest.TestCase):
+    def setUp(self):
+        self.queue = TeamFairQueue()
+        self.queue.set_time_scaling_factor(0)
+
+    def test_teams_share_by_weight(self):
+        self.queue.set_team_weight("busy", 3)
+        self.queue.set_team_weight("small", 1)
+        put_agents(self.queue, "busy", 30)
+        put_agents(self.queue, "small", 10)
+        teams = get_teams(self.queue, 20)
+        self.assertEqual(teams.count("busy"), 15)
+        self.assertEqual(teams.count("small"), 5)
+
+    def test_idle_capacity_is_used(self):
+        self.queue.set_team_weight("busy", 1)
+        self.queue.set_team_weight("idle", 10)
+        put_agents(self.queue, "busy", 5)
+        self.assertEqual(get_teams(self.queue, 5), ["busy"] * 5)
+        self.assertTrue(self.queue.empty())
+        # The idle team didn't save its share while it had nothing queued.
+        put_agents(self.queue, "busy", 2)
+        put_agents(self.queue, "idle", 20)
+        self.assertIn("busy", get_teams(self.queue, 12))
+
+    def test_agents_keep_their_priority_within_the_team(self):
+        put_agents(self.queue, "team", 3)
+        self.queue.update_priority("team-2", 0.5)
+        self.assertTrue(self.queue.remove("team-0"))
+        self.assertEqual(self.queue.front()[1].cfg.name, "team-2")
+        self.assertEqual(self.queue.get()[0], "team-2")
+        self.assertEqual(self.queue.get()[0], "team-1")
+        with self.assertRaises(IndexError):
+            self.queue.get()
+
+    def test_costs_are_charged_to_the_team(self):
+        costs = {"cheap": 1, "expensive": 4}
+        queue = TeamFairQueue(
+            get_cost=lambda agent_name, agent: costs[agent.cfg.team_name], quantum=4
+        )
+        put_agents(queue, "cheap", 20)
+        put_agents(queue, "expensive", 20)
+        teams = get_teams(queue, 10)
+        # Same tokens per turn, 4 cheap steps for each expensive one.
+        self.assertEqual(teams.count("cheap"), 8)
+        self.assertEqual(teams.count("expensive"), 2)
+
+    def test_front_is_the_next_agent(self):
+        self.queue.set_team_weight("a", 2)
+        put_agents(self.queue, "a", 5)
+        put_agents(self.queue, "b", 5)
+        while not self.queue.empty():
+            _, front = self.queue.front()
+            self.assertIs(self.queue.get()[1], front)
+
+
+if __name__ == "__main__":
+    unittest.main()
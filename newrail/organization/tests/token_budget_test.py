@@ -0,0 +1,65 @@
+import time
+import unittest
+
+from newrail.agent.config.stage import Stage
+from newrail.organization.utils.token_budget import TokenBudget, TokenEstimator
+
+
+class TestTokenBudget(unittest.TestCase):
+    def test_reservations_fit_in_the_window(self):
+        budget = TokenBudget(tokens_per_minute=1000)
+        self.assertTrue(budget.can_reserve(600))
+        budget.reserve(600)
+        self.assertTrue(budget.can_reserve(400))
+        self.assertFalse(budget.can_reserve(401))
+        self.assertGreater(budget.get_wait_time(401), 59)
+
+    def test_settled_reservations_free_the_budget(self):
+        budget = TokenBudget(tokens_per_minute=1000)
+        reservation = budget.reserve(800)
+        self.assertFalse(budget.can_reserve(800))
+        budget.settle(reservation, 100)
+        self.assertTrue(budget.can_reserve(800))
+        self.assertIsNone(budget.get_wait_time(800))
+
+    def test_reservations_expire(self):
+        budget = TokenBudget(tokens_per_minute=1000)
+        budget.WINDOW = 0.1
+        reservation = budget.reserve(1000)
+        self.assertFalse(budget.can_reserve(1))
+        time.sleep(0.15)
+        self.assertTrue(budget.can_reserve(1000))
+        # Settling an expired reservation doesn't change the window.
+        budget.settle(reservation, 500)
+        self.assertEqual(budget.used_tokens, 0)
+
+    def test_a_step_larger_than_the_budget_runs_alone(self):
+        budget = TokenBudget(tokens_per_minute=1000)
+        self.assertTrue(budget.can_reserve(5000))
+        budget.reserve(5000)
+        self.assertFalse(budget.can_reserve(1))
+
+    def test_disabled_budget(self):
+        budget = TokenBudget(tokens_per_minute=0)
+        budget.reserve(5000)
+        self.assertTrue(budget.can_reserve(5000))
+
+
+class TestTokenEstimator(unittest.TestCase):
+    def test_estimations_learn_from_history(self):
+        estimator = TokenEstimator(default_tokens=8000, smoothing_factor=0.5)
+        self.assertEqual(estimator.estimate("Agent-0", Stage.PLANNING), 8000)
+        estimator.update("Agent-0", Stage.PLANNING, 2000)
+        self.assertEqual(estimator.estimate("Agent-0", Stage.PLANNING), 2000)
+        estimator.update("Agent-0", Stage.PLANNING, 4000)
+        self.assertEqual(estimator.estimate("Agent-0", Stage.PLANNING), 3000)
+        # Other stages keep the default, other agents use the stage average.
+        self.assertEqual(estimator.estimate("Agent-0", Stage.EXECUTION), 8000)
+        self.assertEqual(estimator.estimate("Agent-1", Stage.PLANNING), 3000)
+        estimator.remove_agent("Agent-0")
+        estimator.update("Agent-1", Stage.PLANNING, 1000)
+        self.assertEqual(estimator.estimate("Agent-0", Stage.PLANNING), 2000)
+
+
+if __name__ == "__main__":
+    unittest.main()
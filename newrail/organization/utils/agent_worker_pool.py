@@ -0,0 +1,390 @@
+import atexit
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+import itertools
+import multiprocessing
+from multiprocessing.connection import wait
+import queue
+from threading import RLock, Thread
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from newrail.agent.agent import Agent
+from newrail.agent.communication.broker.outbox import Outbox
+from newrail.agent.config.config import AgentConfig
+from newrail.agent.config.stage import Stage
+from newrail.agent.config.status import Status
+from newrail.config.config import Config
+from newrail.memory.long_term_memory.episode_write_queue import EpisodeWriteQueue
+from newrail.organization.utils.logger.agent_logger import AgentLogger
+from newrail.organization.utils.logger.logger import Logger
+from newrail.organization.utils.logger.org_logger import OrgLogger
+from newrail.utils.journal import reassign_journals
+from newrail.utils.token_usage import TokenUsage
+
+
+def load_agent(agent_folder: str) -> Agent:
+    """Construct the agent from the config saved at its folder"""
+
+    agent_config = AgentConfig.load(agent_folder)
+    if agent_config is None:
+        raise ValueError(f"Agent config not found in: {agent_folder}")
+    return Agent(agent_config=agent_config)
+
+
+def get_state(agent: Agent) -> Tuple[str, str]:
+    return agent.cfg.get_stage().name, agent.cfg.get_status().name
+
+
+def run_worker(
+    worker_id: int,
+    requests: multiprocessing.Queue,
+    responses: multiprocessing.Queue,
+    organization_data: str,
+    protagonist: str,
+    num_threads: int,
+    agent_builder: Callable[[str], Agent],
+) -> None:
+    """Main loop of a worker process, owning the agents of its shard"""
+
+    Config().organization_data = organization_data
+    # Before the journals of the process are opened.
+    Config().process_name = f"worker_{worker_id}"
+    Logger(protagonist=protagonist)
+    agents: Dict[str, Agent] = {}
+    agents_lock = RLock()
+
+    def send_result(
+        request_id: int,
+        success: bool,
+        value: Any,
+        agent: Optional[Agent],
+        tokens: int = 0,
+    ):
+        state = get_state(agent) if agent else None
+        responses.put(("result", worker_id, request_id, success, value, state, tokens))
+
+    def call(request_id: int, agent_name: str, method: str, kwargs: Dict[str, Any]):
+        agent = None
+        # Sent back to be counted by the caller, e.g: in the token budget of the orchestrator.
+        token_usage = TokenUsage()
+        try:
+            with agents_lock:
+                agent = agents[agent_name]
+            with token_usage:
+                value = getattr(agent, method)(**kwargs)
+            send_result(request_id, True, value, agent, token_usage.tokens)
+        except Exception as e:
+            send_result(
+                request_id,
+                False,
+                f"{e}\n{traceback.format_exc()}",
+                agent,
+                token_usage.tokens,
+            )
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        while True:
+            request = requests.get()
+            if request is None:
+                break
+            request_id, command, agent_name, payload = request
+            # Agents are added and removed in order, before the calls that follow them.
+            if command == "call":
+                method, kwargs = payload
+                executor.submit(call, request_id, agent_name, method, kwargs)
+                continue
+            try:
+                if command == "add":
+                    agent = agent_builder(payload)
+                    agent.add_wakeup_listener(
+                        partial(responses.put, ("wakeup", worker_id, agent_name))
+                    )
+                    with agents_lock:
+                        agents[agent_name] = agent
+                    send_result(request_id, True, None, agent)
+                elif command == "remove":
+                    with agents_lock:
+                        agent = agents.pop(agent_name, None)
+                    send_result(request_id, True, agent.delete() if agent else False, None)
+                else:
+                    raise ValueError(f"Unknown command: {command}")
+            except Exception as e:
+                send_result(request_id, False, f"{e}\n{traceback.format_exc()}", None)
+
+
+class RequestError(RuntimeError):
+    """Error raised by a request at a worker process"""
+
+    def __init__(self, message: str, tokens: int = 0):
+        super().__init__(message)
+        self.tokens = tokens
+
+
+class AgentProxy:
+    """Agent running in a worker process, exposing the interface used by the organization"""
+
+    def __init__(self, agent_config: AgentConfig, worker_pool: "AgentWorkerPool"):
+        self.cfg = agent_config
+        self.worker_pool = worker_pool
+        self.wakeup_listeners: List[Callable[[], None]] = []
+        # Set when the agent may have events to read, unknown until its first step.
+        self.woken_up = True
+
+    def call(self, method: str, **kwargs) -> Any:
+        return self.worker_pool.call(
+            agent_name=self.cfg.name, method=method, kwargs=kwargs
+        )
+
+    def add_event(self, event) -> None:
+        self.call("add_event", event=event)
+
+    def add_task(self, task) -> None:
+        self.call("add_task", task=task)
+
+    def add_wakeup_listener(self, listener: Callable[[], None]) -> None:
+        self.wakeup_listeners.append(listener)
+
+    def remove_wakeup_listener(self, listener: Callable[[], None]) -> None:
+        if listener in self.wakeup_listeners:
+            self.wakeup_listeners.remove(listener)
+
+    def notify_wakeup(self) -> None:
+        self.woken_up = True
+        for listener in list(self.wakeup_listeners):
+            listener()
+
+    def delete(self) -> bool:
+        return self.worker_pool.remove_agent(agent_name=self.cfg.name)
+
+    def step(self) -> None:
+        self.woken_up = False
+        self.call("update_and_step")
+
+    def update(self) -> None:
+        # Applied at the worker by the next step. Requesting it here would block the
+        # dispatcher of the orchestrator for a round trip, the agent is only activated.
+        if self.woken_up and self.cfg.get_status() == Status.WAITING:
+            self.cfg.apply_state(stage=self.cfg.get_stage(), status=Status.ACTIVE)
+
+    def update_status(self, status: Status) -> None:
+        self.call("update_status", status=status)
+
+    def hibernate(self) -> bool:
+        return self.call("hibernate")
+
+
+class AgentWorkerPool:
+    """
+    Runs the agents in worker processes, each one owning the agents of its shard.
+
+    The organization keeps scheduling the agents through their proxies, whose calls are sent
+    to the worker of the agent and block until it answers with the result and the new state
+    of the agent. A worker that dies is restarted with the agents of its shard, failing the
+    calls that were in progress.
+    """
+
+    def __init__(
+        self,
+        logger: Union[AgentLogger, OrgLogger],
+        num_workers: int = Config().agent_worker_processes,
+        threads_per_worker: int = Config().max_concurrent_agents,
+        agent_builder: Callable[[str], Agent] = load_agent,
+    ):
+        self.logger = logger
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker
+        self.agent_builder = agent_builder
+        self.context = multiprocessing.get_context("spawn")
+        self.workers: List[Optional[multiprocessing.Process]] = [None] * num_workers
+        self.requests: List[Optional[multiprocessing.Queue]] = [None] * num_workers
+        # A worker that dies while writing keeps the lock of its queue, none is shared.
+        self.responses: List[Optional[multiprocessing.Queue]] = [None] * num_workers
+        self.reader_threads: List[Optional[Thread]] = [None] * num_workers
+        self.shards: List[Dict[str, AgentProxy]] = [{} for _ in range(num_workers)]
+        self.agent_shards: Dict[str, int] = {}
+        self.pending: Dict[int, Tuple[int, Future, Optional[AgentProxy]]] = {}
+        self.request_ids = itertools.count()
+        self.lock = RLock()
+        self.running = False
+        self.monitor_thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        with self.lock:
+            if self.running:
+                return
+            self.running = True
+            # Pending records of previous runs are replayed by the workers.
+            for journal_owner in (EpisodeWriteQueue, Outbox):
+                reassign_journals(
+                    folder=journal_owner.get_journal_folder(),
+                    name=journal_owner.JOURNAL_NAME,
+                    num_workers=self.num_workers,
+                )
+            for worker_id in range(self.num_workers):
+                self.start_worker(worker_id)
+        self.monitor_thread = Thread(target=self.monitor_workers, daemon=True)
+        self.monitor_thread.start()
+        atexit.register(self.stop)
+
+    def start_worker(self, worker_id: int) -> None:
+        requests = self.context.Queue()
+        responses = self.context.Queue()
+        worker = self.context.Process(
+            target=run_worker,
+            args=(
+                worker_id,
+                requests,
+                responses,
+                Config().organization_data,
+                Logger().protagonist,
+                self.threads_per_worker,
+                self.agent_builder,
+            ),
+            daemon=True,
+        )
+        worker.start()
+        self.requests[worker_id] = requests
+        self.responses[worker_id] = responses
+        self.workers[worker_id] = worker
+        reader_thread = Thread(
+            target=self.read_responses, args=(worker_id, responses), daemon=True
+        )
+        reader_thread.start()
+        self.reader_threads[worker_id] = reader_thread
+
+    def stop(self) -> None:
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+            for requests in self.requests:
+                requests.put(None)
+        for worker in self.workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        for responses in self.responses:
+            responses.put(None)
+        for reader_thread in self.reader_threads:
+            reader_thread.join()
+        self.monitor_thread.join()
+
+    def add_agent(self, agent_config: AgentConfig) -> AgentProxy:
+        """Construct the agent in the worker with less agents and get its proxy"""
+
+        proxy = AgentProxy(agent_config=agent_config, worker_pool=self)
+        with self.lock:
+            worker_id = min(
+                range(self.num_workers), key=lambda shard: len(self.shards[shard])
+            )
+            self.shards[worker_id][agent_config.name] = proxy
+            self.agent_shards[agent_config.name] = worker_id
+            future = self.send(worker_id, "add", proxy, agent_config.folder)
+        self.get_result(future)
+        return proxy
+
+    def remove_agent(self, agent_name: str) -> bool:
+        with self.lock:
+            worker_id = self.agent_shards.pop(agent_name, None)
+            if worker_id is None:
+                return False
+            self.shards[worker_id].pop(agent_name)
+            future = self.send(worker_id, "remove", None, None, agent_name=agent_name)
+        return self.get_result(future)
+
+    def call(self, agent_name: str, method: str, kwargs: Dict[str, Any]) -> Any:
+        """Call the method of the agent at its worker, waiting for the result"""
+
+        with self.lock:
+            worker_id = self.agent_shards[agent_name]
+            proxy = self.shards[worker_id][agent_name]
+            future = self.send(worker_id, "call", proxy, (method, kwargs))
+        return self.get_result(future)
+
+    def get_result(self, future: Future) -> Any:
+        """Wait for the result of a request, recording the tokens that it used"""
+
+        try:
+            value, tokens = future.result()
+        except RequestError as e:
+            TokenUsage.record(e.tokens)
+            raise
+        TokenUsage.record(tokens)
+        return value
+
+    def send(
+        self,
+        worker_id: int,
+        command: str,
+        proxy: Optional[AgentProxy],
+        payload: Any,
+        agent_name: Optional[str] = None,
+    ) -> Future:
+        if proxy:
+            agent_name = proxy.cfg.name
+        request_id = next(self.request_ids)
+        future = Future()
+        self.pending[request_id] = (worker_id, future, proxy)
+        self.requests[worker_id].put((request_id, command, agent_name, payload))
+        return future
+
+    def read_responses(self, worker_id: int, responses: multiprocessing.Queue) -> None:
+        """Read the responses of a worker until it is stopped or restarted"""
+
+        while self.responses[worker_id] is responses:
+            try:
+                response = responses.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if response is None:
+                break
+            if response[0] == "wakeup":
+                _, _, agent_name = response
+                with self.lock:
+                    proxy = self.shards[worker_id].get(agent_name)
+                if proxy:
+                    proxy.notify_wakeup()
+                continue
+            _, _, request_id, success, value, state, tokens = response
+            with self.lock:
+                pending = self.pending.pop(request_id, None)
+            if not pending:
+                # Failed when its worker was restarted.
+                continue
+            _, future, proxy = pending
+            if proxy and state:
+                stage, status = state
+                proxy.cfg.apply_state(stage=Stage[stage], status=Status[status])
+            if success:
+                future.set_result((value, tokens))
+            else:
+                future.set_exception(RequestError(value, tokens))
+
+    def monitor_workers(self) -> None:
+        while self.running:
+            with self.lock:
+                sentinels = {
+                    worker.sentinel: worker_id
+                    for worker_id, worker in enumerate(self.workers)
+                }
+            for sentinel in wait(list(sentinels.keys()), timeout=1.0):
+                with self.lock:
+                    if self.running:
+                        self.restart_worker(sentinels[sentinel])
+
+    def restart_worker(self, worker_id: int) -> None:
+        """Restart a dead worker with the agents of its shard"""
+
+        self.logger.log_error(
+            f"Worker {worker_id} died with exit code {self.workers[worker_id].exitcode}, restarting it"
+        )
+        for request_id, (pending_worker_id, future, _) in list(self.pending.items()):
+            if pending_worker_id == worker_id:
+                del self.pending[request_id]
+                future.set_exception(
+                    RuntimeError(f"Worker {worker_id} died while processing the request")
+                )
+        self.start_worker(worker_id)
+        for proxy in self.shards[worker_id].values():
+            self.send(worker_id, "add", proxy, proxy.cfg.folder)
@@ -0,0 +1,208 @@
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import math
+import os
+import time
+from threading import Event, RLock, Thread
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+class Counter:
+    """Monotonic counter, with its rate over the last minute"""
+
+    RATE_WINDOW = 60.0
+
+    def __init__(self):
+        self.total = 0.0
+        self.increments: Deque[Tuple[float, float]] = deque()
+        self.created_time = time.time()
+        self.lock = RLock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self.lock:
+            now = time.time()
+            self.total += amount
+            self.increments.append((now, amount))
+            self._expire(now)
+
+    def get_rate(self) -> float:
+        with self.lock:
+            now = time.time()
+            self._expire(now)
+            window = min(self.RATE_WINDOW, now - self.created_time)
+            if window <= 0:
+                return 0.0
+            return sum(amount for _, amount in self.increments) / window
+
+    def snapshot(self) -> Dict[str, float]:
+        return {"total": self.total, "rate": self.get_rate()}
+
+    def _expire(self, now: float) -> None:
+        while self.increments and self.increments[0][0] + self.RATE_WINDOW <= now:
+            self.increments.popleft()
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Histogram:
+    """Distribution of the observed values, percentiles are computed over the most recent ones"""
+
+    def __init__(self, max_samples: int = 1024):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.samples: Deque[float] = deque(maxlen=max_samples)
+        self.lock = RLock()
+
+    def observe(self, value: float) -> None:
+        with self.lock:
+            self.count += 1
+            self.sum += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+            self.samples.append(value)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self.lock:
+            if not self.count:
+                return {"count": 0}
+            samples = sorted(self.samples)
+            return {
+                "count": self.count,
+                "mean": self.sum / self.count,
+                "min": self.min,
+                "max": self.max,
+                "p50": self.get_percentile(samples, 0.5),
+                "p95": self.get_percentile(samples, 0.95),
+                "p99": self.get_percentile(samples, 0.99),
+            }
+
+    @staticmethod
+    def get_percentile(samples: List[float], percentile: float) -> float:
+        index = min(int(percentile * len(samples)), len(samples) - 1)
+        return samples[index]
+
+
+class MetricsRegistry:
+    """
+    In-process registry of the metrics of the organization.
+
+    Metrics are created on first use and identified by their name and labels, e.g:
+    step_duration_seconds{stage=PLANNING}. The snapshot can be read in-process, served by
+    MetricsServer or dumped periodically by MetricsDumper.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+        self.lock = RLock()
+
+    def counter(self, name: str, **labels) -> Counter:
+        return self._get_metric(Counter, name, labels)
+
+    def gauge(self, name: str, **labels) -> Gauge:
+        return self._get_metric(Gauge, name, labels)
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        return self._get_metric(Histogram, name, labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            metrics = list(self.metrics.items())
+        return {key: metric.snapshot() for key, metric in sorted(metrics)}
+
+    def _get_metric(self, metric_type, name: str, labels: Dict[str, Any]):
+        key = self.get_key(name, labels)
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.setdefault(key, metric_type())
+        if not isinstance(metric, metric_type):
+            raise ValueError(f"Metric {key} is not a {metric_type.__name__}")
+        return metric
+
+    @staticmethod
+    def get_key(name: str, labels: Dict[str, Any]) -> str:
+        if not labels:
+            return name
+        labels_str = ",".join(f"{key}={value}" for key, value in sorted(labels.items()))
+        return f"{name}{{{labels_str}}}"
+
+
+class MetricsServer:
+    """Serves the snapshot of the registry as JSON at http://host:port/metrics"""
+
+    def __init__(self, registry: MetricsRegistry, port: int, host: str = "127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = json.dumps(registry.snapshot()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread: Optional[Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    def start(self) -> None:
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread:
+            self.thread.join()
+
+
+class MetricsDumper:
+    """Appends the snapshot of the registry to a JSONL file periodically"""
+
+    def __init__(self, registry: MetricsRegistry, path: str, interval: float):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.stop_event = Event()
+        self.thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.dump()
+
+    def dump(self) -> None:
+        line = json.dumps({"time": time.time(), "metrics": self.registry.snapshot()})
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        # Last snapshot, with the metrics since the previous dump.
+        self.dump()
@@ -1,21 +1,27 @@
+import asyncio
 from colorama import Fore
-from concurrent.futures import ThreadPoolExecutor
-from threading import RLock, Thread
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
+from threading import Condition, Event, Lock, RLock, Thread
 import time
-from typing import List, Optional, Union, Tuple
+from typing import Callable, Dict, List, Optional, Union, Tuple
 import traceback
 
 from newrail.agent.agent import Agent
+from newrail.agent.config.stage import Stage
 from newrail.agent.config.status import Status
 from newrail.organization.utils.logger.agent_logger import AgentLogger
 from newrail.organization.utils.logger.org_logger import OrgLogger
+from newrail.organization.utils.metrics import MetricsRegistry
+from newrail.organization.utils.orchestrator_checkpoint import OrchestratorCheckpoint
 from newrail.organization.utils.priorities import (
     AgentPriority,
 )
 from newrail.organization.utils.priority_queue import AgentPriorityQueue
-
-
-SLEEP_INTERVAL = 0.1
+from newrail.organization.utils.team_fair_queue import TeamFairQueue
+from newrail.organization.utils.token_budget import TokenBudget, TokenEstimator
+from newrail.utils.deadline import Deadline, StepCancelled
+from newrail.utils.token_usage import TokenUsage
 
 
 class Orchestrator:
@@ -29,6 +35,14 @@ class Orchestrator:
         logger: Union[AgentLogger, OrgLogger],
         max_concurrent_agents: int,
         time_scaling_factor: float = 0.1,
+        async_steps: bool = False,
+        tokens_per_minute: int = 0,
+        metrics: Optional[MetricsRegistry] = None,
+        fair_scheduling: bool = False,
+        step_timeout: float = 0,
+        cancel_grace_period: float = 30,
+        checkpoint: Optional[OrchestratorCheckpoint] = None,
+        hibernate_after: float = 0,
     ):
         """
         Initializes the Orchestrator with the given parameters.
@@ -37,25 +51,89 @@ class Orchestrator:
             logger (Union[AgentLogger, OrgLogger]): The logger to be used for logging.
             max_concurrent_agents (int): The maximum number of agents to be executed concurrently.
             time_scaling_factor (float): The time scaling factor to be used for dynamic evaluation.
+            async_steps (bool): Run the steps as coroutines on an event loop instead of a thread pool.
+            tokens_per_minute (int): The LLM tokens per minute that the steps can use, 0 to not limit them.
+            metrics (Optional[MetricsRegistry]): The registry to report the metrics to, a new one by default.
+            fair_scheduling (bool): Share the execution between teams according to their weights, instead of only by agent priority.
+            step_timeout (float): The seconds after which a step is cancelled, 0 to not limit them.
+            cancel_grace_period (float): The seconds that a cancelled step has to finish before its slot is reclaimed.
+            checkpoint (Optional[OrchestratorCheckpoint]): The checkpoint to resume from and to save the scheduling state to periodically.
+            hibernate_after (float): The seconds that an agent waits for events before releasing its resources, 0 to never release them.
         """
 
         self._agents_lock = RLock()
         self._active_agents_lock = RLock()
         self._iterations_count_lock = RLock()
+        self._stop_lock = Lock()
         self.last_execution_times = {}
 
         self.main_thread = None
         self.agents: dict[str, Tuple[float, Agent]] = {}
         self.active_agents = set()
-        self.queue = AgentPriorityQueue()
+        self.metrics = metrics or MetricsRegistry()
+        # Admission control, steps are only started if their estimated tokens fit in the budget.
+        self.token_budget = TokenBudget(tokens_per_minute)
+        self.token_estimator = TokenEstimator()
+        self.token_reservations: Dict[str, Tuple[Stage, List[float]]] = {}
+        self.queue: Union[AgentPriorityQueue, TeamFairQueue]
+        if fair_scheduling:
+            if self.token_budget.enabled():
+                # Share the tokens between the teams, the quantum is a step of unknown cost.
+                self.queue = TeamFairQueue(
+                    metrics=self.metrics,
+                    get_cost=lambda agent_name, agent: self.token_estimator.estimate(
+                        agent_name, agent.cfg.get_stage()
+                    ),
+                    quantum=self.token_estimator.default_tokens,
+                )
+            else:
+                self.queue = TeamFairQueue(metrics=self.metrics)
+        else:
+            self.queue = AgentPriorityQueue(metrics=self.metrics)
         self.queue.set_time_scaling_factor(time_scaling_factor)
         self.logger = logger
         self.max_concurrent_agents = max_concurrent_agents
         self.stop_flag = True
         self.iteration_count = 0
+        # The iterations of a run are only resumed by a run with the same limit.
+        self.max_iterations: Optional[int] = None
+        self.restored_max_iterations: Optional[int] = None
+        # Set when the run used all its iterations, nothing is left to resume.
+        self.run_completed = False
         self.waiting_agents: set[Agent] = set()
         self.waiting_agents_lock = RLock()
-        self.waiting_agents_thread = None
+        # Agents that received events since they were last updated.
+        self.pending_wakeups: set[str] = set()
+        self.status_listeners: Dict[str, Callable[[Status], None]] = {}
+        self.wakeup_listeners: Dict[str, Callable[[], None]] = {}
+        # Wakes the dispatcher on queue inserts, finished executions and stop.
+        self._dispatch_condition = Condition(RLock())
+        self.async_steps = async_steps
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread: Optional[Thread] = None
+        self.pending_steps: Dict[str, Future] = {}
+        # Deadlines of the running steps, watched to cancel the ones that run past them.
+        self.step_timeout = step_timeout
+        self.cancel_grace_period = cancel_grace_period
+        self.running_steps: Dict[str, Tuple[Agent, Deadline]] = {}
+        # Agents whose slot was reclaimed while their step hangs, queued again when it returns.
+        self.abandoned_steps: set[str] = set()
+        # Each abandoned step keeps its thread, the pool has room for this many of them.
+        self.max_abandoned_steps = max_concurrent_agents if step_timeout else 0
+        self.watchdog_thread: Optional[Thread] = None
+        self._watchdog_stop = Event()
+        # Idle waiting agents are hibernated until their next step.
+        self.hibernate_after = hibernate_after
+        self.waiting_since: Dict[str, float] = {}
+        self.hibernated_agents: set[str] = set()
+        self.hibernation_thread: Optional[Thread] = None
+        self._hibernation_stop = Event()
+        # Agent name -> (base priority, last execution time, placement) of the previous
+        # run, consumed when its agents are added again.
+        self.restored_agents: Dict[str, Tuple[float, float, Optional[str]]] = {}
+        self.checkpoint = checkpoint
+        if checkpoint:
+            self.restore_checkpoint(checkpoint.load())
 
     def add_agent(self, agent: Agent, base_priority: int = 1):
         """
@@ -67,8 +145,24 @@ class Orchestrator:
         """
 
         with self._agents_lock:
-            self.last_execution_times[agent.cfg.name] = time.time()
+            restored = self.restored_agents.get(agent.cfg.name)
+            if restored:
+                # Keep the priority and the aging of the previous run.
+                base_priority, last_execution_time, _ = restored
+            else:
+                last_execution_time = time.time()
+            self.last_execution_times[agent.cfg.name] = last_execution_time
             self.agents[agent.cfg.name] = (base_priority, agent)
+            if agent.cfg.name not in self.status_listeners:
+                listener = partial(self.agent_status_callback, agent.cfg.name)
+                self.status_listeners[agent.cfg.name] = listener
+                agent.cfg.add_status_listener(listener)
+                wakeup_listener = partial(self.wake_agent, agent.cfg.name)
+                self.wakeup_listeners[agent.cfg.name] = wakeup_listener
+                agent.add_wakeup_listener(wakeup_listener)
+                # Update it at least once, it could have received events before being added.
+                with self.waiting_agents_lock:
+                    self.pending_wakeups.add(agent.cfg.name)
             self.logger.log(f"Agent added: {agent.cfg.name}")
 
     def add_agent_to_queue(self, agent: Agent):
@@ -84,6 +178,7 @@ class Orchestrator:
                 priority,
                 self.last_execution_times[agent.cfg.name],
             )
+        self.notify_dispatcher()
 
     def add_agent_to_waiting(self, agent: Agent):
         """Adds a new agent to the set of waiting agents.
@@ -94,22 +189,90 @@ class Orchestrator:
 
         with self.waiting_agents_lock:
             self.waiting_agents.add(agent)
-
-    def agent_execution_callback(self, agent: "Agent"):
+            self.waiting_since[agent.cfg.name] = time.time()
+            self.metrics.gauge("waiting_agents").set(len(self.waiting_agents))
+            should_wake = agent.cfg.name in self.pending_wakeups
+        # The agent could have been activated or received events before being added.
+        if should_wake or agent.cfg.get_status() == Status.ACTIVE:
+            self.move_agent_to_queue(agent_name=agent.cfg.name)
+
+    def agent_execution_callback(
+        self, agent: "Agent", token_usage: Optional[TokenUsage] = None
+    ):
         """
         Callback function to handle agent execution completion.
 
         Args:
             agent (Agent): The agent that completed execution.
+            token_usage (Optional[TokenUsage]): The tokens used by the step.
         """
 
         with self._active_agents_lock:
-            self.active_agents.remove(agent)
+            self.running_steps.pop(agent.cfg.name, None)
+            abandoned = agent.cfg.name in self.abandoned_steps
+            self.abandoned_steps.discard(agent.cfg.name)
+            if not abandoned:
+                self.active_agents.remove(agent)
+                self.update_slot_metrics()
+        if abandoned:
+            # Its slot and tokens were already released by the watchdog.
+            self.logger.log(
+                f"Abandoned step of agent {agent.cfg.name} returned, queueing it again"
+            )
+            self.add_agent_to_queue(agent)
+            return
+        self.settle_tokens(agent_name=agent.cfg.name, token_usage=token_usage)
         with self._iterations_count_lock:
             self.iteration_count += 1
+        self.metrics.counter("iterations").inc()
         self.last_execution_times[agent.cfg.name] = time.time()
         self.add_agent_to_queue(agent)
         self.logger.log(f"Agent execution completed: {agent.cfg.name}")
+        self.notify_dispatcher()
+
+    def agent_status_callback(self, agent_name: str, status: Status):
+        """
+        Callback function to handle agent status changes, moving waiting agents to the queue once active.
+
+        Args:
+            agent_name (str): The name of the agent whose status changed.
+            status (Status): The new status of the agent.
+        """
+
+        if status == Status.ACTIVE:
+            self.move_agent_to_queue(agent_name=agent_name)
+
+    def wake_agent(self, agent_name: str):
+        """
+        Callback function to handle new events or tasks, moving the agent to the queue to update it if it was waiting.
+
+        Args:
+            agent_name (str): The name of the agent that received the event or task.
+        """
+
+        with self.waiting_agents_lock:
+            self.pending_wakeups.add(agent_name)
+        self.move_agent_to_queue(agent_name=agent_name)
+
+    def move_agent_to_queue(self, agent_name: str):
+        """
+        Moves the agent from the set of waiting agents to the queue, if it was waiting.
+
+        Args:
+            agent_name (str): The name of the agent to be moved.
+        """
+
+        with self._agents_lock:
+            if agent_name not in self.agents:
+                return
+            _, agent = self.agents[agent_name]
+            with self.waiting_agents_lock:
+                if agent not in self.waiting_agents:
+                    return
+                self.waiting_agents.remove(agent)
+                self.waiting_since.pop(agent_name, None)
+                self.metrics.gauge("waiting_agents").set(len(self.waiting_agents))
+            self.add_agent_to_queue(agent)
 
     def delete_agent(self, agent_name: str):
         """
@@ -121,7 +284,24 @@ class Orchestrator:
 
         with self._agents_lock:
             if agent_name in self.agents:
-                del self.agents[agent_name]
+                _, agent = self.agents.pop(agent_name)
+                self.queue.remove(agent_name)
+                self.token_estimator.remove_agent(agent_name)
+                listener = self.status_listeners.pop(agent_name, None)
+                if listener:
+                    agent.cfg.remove_status_listener(listener)
+                wakeup_listener = self.wakeup_listeners.pop(agent_name, None)
+                if wakeup_listener:
+                    agent.remove_wakeup_listener(wakeup_listener)
+                with self.waiting_agents_lock:
+                    self.waiting_agents.discard(agent)
+                    self.waiting_since.pop(agent_name, None)
+                    self.pending_wakeups.discard(agent_name)
+                    self.hibernated_agents.discard(agent_name)
+                    self.metrics.gauge("waiting_agents").set(len(self.waiting_agents))
+                    self.metrics.gauge("hibernated_agents").set(
+                        len(self.hibernated_agents)
+                    )
 
     def execute_agent(self, agent: Agent):
         """
@@ -132,11 +312,14 @@ class Orchestrator:
         """
 
         def run_agent():
+            token_usage = TokenUsage()
+            stage = agent.cfg.get_stage()
+            start_time = time.perf_counter()
             try:
-                with self._active_agents_lock:
-                    if agent not in self.active_agents:
-                        self.active_agents.add(agent)
-                agent.step()
+                with token_usage, deadline:
+                    agent.step()
+            except StepCancelled as e:
+                self.log_cancelled_step(agent, e)
             except KeyboardInterrupt:
                 print("\nCaught Ctrl+C, stopping orchestator")
                 self.stop_internal()
@@ -146,9 +329,232 @@ class Orchestrator:
                     f"Error executing agent: {agent.cfg.name}. Error: {e}\n{tb_str}"
                 )
             finally:
-                self.agent_execution_callback(agent)
+                self.observe_step_duration(stage, time.perf_counter() - start_time)
+                self.agent_execution_callback(agent, token_usage)
+
+        deadline = Deadline(self.step_timeout or None)
+        with self.waiting_agents_lock:
+            # The step loads its resources again.
+            if agent.cfg.name in self.hibernated_agents:
+                self.hibernated_agents.discard(agent.cfg.name)
+                self.metrics.gauge("hibernated_agents").set(len(self.hibernated_agents))
+        # Reserve the slot before submitting, so the dispatcher never exceeds the limit.
+        with self._active_agents_lock:
+            self.active_agents.add(agent)
+            self.running_steps[agent.cfg.name] = (agent, deadline)
+            self.update_slot_metrics()
+        self.reserve_tokens(agent)
+        if self.async_steps:
+            future = asyncio.run_coroutine_threadsafe(
+                self.run_agent_async(agent, deadline), self.loop
+            )
+        else:
+            future = self._thread_pool.submit(run_agent)
+        with self._active_agents_lock:
+            self.pending_steps[agent.cfg.name] = future
+        future.add_done_callback(partial(self.discard_pending_step, agent.cfg.name))
+
+    async def run_agent_async(self, agent: Agent, deadline: Deadline):
+        """
+        Executes the step of the given agent on the event loop.
+
+        Agents without a coroutine step, like the ones running at worker processes, are run in a thread.
+
+        Args:
+            agent (Agent): The agent to execute.
+            deadline (Deadline): The deadline of the step.
+        """
+
+        token_usage = TokenUsage()
+        stage = agent.cfg.get_stage()
+        start_time = time.perf_counter()
+        try:
+            with token_usage, deadline:
+                if hasattr(agent, "astep"):
+                    await agent.astep()
+                else:
+                    await asyncio.to_thread(agent.step)
+        except StepCancelled as e:
+            self.log_cancelled_step(agent, e)
+        except Exception as e:
+            tb_str = traceback.format_exc()
+            self.logger.log_error(
+                f"Error executing agent: {agent.cfg.name}. Error: {e}\n{tb_str}"
+            )
+        finally:
+            self.observe_step_duration(stage, time.perf_counter() - start_time)
+            await asyncio.to_thread(self.agent_execution_callback, agent, token_usage)
+
+    def observe_step_duration(self, stage: Stage, duration: float):
+        self.metrics.histogram("step_duration_seconds", stage=stage.name).observe(
+            duration
+        )
+
+    def update_slot_metrics(self):
+        """Updates the metrics of the execution slots, must be called with the active agents lock."""
+
+        self.metrics.gauge("active_agents").set(len(self.active_agents))
+        self.metrics.gauge("slot_utilization").set(
+            len(self.active_agents) / self.max_concurrent_agents
+        )
 
-        self._thread_pool.submit(run_agent)
+    def reserve_tokens(self, agent: Agent):
+        """
+        Reserves the estimated tokens of the next step of the agent in the token budget.
+
+        Args:
+            agent (Agent): The agent to be executed.
+        """
+
+        if not self.token_budget.enabled():
+            return
+        stage = agent.cfg.get_stage()
+        tokens = self.token_estimator.estimate(agent.cfg.name, stage)
+        reservation = self.token_budget.reserve(tokens)
+        with self._active_agents_lock:
+            self.token_reservations[agent.cfg.name] = (stage, reservation)
+
+    def settle_tokens(self, agent_name: str, token_usage: Optional[TokenUsage]):
+        """
+        Replaces the reserved tokens of the step by the used ones, learning from them the next estimations.
+
+        Args:
+            agent_name (str): The name of the agent that completed execution.
+            token_usage (Optional[TokenUsage]): The tokens used by the step.
+        """
+
+        with self._active_agents_lock:
+            reservation = self.token_reservations.pop(agent_name, None)
+        if not reservation:
+            return
+        stage, reservation = reservation
+        tokens = token_usage.tokens if token_usage else reservation[1]
+        self.token_budget.settle(reservation, tokens)
+        self.token_estimator.update(agent_name, stage, tokens)
+
+    def get_token_wait_time(self) -> Optional[float]:
+        """Returns the seconds until the next agent fits in the token budget, None if it already fits."""
+
+        if not self.token_budget.enabled():
+            return None
+        front = self.queue.front()
+        if not front:
+            return None
+        _, agent = front
+        tokens = self.token_estimator.estimate(agent.cfg.name, agent.cfg.get_stage())
+        return self.token_budget.get_wait_time(tokens)
+
+    def discard_pending_step(self, agent_name: str, future: Future):
+        with self._active_agents_lock:
+            if self.pending_steps.get(agent_name) is future:
+                del self.pending_steps[agent_name]
+
+    def log_cancelled_step(self, agent: Agent, error: StepCancelled):
+        self.metrics.counter("cancelled_steps").inc()
+        self.logger.log(
+            f"{Fore.YELLOW}Step of agent {agent.cfg.name} cancelled: {error}",
+            should_print=True,
+        )
+
+    def watch_steps(self) -> None:
+        """
+        Watchdog of the running steps, cancelling the ones past their deadline and reclaiming the slot of
+        the ones that don't stop in the grace period.
+        """
+
+        interval = min(1.0, self.step_timeout / 4)
+        while not self._watchdog_stop.wait(interval):
+            now = time.time()
+            with self._active_agents_lock:
+                running_steps = list(self.running_steps.items())
+            for agent_name, (agent, deadline) in running_steps:
+                if deadline.expires_at is None or now < deadline.expires_at:
+                    continue
+                if not deadline.cancelled.is_set():
+                    self.logger.log(
+                        f"Step of agent {agent_name} exceeded its deadline of {self.step_timeout} seconds, cancelling it"
+                    )
+                    deadline.cancel()
+                elif now >= deadline.expires_at + self.cancel_grace_period:
+                    self.abandon_step(agent_name=agent_name, deadline=deadline)
+
+    def abandon_step(self, agent_name: str, deadline: Deadline) -> None:
+        """
+        Reclaims the slot of a step that didn't stop after being cancelled, parking its agent until it returns.
+
+        Args:
+            agent_name (str): The name of the agent whose step hangs.
+            deadline (Deadline): The deadline of the step, to skip it if it already returned.
+        """
+
+        with self._active_agents_lock:
+            agent, running_deadline = self.running_steps.get(agent_name, (None, None))
+            if running_deadline is not deadline or agent_name in self.abandoned_steps:
+                return
+            if len(self.abandoned_steps) >= self.max_abandoned_steps:
+                # The pool has no more threads to spare, keep waiting for it.
+                return
+            self.abandoned_steps.add(agent_name)
+            self.active_agents.remove(agent)
+            self.update_slot_metrics()
+        self.settle_tokens(agent_name=agent_name, token_usage=None)
+        self.metrics.counter("abandoned_steps").inc()
+        self.logger.log_error(
+            f"Step of agent {agent_name} didn't stop after being cancelled, reclaiming its slot"
+        )
+        self.notify_dispatcher()
+
+    def watch_idle_agents(self) -> None:
+        """
+        Hibernates the agents that have been waiting for events longer than hibernate_after.
+        """
+
+        interval = min(10.0, self.hibernate_after / 4)
+        while not self._hibernation_stop.wait(interval):
+            try:
+                self.hibernate_idle_agents()
+            except Exception as e:
+                self.logger.log_error(f"Error hibernating idle agents: {e}")
+
+    def hibernate_idle_agents(self) -> None:
+        now = time.time()
+        with self.waiting_agents_lock:
+            idle_agents = [
+                agent
+                for agent in self.waiting_agents
+                if agent.cfg.name not in self.hibernated_agents
+                and agent.cfg.name not in self.pending_wakeups
+                and now - self.waiting_since.get(agent.cfg.name, now)
+                >= self.hibernate_after
+            ]
+            # Out of the waiting set while hibernating, so they aren't dispatched.
+            for agent in idle_agents:
+                self.waiting_agents.remove(agent)
+        for agent in idle_agents:
+            self.hibernate_agent(agent)
+
+    def hibernate_agent(self, agent: Agent) -> None:
+        """
+        Releases the resources of a waiting agent and puts it back to wait, it is rehydrated on its next step.
+
+        Args:
+            agent (Agent): The idle agent, removed from the waiting set.
+        """
+
+        try:
+            agent.hibernate()
+            with self.waiting_agents_lock:
+                self.hibernated_agents.add(agent.cfg.name)
+                self.metrics.gauge("hibernated_agents").set(len(self.hibernated_agents))
+            self.logger.log(f"Agent {agent.cfg.name} hibernated")
+        except Exception as e:
+            self.logger.log_error(
+                f"Error hibernating agent: {agent.cfg.name}. Error: {e}"
+            )
+        # Events received while hibernating wake it up, unless it was deleted meanwhile.
+        with self._agents_lock:
+            if agent.cfg.name in self.agents:
+                self.add_agent_to_waiting(agent)
 
     def is_running(self) -> bool:
         """
@@ -179,12 +585,15 @@ class Orchestrator:
                     f"{Fore.CYAN}Remaining iterations: {remaining_iterations}",
                     should_print=True,
                 )
-                if remaining_iterations:
+                # The count may have been restored from a checkpoint beyond the limit.
+                if remaining_iterations > 0:
                     self.logger.log(f"Executing agent: {agent.cfg.name}")
                     self.execute_agent(agent=agent)
                     return True
                 return False
-            return True
+        self.logger.log(f"Executing agent: {agent.cfg.name}")
+        self.execute_agent(agent=agent)
+        return True
 
     def run(self, max_iterations: Optional[int] = None):
         """
@@ -197,14 +606,33 @@ class Orchestrator:
         """
 
         while not self.stop_flag:
-            if not self.queue.empty():
-                with self._active_agents_lock:
-                    if len(self.active_agents) < self.max_concurrent_agents:
-                        if not self.start_new_agent(max_iterations=max_iterations):
-                            break
-            time.sleep(SLEEP_INTERVAL)
+            with self._dispatch_condition:
+                while not (self.stop_flag or self.can_start_new_agent()):
+                    # Check again when the token budget frees, nobody notifies it.
+                    self._dispatch_condition.wait(timeout=self.get_token_wait_time())
+            if self.stop_flag:
+                break
+            if not self.start_new_agent(max_iterations=max_iterations):
+                self.run_completed = True
+                break
         self.stop_internal()
 
+    def can_start_new_agent(self) -> bool:
+        """Returns True if there are queued agents, a free execution slot and tokens for the next agent."""
+
+        if self.queue.empty():
+            return False
+        with self._active_agents_lock:
+            if len(self.active_agents) >= self.max_concurrent_agents:
+                return False
+        return self.get_token_wait_time() is None
+
+    def notify_dispatcher(self) -> None:
+        """Wake up the dispatcher to check if a new agent can be started."""
+
+        with self._dispatch_condition:
+            self._dispatch_condition.notify_all()
+
     def start_new_agent(self, max_iterations: Optional[int] = None):
         """Starts a new agent from the queue.
 
@@ -215,15 +643,32 @@ class Orchestrator:
             bool: True if remaining iterations are available, False otherwise.
         """
 
-        _, next_agent = self.queue.get()
+        try:
+            _, next_agent = self.queue.get()
+        except IndexError:
+            # The agent was removed after the dispatcher was woken up.
+            return True
         if next_agent:
+            # Events received from now on will wake it up again.
+            with self.waiting_agents_lock:
+                self.pending_wakeups.discard(next_agent.cfg.name)
+            try:
+                next_agent.update()
+            except Exception as e:
+                # The dispatcher serves every agent, a failing update must not stop it.
+                self.logger.log_error(
+                    f"Error updating agent: {next_agent.cfg.name}. Error: {e}\n{traceback.format_exc()}"
+                )
+                with self._agents_lock:
+                    if next_agent.cfg.name in self.agents:
+                        self.add_agent_to_queue(next_agent)
+                return True
             if next_agent.cfg.get_status() == Status.WAITING:
                 self.logger.log(
                     f"Agent {next_agent.cfg.name} is waiting for events to be updated."
                 )
                 self.add_agent_to_waiting(next_agent)
                 return True
-            next_agent.update()
             return self.new_iteration(agent=next_agent, max_iterations=max_iterations)
         return True
 
@@ -234,15 +679,62 @@ class Orchestrator:
 
         try:
             self.stop_flag = True
-            with self._iterations_count_lock:
-                self.iteration_count = 0
+            self.notify_dispatcher()
             self.logger.log("Stopping orchestrator...", should_print=True)
-            self._thread_pool.shutdown(wait=True)
+            self._watchdog_stop.set()
+            self._hibernation_stop.set()
+            if self.async_steps:
+                self.stop_event_loop()
+            else:
+                self.wait_for_pending_steps()
+                self._thread_pool.shutdown(wait=False)
+            # The last checkpoint keeps the iteration count of an interrupted run, it is
+            # reset afterwards. Stop and the run loop both get here, the second one waits.
+            with self._stop_lock:
+                if self.run_completed:
+                    with self._iterations_count_lock:
+                        self.iteration_count = 0
+                if self.checkpoint:
+                    self.checkpoint.stop()
+                with self._iterations_count_lock:
+                    self.iteration_count = 0
         except Exception as e:
             self.logger.log_critical(f"Exception occurred: {e}", should_print=True)
         finally:
             self.logger.log("Orchestrator stopped")
 
+    def stop_event_loop(self) -> None:
+        """
+        Waits for the running steps and stops the event loop.
+        """
+
+        self.wait_for_pending_steps()
+        loop = self.loop
+        if loop and loop.is_running():
+            loop.call_soon_threadsafe(loop.stop)
+        if self.loop_thread:
+            self.loop_thread.join()
+
+    def wait_for_pending_steps(self) -> None:
+        """
+        Waits for the submitted steps, except the abandoned ones that could never return.
+        """
+
+        with self._active_agents_lock:
+            pending_steps = [
+                future
+                for agent_name, future in self.pending_steps.items()
+                if agent_name not in self.abandoned_steps
+            ]
+        wait(pending_steps)
+
+    def run_event_loop(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
     def stop(self) -> None:
         """
         Stops the Orchestrator and waits for all threads to complete.
@@ -252,8 +744,6 @@ class Orchestrator:
         self.stop_internal()
         if self.main_thread:
             self.main_thread.join()
-        if self.waiting_agents_thread:
-            self.waiting_agents_thread.join()
 
     def start(self, max_iterations: Optional[int] = None) -> None:
         """
@@ -264,12 +754,110 @@ class Orchestrator:
         """
 
         self.logger.log("Orchestrator started")
-        self._thread_pool = ThreadPoolExecutor(max_workers=self.max_concurrent_agents)
+        if self.async_steps:
+            self.loop = asyncio.new_event_loop()
+            self.loop_thread = Thread(target=self.run_event_loop, daemon=True)
+            self.loop_thread.start()
+        else:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.max_concurrent_agents + self.max_abandoned_steps
+            )
         self.stop_flag = False
+        self.run_completed = False
+        with self._iterations_count_lock:
+            if max_iterations != self.restored_max_iterations:
+                # Restored from the run of another invocation, it has its own budget.
+                self.iteration_count = 0
+            self.max_iterations = max_iterations
+            self.restored_max_iterations = None
+        if self.checkpoint and self.checkpoint.interval > 0:
+            self.checkpoint.start(get_state=self.get_checkpoint_state)
+        if self.step_timeout:
+            self._watchdog_stop.clear()
+            self.watchdog_thread = Thread(target=self.watch_steps, daemon=True)
+            self.watchdog_thread.start()
+        if self.hibernate_after:
+            self._hibernation_stop.clear()
+            self.hibernation_thread = Thread(target=self.watch_idle_agents, daemon=True)
+            self.hibernation_thread.start()
         self.main_thread = Thread(target=self.run, args=(max_iterations,))
         self.main_thread.start()
-        self.waiting_agents_thread = Thread(target=self.waiting_agents_updater)
-        self.waiting_agents_thread.start()
+
+    def get_checkpoint_state(self) -> Dict:
+        """
+        Returns the scheduling state to be checkpointed: the priorities and aging of the agents, the queue
+        order, the running and waiting agents, the iteration counter with its limit and the token estimations.
+        """
+
+        with self._agents_lock:
+            agents = {
+                agent_name: base_priority
+                for agent_name, (base_priority, _) in self.agents.items()
+            }
+            last_execution_times = {
+                agent_name: self.last_execution_times[agent_name]
+                for agent_name in agents
+            }
+        with self._active_agents_lock:
+            running = list(self.running_steps)
+        with self.waiting_agents_lock:
+            waiting = [agent.cfg.name for agent in self.waiting_agents]
+        with self._iterations_count_lock:
+            iteration_count = self.iteration_count
+        return {
+            "time": time.time(),
+            "agents": agents,
+            "last_execution_times": last_execution_times,
+            "queue": self.queue.get_names(),
+            "running": running,
+            "waiting": waiting,
+            "iteration_count": iteration_count,
+            "max_iterations": self.max_iterations,
+            "token_estimations": self.token_estimator.to_dict(),
+        }
+
+    def restore_checkpoint(self, state: Optional[Dict]):
+        """
+        Restores the scheduling state of a previous run, applied to its agents as they are added again.
+
+        Args:
+            state (Optional[Dict]): The state returned by get_checkpoint_state, None to start from scratch.
+        """
+
+        if not state:
+            return
+        placements = {}
+        # Interrupted steps are run again.
+        for agent_name in state["queue"] + state["running"]:
+            placements[agent_name] = "queue"
+        for agent_name in state["waiting"]:
+            placements[agent_name] = "waiting"
+        for agent_name, base_priority in state["agents"].items():
+            self.restored_agents[agent_name] = (
+                base_priority,
+                state["last_execution_times"][agent_name],
+                placements.get(agent_name),
+            )
+        with self._iterations_count_lock:
+            self.iteration_count = state["iteration_count"]
+            self.restored_max_iterations = state.get("max_iterations")
+        self.token_estimator.load_dict(state["token_estimations"])
+        self.logger.log(
+            f"Resuming the scheduling of {len(self.restored_agents)} agents from the checkpoint"
+            f" of {time.ctime(state['time'])}"
+        )
+
+    def set_team_weight(self, team_name: str, weight: float):
+        """
+        Sets the share of the execution of a team, only used with fair scheduling.
+
+        Args:
+            team_name (str): The name of the team.
+            weight (float): The weight of the team relative to the rest.
+        """
+
+        if isinstance(self.queue, TeamFairQueue):
+            self.queue.set_team_weight(team_name, weight)
 
     def update_priorities(self, evaluations: List[AgentPriority]):
         """
@@ -280,23 +868,13 @@ class Orchestrator:
         """
 
         with self._agents_lock:
+            self.logger.log(f"Updating the priorities of {len(evaluations)} agents")
             for evaluation in evaluations:
-                self.logger.log(
-                    f"Adding: {evaluation.name} with priority score: {evaluation.priority} to queue",
-                )
                 _, agent = self.agents[evaluation.name]
                 self.agents[evaluation.name] = (evaluation.priority, agent)
-
-            # Clear the queue
-            self.queue.clear()
-
-            # Reinsert the agents with their updated priorities
-            for agent_name, (priority, agent) in self.agents.items():
-                self.queue.put(
-                    (agent_name, agent),
-                    priority,
-                    self.last_execution_times[agent.cfg.name],
-                )
+                # Only queued agents are updated, the rest use it when they are queued again.
+                self.queue.update_priority(evaluation.name, evaluation.priority)
+        self.notify_dispatcher()
 
     def insert_agent(self, agent_name: str):
         """
@@ -310,23 +888,18 @@ class Orchestrator:
         with self._agents_lock:
             if agent_name in self.agents:
                 _, agent = self.agents[agent_name]
+                _, _, placement = self.restored_agents.pop(
+                    agent_name, (None, None, None)
+                )
+                # Resume where the agent was at the checkpoint, the queue checks its status again.
+                if placement == "queue":
+                    self.add_agent_to_queue(agent)
+                    return
+                if placement == "waiting":
+                    self.add_agent_to_waiting(agent)
+                    return
                 agent_status = agent.cfg.get_status()
                 if agent_status == Status.ACTIVE:
                     self.add_agent_to_queue(agent)
                 elif agent_status == Status.WAITING:
                     self.add_agent_to_waiting(agent)
-
-    def waiting_agents_updater(self):
-        """Updates the status of waiting agents and adds them to the queue if they are ready to run."""
-
-        while not self.stop_flag:
-            with self.waiting_agents_lock:
-                agents_to_activate: List[Agent] = []
-                for agent in self.waiting_agents:
-                    agent.update()
-                    if agent.cfg.get_status() == Status.ACTIVE:
-                        agents_to_activate.append(agent)
-                for agent in agents_to_activate:
-                    self.waiting_agents.remove(agent)
-                    self.insert_agent(agent.cfg.name)
-            time.sleep(SLEEP_INTERVAL)
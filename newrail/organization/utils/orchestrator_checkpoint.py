@@ -0,0 +1,72 @@
+import os
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Dict, Optional
+
+import msgpack
+
+
+class OrchestratorCheckpoint:
+    """
+    Periodic checkpoint of the scheduling state of the orchestrator.
+
+    The state is written as a single msgpack object to a local file, which is atomically
+    replaced on each write so a crash keeps the previous checkpoint. A restarted
+    orchestrator loads it to resume with the same queue order, aging and counters.
+    """
+
+    VERSION = 1
+
+    def __init__(self, file_path: str, interval: float):
+        self.file_path = file_path
+        self.interval = interval
+        self.stop_event = Event()
+        self.thread: Optional[Thread] = None
+        self.get_state: Optional[Callable[[], Dict[str, Any]]] = None
+        self.lock = Lock()
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Read the last checkpoint, None if there is no valid one"""
+
+        if not os.path.exists(self.file_path):
+            return None
+        try:
+            with open(self.file_path, "rb") as f:
+                state = msgpack.unpackb(f.read(), raw=False)
+        except (OSError, msgpack.FormatError, msgpack.StackError, ValueError):
+            return None
+        if not isinstance(state, dict) or state.get("version") != self.VERSION:
+            return None
+        return state
+
+    def save(self, state: Dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+        data = msgpack.packb({**state, "version": self.VERSION}, use_bin_type=True)
+        tmp_path = f"{self.file_path}.tmp"
+        with self.lock:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.file_path)
+
+    def start(self, get_state: Callable[[], Dict[str, Any]]) -> None:
+        self.get_state = get_state
+        self.stop_event.clear()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self) -> None:
+        while not self.stop_event.wait(self.interval):
+            self.save(self.get_state())
+
+    def stop(self) -> None:
+        if self.stop_event.is_set():
+            # Already stopped, the state may have been reset since the last checkpoint.
+            return
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        # Last checkpoint, with the state at stop.
+        if self.get_state:
+            self.save(self.get_state())
@@ -5,7 +5,6 @@ from pathlib import Path
 import shutil
 from typing import List
 
-from newrail.agent.agent import Agent
 from newrail.agent.config.config import AgentConfig
 from newrail.organization.team.team_config import TeamConfig
 from newrail.organization.utils.logger.org_logger import OrgLogger
@@ -63,13 +62,14 @@ class OrganizationBuilder(object):
                     team_config = TeamConfig.load(team_folder)
                     if team_config is not None:
                         org.add_existing_team(team_config=team_config)
-                agents: List[Agent] = []
+                agent_configs: List[AgentConfig] = []
                 # Load all agent configs and add to organization
                 agents_folder = glob.glob(os.path.join(organization_folder, "agents/*"))
                 for agent_folder in agents_folder:
                     agent_config = AgentConfig.load(agent_folder)
                     if agent_config is not None:
-                        agents.append(org.add_existing_agent(agent_config=agent_config))
+                        agent_configs.append(agent_config)
+                org.add_existing_agents(agent_configs=agent_configs)
                 return org
             logger.log("Director config not found, can't load organization")
             return None
@@ -1,61 +1,184 @@
 import heapq
+import itertools
 import math
 import threading
 import time
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from newrail.agent.agent import Agent
+from newrail.organization.utils.metrics import MetricsRegistry
 
 
 class AgentPriorityQueue:
-    def __init__(self):
-        self.queue = []
+    """
+    Priority queue of agents indexed by name, where lower values are served first.
+
+    The priority of an agent ages with the time since its last execution:
+        priority(t) = base_priority * exp(-time_scaling_factor * (t - last_execution_time))
+
+    All the priorities decay with the same factor, so their order doesn't change with t and
+    the agents are sorted by log(base_priority) + time_scaling_factor * last_execution_time,
+    which gives the same result as evaluating every priority at dequeue time.
+
+    Updated or removed agents leave a stale entry in the heaps, which is skipped when it
+    reaches the top and dropped when the heaps are compacted.
+    """
+
+    def __init__(self, metrics: Optional[MetricsRegistry] = None, **labels):
         self.lock = threading.RLock()
         self.time_scaling_factor = 1
+        # Subtracted from the execution times to keep the keys small.
         self.reference_time = time.time()
+        # Agent name -> (base priority, last execution time, agent, version).
+        self.entries: Dict[str, Tuple[float, float, Agent, int]] = {}
+        self.min_heap: List[Tuple[float, str, int]] = []
+        self.max_heap: List[Tuple[float, str, int]] = []
+        self.versions = itertools.count()
+        # Agent name -> time when it was queued, to measure how long it waits.
+        self.enqueue_times: Dict[str, float] = {}
+        self.metrics = metrics or MetricsRegistry()
+        self.queue_wait = self.metrics.histogram("queue_wait_seconds", **labels)
+        self.queue_size = self.metrics.gauge("queue_size", **labels)
+
+    def get_key(self, base_priority: float, last_execution_time: float) -> float:
+        if base_priority <= 0:
+            return -math.inf
+        return math.log(base_priority) + self.time_scaling_factor * (
+            last_execution_time - self.reference_time
+        )
+
+    def get_priority(
+        self, agent_name: str, current_time: Optional[float] = None
+    ) -> float:
+        """Get the priority of the agent aged up to the current time"""
+
+        with self.lock:
+            base_priority, last_execution_time, _, _ = self.entries[agent_name]
+            if current_time is None:
+                current_time = time.time()
+            elapsed_time = current_time - last_execution_time
+            return base_priority * math.exp(-self.time_scaling_factor * elapsed_time)
+
+    def put(self, item, base_priority, last_execution_time):
+        """Insert the agent or update its priority if it is already queued"""
 
-    def put(self, item, base_priority, last_execution_time, reference_time=None):
         with self.lock:
             agent_name, agent = item
-            if reference_time is None:
-                reference_time = self.reference_time
-            elapsed_time = reference_time - last_execution_time
-            priority = base_priority * math.exp(
-                -self.time_scaling_factor * elapsed_time
-            )
-            heapq.heappush(self.queue, (priority, agent_name, agent))
+            if agent_name not in self.entries:
+                self.enqueue_times[agent_name] = time.time()
+            self._push(agent_name, base_priority, last_execution_time, agent)
+
+    def update_priority(self, agent_name: str, base_priority: float) -> bool:
+        """Update the base priority of a queued agent, returns False if it is not queued"""
+
+        with self.lock:
+            if agent_name not in self.entries:
+                return False
+            _, last_execution_time, agent, _ = self.entries[agent_name]
+            self._push(agent_name, base_priority, last_execution_time, agent)
+            return True
+
+    def remove(self, agent_name: str) -> bool:
+        with self.lock:
+            self.enqueue_times.pop(agent_name, None)
+            removed = self.entries.pop(agent_name, None) is not None
+            self.queue_size.set(len(self.entries))
+            return removed
 
     def get(self) -> Tuple[str, Agent]:
         with self.lock:
-            _, agent_name, agent = heapq.heappop(self.queue)
+            _, agent_name, _ = self._peek(self.min_heap)
+            heapq.heappop(self.min_heap)
+            _, _, agent, _ = self.entries.pop(agent_name)
+            self.queue_wait.observe(time.time() - self.enqueue_times.pop(agent_name))
+            self.queue_size.set(len(self.entries))
             return agent_name, agent
 
     def empty(self):
         with self.lock:
-            return len(self.queue) == 0
+            return len(self.entries) == 0
 
     def qsize(self):
         with self.lock:
-            return len(self.queue)
+            return len(self.entries)
+
+    def __contains__(self, agent_name: str) -> bool:
+        with self.lock:
+            return agent_name in self.entries
 
     def clear(self):
         with self.lock:
-            while not self.empty():
-                self.get()
+            self.entries.clear()
+            self.enqueue_times.clear()
+            self.queue_size.set(0)
+            self.min_heap.clear()
+            self.max_heap.clear()
+
+    def get_names(self) -> List[str]:
+        """Get the names of the queued agents in dispatch order"""
+
+        with self.lock:
+            return sorted(
+                self.entries,
+                key=lambda agent_name: self.get_key(*self.entries[agent_name][:2]),
+            )
 
     def front(self) -> Optional[Tuple[float, Agent]]:
         with self.lock:
             if not self.empty():
-                priority, _, agent = self.queue[0]
-                return priority, agent
+                _, agent_name, _ = self._peek(self.min_heap)
+                return self.get_priority(agent_name), self.entries[agent_name][2]
             return None
 
     def back(self) -> Optional[Tuple[float, Agent]]:
         with self.lock:
             if not self.empty():
-                priority, _, agent = max(self.queue, key=lambda x: (x[0], x[1]))
-                return priority, agent
+                _, agent_name, _ = self._peek(self.max_heap)
+                return self.get_priority(agent_name), self.entries[agent_name][2]
             return None
 
     def set_time_scaling_factor(self, k):
-        self.time_scaling_factor = k
+        with self.lock:
+            self.time_scaling_factor = k
+            # The keys depend on the factor, rebuild the heaps.
+            self._rebuild()
+
+    def _push(
+        self,
+        agent_name: str,
+        base_priority: float,
+        last_execution_time: float,
+        agent: Agent,
+    ) -> None:
+        version = next(self.versions)
+        self.entries[agent_name] = (base_priority, last_execution_time, agent, version)
+        key = self.get_key(base_priority, last_execution_time)
+        heapq.heappush(self.min_heap, (key, agent_name, version))
+        heapq.heappush(self.max_heap, (-key, agent_name, version))
+        self.queue_size.set(len(self.entries))
+        if max(len(self.min_heap), len(self.max_heap)) > 2 * len(self.entries) + 64:
+            self._rebuild()
+
+    def _peek(self, heap: List[Tuple[float, str, int]]) -> Tuple[float, str, int]:
+        """Get the top valid entry of the heap, dropping the stale ones"""
+
+        while heap:
+            entry = heap[0]
+            _, agent_name, version = entry
+            current = self.entries.get(agent_name)
+            if current is not None and current[3] == version:
+                return entry
+            heapq.heappop(heap)
+        raise IndexError("get from an empty priority queue")
+
+    def _rebuild(self) -> None:
+        self.min_heap = []
+        self.max_heap = []
+        for agent_name, (base_priority, last_execution_time, _, version) in (
+            self.entries.items()
+        ):
+            key = self.get_key(base_priority, last_execution_time)
+            self.min_heap.append((key, agent_name, version))
+            self.max_heap.append((-key, agent_name, version))
+        heapq.heapify(self.min_heap)
+        heapq.heapify(self.max_heap)
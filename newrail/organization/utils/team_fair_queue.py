@@ -0,0 +1,198 @@
+from collections import deque
+import threading
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from newrail.agent.agent import Agent
+from newrail.organization.utils.metrics import MetricsRegistry
+from newrail.organization.utils.priority_queue import AgentPriorityQueue
+
+
+class TeamFairQueue:
+    """
+    Queue of agents shared between teams with deficit round robin.
+
+    Each team has its own AgentPriorityQueue. The teams with queued agents take turns, a team
+    receives a quantum proportional to its weight on each turn and dispatches its agents
+    while the quantum covers their cost. When all the teams have queued agents they get a
+    share of the dispatches (or of the tokens, if the cost is the estimated tokens of the
+    step) proportional to their weights, teams without queued agents are skipped so the
+    rest can use their share.
+
+    Implements the same interface as AgentPriorityQueue.
+    """
+
+    def __init__(
+        self,
+        metrics: Optional[MetricsRegistry] = None,
+        get_cost: Optional[Callable[[str, Agent], float]] = None,
+        quantum: float = 1.0,
+    ):
+        self.lock = threading.RLock()
+        self.metrics = metrics or MetricsRegistry()
+        self.get_cost = get_cost or (lambda agent_name, agent: 1.0)
+        self.quantum = quantum
+        self.time_scaling_factor = 1
+        self.queues: Dict[str, AgentPriorityQueue] = {}
+        self.weights: Dict[str, float] = {}
+        self.deficits: Dict[str, float] = {}
+        # Teams with queued agents, the first one has the turn.
+        self.active_teams: Deque[str] = deque()
+        self.agent_teams: Dict[str, str] = {}
+        self.queue_size = self.metrics.gauge("queue_size")
+
+    def set_team_weight(self, team_name: str, weight: float) -> None:
+        if weight <= 0:
+            raise ValueError(f"Weight of team {team_name} must be positive: {weight}")
+        with self.lock:
+            self.weights[team_name] = weight
+
+    def get_team_queue(self, team_name: str) -> AgentPriorityQueue:
+        queue = self.queues.get(team_name)
+        if queue is None:
+            queue = AgentPriorityQueue(metrics=self.metrics, team=team_name)
+            queue.set_time_scaling_factor(self.time_scaling_factor)
+            self.queues[team_name] = queue
+            self.deficits[team_name] = 0.0
+        return queue
+
+    def get_priority(
+        self, agent_name: str, current_time: Optional[float] = None
+    ) -> float:
+        with self.lock:
+            team_name = self.agent_teams[agent_name]
+            return self.queues[team_name].get_priority(agent_name, current_time)
+
+    def put(self, item, base_priority, last_execution_time):
+        with self.lock:
+            agent_name, agent = item
+            team_name = agent.cfg.team_name
+            previous_team = self.agent_teams.get(agent_name)
+            if previous_team is not None and previous_team != team_name:
+                self._remove(agent_name)
+            queue = self.get_team_queue(team_name)
+            queue.put(item, base_priority, last_execution_time)
+            self.agent_teams[agent_name] = team_name
+            if team_name not in self.active_teams:
+                self.active_teams.append(team_name)
+                if len(self.active_teams) == 1:
+                    self._give_turn(self.deficits, team_name)
+            self.queue_size.set(len(self.agent_teams))
+
+    def update_priority(self, agent_name: str, base_priority: float) -> bool:
+        with self.lock:
+            team_name = self.agent_teams.get(agent_name)
+            if team_name is None:
+                return False
+            return self.queues[team_name].update_priority(agent_name, base_priority)
+
+    def remove(self, agent_name: str) -> bool:
+        with self.lock:
+            removed = self._remove(agent_name)
+            self.queue_size.set(len(self.agent_teams))
+            return removed
+
+    def get(self) -> Tuple[str, Agent]:
+        with self.lock:
+            team_name = self._select(commit=True)
+            agent_name, agent = self.queues[team_name].get()
+            del self.agent_teams[agent_name]
+            if self.queues[team_name].empty():
+                self._deactivate(team_name)
+            self.queue_size.set(len(self.agent_teams))
+            return agent_name, agent
+
+    def empty(self):
+        with self.lock:
+            return len(self.agent_teams) == 0
+
+    def qsize(self):
+        with self.lock:
+            return len(self.agent_teams)
+
+    def __contains__(self, agent_name: str) -> bool:
+        with self.lock:
+            return agent_name in self.agent_teams
+
+    def clear(self):
+        with self.lock:
+            for queue in self.queues.values():
+                queue.clear()
+            self.agent_teams.clear()
+            self.active_teams.clear()
+            for team_name in self.deficits:
+                self.deficits[team_name] = 0.0
+            self.queue_size.set(0)
+
+    def get_names(self) -> List[str]:
+        """Get the names of the queued agents, team by team in turn order"""
+
+        with self.lock:
+            return [
+                agent_name
+                for team_name in self.active_teams
+                for agent_name in self.queues[team_name].get_names()
+            ]
+
+    def front(self) -> Optional[Tuple[float, Agent]]:
+        """The agent that would be dispatched next, without consuming the turn"""
+
+        with self.lock:
+            if self.empty():
+                return None
+            return self.queues[self._select(commit=False)].front()
+
+    def back(self) -> Optional[Tuple[float, Agent]]:
+        with self.lock:
+            backs = [queue.back() for queue in self.queues.values() if not queue.empty()]
+            if not backs:
+                return None
+            return max(backs, key=lambda back: back[0])
+
+    def set_time_scaling_factor(self, k):
+        with self.lock:
+            self.time_scaling_factor = k
+            for queue in self.queues.values():
+                queue.set_time_scaling_factor(k)
+
+    def _select(self, commit: bool) -> str:
+        """Get the team that dispatches next, charging it the cost of its agent if commit"""
+
+        if not self.active_teams:
+            raise IndexError("get from an empty team fair queue")
+        deficits = self.deficits if commit else dict(self.deficits)
+        turns = 0
+        while True:
+            team_name = self.active_teams[turns % len(self.active_teams)]
+            _, agent = self.queues[team_name].front()
+            cost = self.get_cost(agent.cfg.name, agent)
+            if deficits[team_name] >= cost:
+                if commit:
+                    deficits[team_name] -= cost
+                    # Turns are only passed when the deficit runs out.
+                    self.active_teams.rotate(-turns)
+                return team_name
+            # The turn passes to the next team, which receives its quantum.
+            turns += 1
+            next_team = self.active_teams[turns % len(self.active_teams)]
+            self._give_turn(deficits, next_team)
+
+    def _give_turn(self, deficits: Dict[str, float], team_name: str) -> None:
+        deficits[team_name] += self.quantum * self.weights.get(team_name, 1.0)
+
+    def _remove(self, agent_name: str) -> bool:
+        team_name = self.agent_teams.pop(agent_name, None)
+        if team_name is None:
+            return False
+        queue = self.queues[team_name]
+        queue.remove(agent_name)
+        if queue.empty():
+            self._deactivate(team_name)
+        return True
+
+    def _deactivate(self, team_name: str) -> None:
+        had_turn = self.active_teams[0] == team_name
+        self.active_teams.remove(team_name)
+        # Idle teams don't accumulate deficit.
+        self.deficits[team_name] = 0.0
+        if had_turn and self.active_teams:
+            self._give_turn(self.deficits, self.active_teams[0])
@@ -0,0 +1,149 @@
+from collections import deque
+import time
+from threading import RLock
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from newrail.agent.config.stage import Stage
+from newrail.config.config import Config
+
+
+class TokenBudget:
+    """
+    Sliding window of the LLM tokens used during the last minute.
+
+    Steps reserve their estimated tokens when they are dispatched and settle the reservation
+    with the tokens they used once they finish, so the dispatcher only starts new steps
+    while the estimated usage of the window stays below the limit.
+    """
+
+    WINDOW = 60.0
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        # Reservations as [time, tokens], mutable to be settled in place.
+        self.reservations: Deque[List[float]] = deque()
+        self.used_tokens = 0
+        self.lock = RLock()
+
+    def enabled(self) -> bool:
+        return self.tokens_per_minute > 0
+
+    def can_reserve(self, tokens: int) -> bool:
+        """Returns True if the tokens fit in the window, or if nothing else is using it"""
+
+        if not self.enabled():
+            return True
+        with self.lock:
+            self._expire(time.time())
+            return (
+                self.used_tokens == 0
+                or self.used_tokens + tokens <= self.tokens_per_minute
+            )
+
+    def reserve(self, tokens: int) -> List[float]:
+        with self.lock:
+            reservation = [time.time(), tokens]
+            self.reservations.append(reservation)
+            self.used_tokens += tokens
+            return reservation
+
+    def settle(self, reservation: List[float], tokens: int) -> None:
+        """Replace the estimated tokens of the reservation by the used ones"""
+
+        with self.lock:
+            now = time.time()
+            self._expire(now)
+            # Expired reservations don't count anymore.
+            if reservation[0] + self.WINDOW > now:
+                self.used_tokens += tokens - reservation[1]
+            reservation[1] = tokens
+
+    def get_wait_time(self, tokens: int) -> Optional[float]:
+        """Seconds until the tokens fit in the window, None if they already fit"""
+
+        if self.can_reserve(tokens):
+            return None
+        with self.lock:
+            now = time.time()
+            used_tokens = self.used_tokens
+            for reservation_time, reservation_tokens in self.reservations:
+                used_tokens -= reservation_tokens
+                if used_tokens + tokens <= self.tokens_per_minute:
+                    return max(reservation_time + self.WINDOW - now, 0.0)
+            return 0.0
+
+    def _expire(self, now: float) -> None:
+        while self.reservations and self.reservations[0][0] + self.WINDOW <= now:
+            _, tokens = self.reservations.popleft()
+            self.used_tokens -= tokens
+
+
+class TokenEstimator:
+    """
+    Estimates the tokens of the next step of an agent from the tokens used in its previous
+    steps at the same stage, falling back to the ones of other agents at that stage.
+    """
+
+    def __init__(
+        self,
+        default_tokens: int = Config().smart_token_limit,
+        smoothing_factor: float = 0.5,
+    ):
+        self.default_tokens = default_tokens
+        self.smoothing_factor = smoothing_factor
+        self.agent_estimations: Dict[Tuple[str, Stage], float] = {}
+        self.stage_estimations: Dict[Stage, float] = {}
+        self.lock = RLock()
+
+    def estimate(self, agent_name: str, stage: Stage) -> int:
+        with self.lock:
+            estimation = self.agent_estimations.get((agent_name, stage))
+            if estimation is None:
+                estimation = self.stage_estimations.get(stage, self.default_tokens)
+            return int(estimation)
+
+    def update(self, agent_name: str, stage: Stage, tokens: int) -> None:
+        """Add the tokens used by a step to the moving averages"""
+
+        with self.lock:
+            for estimations, key in (
+                (self.agent_estimations, (agent_name, stage)),
+                (self.stage_estimations, stage),
+            ):
+                previous = estimations.get(key)
+                if previous is None:
+                    estimations[key] = tokens
+                else:
+                    estimations[key] = (
+                        self.smoothing_factor * tokens
+                        + (1 - self.smoothing_factor) * previous
+                    )
+
+    def remove_agent(self, agent_name: str) -> None:
+        with self.lock:
+            for stage in Stage:
+                self.agent_estimations.pop((agent_name, stage), None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "agent_estimations": [
+                    [agent_name, stage.name, estimation]
+                    for (agent_name, stage), estimation in (
+                        self.agent_estimations.items()
+                    )
+                ],
+                "stage_estimations": {
+                    stage.name: estimation
+                    for stage, estimation in self.stage_estimations.items()
+                },
+            }
+
+    def load_dict(self, data: Dict[str, Any]) -> None:
+        """Restore the estimations saved with to_dict"""
+
+        with self.lock:
+            for agent_name, stage_name, estimation in data["agent_estimations"]:
+                self.agent_estimations[(agent_name, Stage[stage_name])] = estimation
+            for stage_name, estimation in data["stage_estimations"].items():
+                self.stage_estimations[Stage[stage_name]] = estimation
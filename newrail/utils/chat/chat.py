@@ -1,16 +1,21 @@
+import asyncio
 from colorama import Fore
-import time
 import openai
 from openai.error import APIError, RateLimitError
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from newrail.config.config import Config
+from newrail.utils.deadline import Deadline
 import newrail.utils.token_counter as token_counter
+from newrail.utils.token_usage import TokenUsage
 
 openai.api_key = Config().openai_api_key
 
 
 class Chat(object):
+    NUM_RETRIES = 5
+    RETRY_DELAY = 20
+
     @staticmethod
     def create_chat_message(role: str, content: str) -> dict[str, str]:
         """
@@ -26,7 +31,11 @@ class Chat(object):
         return {"role": role, "content": content}
 
     @classmethod
-    def get_response(cls, system: str, user: str, smart_llm=False, token_limit=None):
+    def get_request(
+        cls, system: str, user: str, smart_llm=False, token_limit=None
+    ) -> Tuple[List[dict[str, str]], str, int]:
+        """Get the messages, model and token limit of a request"""
+
         messages = [
             cls.create_chat_message("user", user),
             cls.create_chat_message("system", system),
@@ -40,19 +49,37 @@ class Chat(object):
             model = Config().fast_llm_model
             if not token_limit:
                 token_limit = Config().fast_token_limit
+        return messages, model, token_limit
+
+    @classmethod
+    def get_response(cls, system: str, user: str, smart_llm=False, token_limit=None):
+        messages, model, token_limit = cls.get_request(
+            system=system, user=user, smart_llm=smart_llm, token_limit=token_limit
+        )
         response = cls.create_chat_completion(messages, model, max_tokens=token_limit)
         return response
 
+    @classmethod
+    async def aget_response(
+        cls, system: str, user: str, smart_llm=False, token_limit=None
+    ):
+        messages, model, token_limit = cls.get_request(
+            system=system, user=user, smart_llm=smart_llm, token_limit=token_limit
+        )
+        response = await cls.acreate_chat_completion(
+            messages, model, max_tokens=token_limit
+        )
+        return response
+
     @staticmethod
-    def create_chat_completion(
+    def prepare_chat_completion(
         messages: List[dict[str, str]],
         model: str,
-        temperature: float = Config().temperature,
-        max_tokens: Optional[int] = None,
-    ) -> str:
-        """Create a chat completion using the OpenAI API"""
-        response = None
-        num_retries = 5
+        temperature: float,
+        max_tokens: Optional[int],
+    ) -> Optional[int]:
+        """Get the tokens left for the completion once the messages are counted"""
+
         if Config().debug_mode:
             print(
                 f"{Fore.GREEN}Creating chat completion with model {model},"
@@ -62,34 +89,92 @@ class Chat(object):
         message_tokens = token_counter.count_message_tokens(messages)
         if max_tokens and message_tokens < max_tokens:
             max_tokens = max_tokens - message_tokens
-        for attempt in range(num_retries):
+        return max_tokens
+
+    @classmethod
+    def get_retry_delay(cls, error: Exception, attempt: int) -> float:
+        """Get the seconds to wait before retrying a request, or raise the error"""
+
+        if isinstance(error, RateLimitError):
+            reason = "API Rate Limit Reached"
+        elif isinstance(error, APIError) and error.http_status == 502:
+            reason = "API Bad gateway"
+        else:
+            raise error
+        if attempt == cls.NUM_RETRIES - 1:
+            raise error
+        print(
+            Fore.RED + "Error: ",
+            f"{reason}. Waiting {cls.RETRY_DELAY} seconds..." + Fore.RESET,
+        )
+        return cls.RETRY_DELAY
+
+    @staticmethod
+    def get_content(response) -> str:
+        """Record the tokens used by the response and get its content"""
+
+        TokenUsage.record(response.usage.total_tokens)
+        return response.choices[0].message["content"]
+
+    @classmethod
+    def create_chat_completion(
+        cls,
+        messages: List[dict[str, str]],
+        model: str,
+        temperature: float = Config().temperature,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Create a chat completion using the OpenAI API"""
+
+        max_tokens = cls.prepare_chat_completion(
+            messages=messages,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        for attempt in range(cls.NUM_RETRIES):
+            Deadline.check_current()
             try:
                 response = openai.ChatCompletion.create(
                     model=model,
                     messages=messages,
                     temperature=temperature,
                     max_tokens=max_tokens,
+                    request_timeout=Deadline.get_timeout(),
                 )
-                break
-            except RateLimitError:
-                print(
-                    Fore.RED + "Error: ",
-                    "API Rate Limit Reached. Waiting 20 seconds..." + Fore.RESET,
-                )
-                time.sleep(20)
-            except APIError as e:
-                if e.http_status == 502:
-                    print(
-                        Fore.RED + "Error: ",
-                        "API Bad gateway. Waiting 20 seconds..." + Fore.RESET,
-                    )
-                    time.sleep(20)
-                else:
-                    raise
-                if attempt == num_retries - 1:
-                    raise
-
-        if response is None:
-            raise RuntimeError("Failed to get response after 5 retries")
+                return cls.get_content(response)
+            except (RateLimitError, APIError) as e:
+                Deadline.sleep(cls.get_retry_delay(error=e, attempt=attempt))
+        raise RuntimeError(f"Failed to get response after {cls.NUM_RETRIES} retries")
 
-        return response.choices[0].message["content"]
+    @classmethod
+    async def acreate_chat_completion(
+        cls,
+        messages: List[dict[str, str]],
+        model: str,
+        temperature: float = Config().temperature,
+        max_tokens: Optional[int] = None,
+    ) -> str:
+        """Create a chat completion using the OpenAI API without blocking the event loop"""
+
+        max_tokens = cls.prepare_chat_completion(
+            messages=messages,
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        for attempt in range(cls.NUM_RETRIES):
+            Deadline.check_current()
+            try:
+                response = await openai.ChatCompletion.acreate(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    request_timeout=Deadline.get_timeout(),
+                )
+                return cls.get_content(response)
+            except (RateLimitError, APIError) as e:
+                delay = cls.get_retry_delay(error=e, attempt=attempt)
+                await asyncio.sleep(Deadline.get_timeout(delay))
+        raise RuntimeError(f"Failed to get response after {cls.NUM_RETRIES} retries")
@@ -0,0 +1,99 @@
+from contextvars import ContextVar
+import time
+from threading import Event
+from typing import Optional
+
+
+_current_deadline: ContextVar[Optional["Deadline"]] = ContextVar(
+    "deadline", default=None
+)
+
+
+class StepCancelled(BaseException):
+    """
+    Raised at the checkpoints of a step whose deadline expired or that was cancelled.
+
+    Derives from BaseException like asyncio.CancelledError, so the `except Exception` blocks
+    of the stages and capabilities don't swallow it.
+    """
+
+
+class Deadline:
+    """
+    Deadline of a step, with cooperative cancellation.
+
+    The deadline is bound to the current context like UnitOfWork. The code of the step calls
+    Deadline.check_current() at its checkpoints and bounds its blocking calls with
+    Deadline.get_timeout(), the orchestrator cancels the step when it runs past the deadline.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.start_time = time.time()
+        self.expires_at = self.start_time + timeout if timeout else None
+        self.cancelled = Event()
+        self.token = None
+
+    def __enter__(self) -> "Deadline":
+        self.token = _current_deadline.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        _current_deadline.reset(self.token)
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def expired(self) -> bool:
+        if self.cancelled.is_set():
+            return True
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    def remaining(self) -> Optional[float]:
+        """Seconds until the deadline, None if there is no deadline"""
+
+        if self.cancelled.is_set():
+            return 0.0
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.time(), 0.0)
+
+    def check(self) -> None:
+        if self.expired():
+            raise StepCancelled(
+                f"Step cancelled after {time.time() - self.start_time:.1f} seconds"
+            )
+
+    @classmethod
+    def current(cls) -> Optional["Deadline"]:
+        return _current_deadline.get()
+
+    @classmethod
+    def check_current(cls) -> None:
+        """Raise StepCancelled if the deadline of the current step expired"""
+
+        deadline = cls.current()
+        if deadline:
+            deadline.check()
+
+    @classmethod
+    def get_timeout(cls, default: Optional[float] = None) -> Optional[float]:
+        """Get the timeout for a blocking call, bounded by the deadline of the current step"""
+
+        deadline = cls.current()
+        remaining = deadline.remaining() if deadline else None
+        if remaining is None:
+            return default
+        if default is None:
+            return remaining
+        return min(default, remaining)
+
+    @classmethod
+    def sleep(cls, seconds: float) -> None:
+        """Sleep, waking up to raise StepCancelled if the step is cancelled"""
+
+        deadline = cls.current()
+        if not deadline:
+            time.sleep(seconds)
+            return
+        deadline.cancelled.wait(cls.get_timeout(seconds))
+        deadline.check()
@@ -0,0 +1,255 @@
+from collections import OrderedDict
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import msgpack
+
+from newrail.config.config import Config
+
+
+class Journal:
+    """
+    Append-only file used to persist pending records locally.
+
+    Records are stored as JSON lines or, when binary, as a stream of msgpack objects.
+    Every append is flushed to disk before returning. Compaction rewrites the whole
+    file into a temporary file which atomically replaces the journal, so a crash never
+    leaves a half written journal behind. A torn last record is ignored when reading.
+    """
+
+    def __init__(self, file_path: str, binary: bool = False):
+        self.file_path = file_path
+        self.binary = binary
+        self.lock = threading.RLock()
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+
+    def append(self, record: Dict[str, Any]) -> None:
+        """Append a record to the journal"""
+
+        self.append_many(records=[record])
+
+    def append_many(self, records: List[Dict[str, Any]]) -> None:
+        """Append several records with a single write"""
+
+        if not records:
+            return
+        with self.lock:
+            with open(self.file_path, "ab") as f:
+                f.write(self.encode(records=records))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def encode(self, records: List[Dict[str, Any]]) -> bytes:
+        if self.binary:
+            return b"".join(
+                msgpack.packb(record, use_bin_type=True) for record in records
+            )
+        return "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+
+    def read(self) -> List[Dict[str, Any]]:
+        """Read all the complete records of the journal"""
+
+        records = []
+        with self.lock:
+            if not os.path.exists(self.file_path):
+                return records
+            if self.binary:
+                with open(self.file_path, "rb") as f:
+                    try:
+                        # Incomplete data at the end of the stream is not yielded.
+                        for record in msgpack.Unpacker(f, raw=False):
+                            records.append(record)
+                    except (msgpack.FormatError, msgpack.StackError, ValueError):
+                        pass
+                return records
+            with open(self.file_path, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # Torn write at the end of the journal, the record was never acknowledged.
+                        break
+        return records
+
+    def rewrite(self, records: List[Dict[str, Any]]) -> None:
+        """Atomically replace the journal with the given records"""
+
+        tmp_path = f"{self.file_path}.tmp"
+        with self.lock:
+            with open(tmp_path, "wb") as f:
+                f.write(self.encode(records=records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.file_path)
+
+    def clear(self) -> None:
+        """Remove all the records of the journal"""
+
+        self.rewrite(records=[])
+
+
+class WriteBehindQueue:
+    """
+    Base of the queues that journal their records and persist them in the background.
+
+    Records are acknowledged once journaled, a background flusher sends them in batches
+    when the batch size is reached or after the flush interval, backing off while the
+    sink fails. Records leave the journal only after they are sent, so they are sent
+    again after a crash. Subclasses define the key of the records and how a batch is
+    sent to their sink.
+    """
+
+    JOURNAL_NAME = ""
+    KEY = ""
+
+    def __init__(self, journal_path: str, batch_size: int, flush_interval: float):
+        self.journal = Journal(journal_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.condition = threading.Condition()
+        # Serializes the flusher and the synchronous flushes, a batch is sent once.
+        self.send_lock = threading.Lock()
+        self.pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.flusher: Optional[threading.Thread] = None
+        # Recover the records that were not sent before the last shutdown.
+        for record in self.journal.read():
+            self.pending[record[self.KEY]] = record
+
+    @classmethod
+    def get_instance(cls):
+        """Get the queue shared by all the agents of the process"""
+
+        with cls._instance_lock:
+            if cls._instance is None:
+                # Worker processes don't share the journal, see AgentWorkerPool.
+                cls._instance = cls(
+                    journal_path=get_process_journal_path(
+                        folder=cls.get_journal_folder(), name=cls.JOURNAL_NAME
+                    )
+                )
+            return cls._instance
+
+    @staticmethod
+    def get_journal_folder() -> str:
+        raise NotImplementedError
+
+    def start_flusher(self) -> bool:
+        """Start the background flusher, returns False if it was already started"""
+
+        with self.condition:
+            if self.flusher:
+                return False
+            self.flusher = threading.Thread(target=self.run, daemon=True)
+            self.flusher.start()
+            return True
+
+    def put_record(self, record: Dict[str, Any]) -> None:
+        """Queue a record, it is durable once this method returns"""
+
+        with self.condition:
+            self.journal.append(record)
+            self.pending[record[self.KEY]] = record
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify_all()
+
+    def qsize(self) -> int:
+        with self.condition:
+            return len(self.pending)
+
+    def flush(self) -> bool:
+        """Send all the pending records synchronously.
+
+        Returns:
+            bool: True if every pending record was sent.
+        """
+
+        while True:
+            batch = self.get_batch()
+            if not batch:
+                return True
+            if not self.send(batch=batch):
+                return False
+
+    def get_batch(self) -> List[Dict[str, Any]]:
+        with self.condition:
+            return list(self.pending.values())[: self.batch_size]
+
+    def run(self) -> None:
+        retry_interval = self.flush_interval
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: len(self.pending) >= self.batch_size,
+                    timeout=self.flush_interval,
+                )
+            batch = self.get_batch()
+            if not batch:
+                continue
+            if self.send(batch=batch):
+                retry_interval = self.flush_interval
+            else:
+                time.sleep(retry_interval)
+                retry_interval = min(retry_interval * 2, 60)
+
+    def send(self, batch: List[Dict[str, Any]]) -> bool:
+        """Send a batch and drop the sent records from the journal"""
+
+        with self.send_lock:
+            # The batch may have been sent while waiting for the lock.
+            with self.condition:
+                batch = [record for record in batch if record[self.KEY] in self.pending]
+            sent = self.write(batch=batch) if batch else []
+            if sent:
+                with self.condition:
+                    for record in sent:
+                        self.pending.pop(record[self.KEY], None)
+                    self.journal.rewrite(records=list(self.pending.values()))
+            return len(sent) == len(batch)
+
+    def write(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Send a batch to the sink, returns the records that were sent"""
+
+        raise NotImplementedError
+
+
+def get_process_journal_path(folder: str, name: str) -> str:
+    """Path of the journal of the current process, each worker process has its own"""
+
+    process_name = Config().process_name
+    if process_name:
+        return os.path.join(folder, f"{name}_{process_name}.jsonl")
+    return os.path.join(folder, f"{name}.jsonl")
+
+
+def reassign_journals(folder: str, name: str, num_workers: int) -> None:
+    """
+    Move the records left in the journals of the processes that won't run to the journals
+    of the workers, to be replayed there.
+
+    Must be called before the workers start, when no process has these journals open.
+    """
+
+    if num_workers <= 0 or not os.path.isdir(folder):
+        return
+    pattern = re.compile(rf"{re.escape(name)}(_worker_(\d+))?\.jsonl$")
+    for file_name in sorted(os.listdir(folder)):
+        match = pattern.fullmatch(file_name)
+        if not match:
+            continue
+        worker_id = int(match.group(2)) if match.group(2) else 0
+        if match.group(2) and worker_id < num_workers:
+            continue
+        file_path = os.path.join(folder, file_name)
+        records = Journal(file_path).read()
+        target_path = os.path.join(
+            folder, f"{name}_worker_{worker_id % num_workers}.jsonl"
+        )
+        Journal(target_path).append_many(records=records)
+        os.remove(file_path)
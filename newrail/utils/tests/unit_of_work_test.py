@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import unittest
+
+from newrail.utils.unit_of_work import UnitOfWork
+
+
+class Persistent:
+    def __init__(self):
+        self.value = 0
+        self.writes = []
+
+    def set_value(self, value):
+        self.value = value
+        self.save()
+
+    def save(self):
+        if UnitOfWork.defer(key=self, write=self.save):
+            return
+        self.writes.append(self.value)
+
+
+class FailingPersistent(Persistent):
+    def save(self):
+        if UnitOfWork.defer(key=self, write=self.save):
+            return
+        raise OSError("Write failed")
+
+
+class MockLogger:
+    def __init__(self):
+        self.errors = []
+
+    def log_error(self, message, should_print=False):
+        self.errors.append(message)
+
+
+class TestUnitOfWork(unittest.TestCase):
+    def test_writes_immediately_without_unit(self):
+        persistent = Persistent()
+        persistent.set_value(1)
+        persistent.set_value(2)
+        self.assertEqual(persistent.writes, [1, 2])
+
+    def test_coalesces_writes(self):
+        persistent = Persistent()
+        with UnitOfWork():
+            persistent.set_value(1)
+            with UnitOfWork():
+                persistent.set_value(2)
+            self.assertEqual(persistent.writes, [])
+            persistent.set_value(3)
+        self.assertEqual(persistent.writes, [3])
+
+    def test_flushes_on_error(self):
+        persistent = Persistent()
+        with self.assertRaises(ValueError):
+            with UnitOfWork():
+                persistent.set_value(1)
+                raise ValueError("Step failed")
+        self.assertEqual(persistent.writes, [1])
+
+    def test_flush_error_does_not_replace_the_error(self):
+        persistent = FailingPersistent()
+        logger = MockLogger()
+        with self.assertRaises(ValueError):
+            with UnitOfWork(logger=logger):
+                persistent.set_value(1)
+                raise ValueError("Step failed")
+        self.assertEqual(len(logger.errors), 1)
+        self.assertIn("Write failed", logger.errors[0])
+
+        with self.assertRaises(OSError):
+            with UnitOfWork(logger=logger):
+                persistent.set_value(2)
+
+    def test_async_flush_error_does_not_replace_the_error(self):
+        persistent = FailingPersistent()
+        logger = MockLogger()
+
+        async def step():
+            async with UnitOfWork(logger=logger):
+                persistent.set_value(1)
+                raise ValueError("Step failed")
+
+        with self.assertRaises(ValueError):
+            asyncio.run(step())
+        self.assertEqual(len(logger.errors), 1)
+
+    def test_other_threads_are_not_deferred(self):
+        persistent = Persistent()
+        with UnitOfWork():
+            thread = threading.Thread(target=persistent.set_value, args=(1,))
+            thread.start()
+            thread.join()
+            self.assertEqual(persistent.writes, [1])
+
+
+if __name__ == "__main__":
+    unittest.main()
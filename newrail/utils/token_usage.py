@@ -0,0 +1,46 @@
+from contextvars import ContextVar
+from threading import Lock
+from typing import Optional
+
+
+_current_token_usage: ContextVar[Optional["TokenUsage"]] = ContextVar(
+    "token_usage", default=None
+)
+
+
+class TokenUsage:
+    """
+    Accumulates the tokens of the LLM requests made while it is active.
+
+    The usage is bound to the current context like UnitOfWork, requests made from threads
+    started with a copy of it (e.g: asyncio.to_thread) are also counted. Nested usages
+    count the tokens at every level.
+    """
+
+    def __init__(self):
+        self.tokens = 0
+        self.outer: Optional["TokenUsage"] = None
+        self.token = None
+        self._lock = Lock()
+
+    def __enter__(self) -> "TokenUsage":
+        self.outer = _current_token_usage.get()
+        self.token = _current_token_usage.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        _current_token_usage.reset(self.token)
+
+    def add(self, tokens: int) -> None:
+        with self._lock:
+            self.tokens += tokens
+        if self.outer:
+            self.outer.add(tokens)
+
+    @classmethod
+    def record(cls, tokens: int) -> None:
+        """Add the tokens of a request to the active usage, if any"""
+
+        token_usage = _current_token_usage.get()
+        if token_usage:
+            token_usage.add(tokens)
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+
+_current_unit_of_work: ContextVar[Optional["UnitOfWork"]] = ContextVar(
+    "unit_of_work", default=None
+)
+
+
+class UnitOfWork:
+    """
+    Coalesces the writes requested while it is active.
+
+    Persistent objects defer their writes by key instead of writing immediately, only the
+    last write requested for each key runs when the outermost unit exits. The unit is
+    bound to the current context, writes requested from threads that don't share it
+    are not deferred. Use `async with` in coroutines to flush without blocking the loop.
+    If the unit exits with an error, the errors of the flush are logged to the given
+    logger instead of replacing it.
+    """
+
+    def __init__(self, logger: Optional[Any] = None):
+        self.writes: Dict[Any, Callable[[], Any]] = {}
+        self.outer: Optional["UnitOfWork"] = None
+        self.token = None
+        self.logger = logger
+
+    def __enter__(self) -> "UnitOfWork":
+        self.outer = _current_unit_of_work.get()
+        if not self.outer:
+            self.token = _current_unit_of_work.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.outer:
+            return
+        _current_unit_of_work.reset(self.token)
+        # Flush even on errors, the state was already modified in memory.
+        try:
+            self.flush()
+        except Exception as e:
+            if exc_type is None:
+                raise
+            self.log_flush_error(e)
+
+    async def __aenter__(self) -> "UnitOfWork":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        if self.outer:
+            return
+        _current_unit_of_work.reset(self.token)
+        # Flush from a thread, the writes block.
+        try:
+            await asyncio.to_thread(self.flush)
+        except Exception as e:
+            if exc_type is None:
+                raise
+            self.log_flush_error(e)
+
+    def log_flush_error(self, error: Exception) -> None:
+        message = f"Error flushing the deferred writes: {error}"
+        if self.logger:
+            self.logger.log_error(message)
+        else:
+            logging.getLogger(__name__).error(message)
+
+    @classmethod
+    def current(cls) -> Optional["UnitOfWork"]:
+        return _current_unit_of_work.get()
+
+    @classmethod
+    def defer(cls, key: Any, write: Callable[[], Any]) -> bool:
+        """Defer a write until the active unit exits.
+
+        Returns:
+            bool: False if there is no active unit and the caller should write now.
+        """
+
+        unit_of_work = cls.current()
+        if not unit_of_work:
+            return False
+        unit_of_work.writes[key] = write
+        return True
+
+    def flush(self) -> None:
+        """Run the pending writes, raising the first error after trying all of them"""
+
+        writes = self.writes
+        self.writes = {}
+        error = None
+        for write in writes.values():
+            try:
+                write()
+            except Exception as e:
+                if not error:
+                    error = e
+        if error:
+            raise error